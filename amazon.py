@@ -1,9 +1,28 @@
 import streamlit as st
-from shared_functions import search_items, update_multiple_brands, update_selection
-from send_email import send_email_notification
+from shared_functions import (
+    search_items,
+    suggest_brands,
+    update_selection,
+    split_brand_list,
+    start_amazon_brand_submission,
+    show_submission_job,
+    show_bulk_upload,
+    timed_run
+)
+from send_email import send_email_notification, NOTIFICATION_FAILED_MESSAGE
 import re
-import uuid
-import time
+
+# Widget values kept while the section isn't shown (see app.SECTIONS); buttons and
+# file uploaders can't be restored. The company pick goes with its search results.
+WIDGET_KEYS = (
+    "amazon_submission_type",
+    "amazon_brand_search",
+    "amazon_brand_select",
+    "amazon_manual_brands",
+    "amazon_company_search",
+    "amazon_upload_retailer",
+    "amazon_upload_kind",
+)
 
 def validate_email(email):
     """Validate email format"""
@@ -22,11 +41,143 @@ def initialize_session_state():
         st.session_state.amazon_search_results = None
     if 'amazon_selected_brands' not in st.session_state:
         st.session_state.amazon_selected_brands = []
+    if 'amazon_company_rows' not in st.session_state:
+        st.session_state.amazon_company_rows = {}
     if 'amazon_manual_brands' not in st.session_state:
         st.session_state.amazon_manual_brands = ""
     if 'submission_type' not in st.session_state:
         st.session_state.submission_type = None
 
+def start_brand_submission():
+    """Submit All Brands callback: start the submission as a background job
+
+    Runs before the page does, so the job handle is in session state for
+    the progress panel on this same run.
+    """
+    # Brands picked from the HubSpot dropdown, and manually entered ones (widget value)
+    dropdown_brands = st.session_state.amazon_selected_brands
+    manual_entries = split_brand_list(st.session_state.amazon_manual_brands)
+    if not dropdown_brands and not manual_entries:
+        st.session_state.amazon_submit_error = "Please select or enter at least one brand"
+        return
+    st.session_state.amazon_submit_error = None
+    st.session_state.amazon_brand_job = start_amazon_brand_submission(
+        dropdown_brands, manual_entries, st.session_state.requestor_name, st.session_state.requestor_email
+    )
+
+def clear_brand_form():
+    """Clear the selections once a brand submission has gone through"""
+    st.session_state.amazon_search_results = None
+    st.session_state.amazon_selected_brands = []
+    st.session_state.submission_type = None
+
+@st.fragment
+@timed_run("amazon_brand_search")
+def show_brand_search():
+    """HubSpot brand search and selection; reruns on its own while typing"""
+    st.subheader("Search Brands from HubSpot")
+    # Search box for brand selection
+    search_term = st.text_input(
+        "Search Brand:",
+        help="Type to search for available brands",
+        key="amazon_brand_search"
+    )
+    
+    if search_term:
+        try:
+            search_results = suggest_brands(search_term, search_key="amazon_brand_search")
+            st.session_state.amazon_search_results = search_results
+            
+            if search_results:
+                # Ranked suggestions first, then previously selected brands
+                all_brand_options = list(dict.fromkeys(search_results + st.session_state.amazon_selected_brands))
+                selected_values = st.multiselect(
+                    "Select Brand(s):",
+                    options=all_brand_options,
+                    default=st.session_state.amazon_selected_brands,
+                    key="amazon_brand_select"
+                )
+                # Update session state with current selections
+                st.session_state.amazon_selected_brands = selected_values
+            else:
+                st.info("No brands found in search results.")
+        except Exception as e:
+            st.error(f"Error searching brands: {str(e)}")
+            st.info("You can still add new brands manually.")
+    else:
+        # If no search term, show currently selected brands
+        if st.session_state.amazon_selected_brands:
+            selected_values = st.multiselect(
+                "Select Brand(s):",
+                options=st.session_state.amazon_selected_brands,
+                default=st.session_state.amazon_selected_brands,
+                key="amazon_brand_select"
+            )
+            st.session_state.amazon_selected_brands = selected_values
+
+    # Display current selections
+    if st.session_state.amazon_selected_brands:
+        st.info(f"Selected Brands from HubSpot: {', '.join(st.session_state.amazon_selected_brands)}")
+
+@st.fragment
+@timed_run("amazon_company_search")
+def show_company_search():
+    """Company search, selection and submission; reruns on its own while typing"""
+    # Search box for company selection
+    search_term = st.text_input(
+        "Search Company:",
+        help="Type to search for available companies",
+        key="amazon_company_search"
+    )
+    
+    if search_term:
+        try:
+            search_results = search_items(search_term, "Company Name", search_key="amazon_company_search")
+            st.session_state.amazon_search_results = search_results
+            
+            if search_results:
+                # Keep the rows by company_id so submission can look the choice up directly
+                company_rows = {}
+                for row in search_results:
+                    company_rows.setdefault(row[0], row)
+                st.session_state.amazon_company_rows = company_rows
+
+                # The dropdown carries company ids; show the id only where names collide
+                name_counts = {}
+                for row in company_rows.values():
+                    name_counts[row[1]] = name_counts.get(row[1], 0) + 1
+
+                def format_company(company_id):
+                    name = company_rows[company_id][1]
+                    return f"{name} (ID {company_id})" if name_counts[name] > 1 else name
+
+                selected_company_id = st.selectbox(
+                    "Select Company:",
+                    options=list(company_rows),
+                    format_func=format_company,
+                    key="amazon_company_select"
+                )
+                
+                if st.button("Submit Selected Company"):
+                    with st.spinner('Submitting company...'):
+                        if selected_company_id is not None:
+                            selected_company = company_rows[selected_company_id][1]
+                            if update_selection("Company", selected_company_id):
+                                st.success("Successfully submitted company to Amazon")
+                                
+                                # Send email notification for company submission
+                                if send_email_notification({"Amazon Company": [selected_company]}, st.session_state.requestor_email):
+                                    st.success("Email notification queued")
+                                else:
+                                    st.error(NOTIFICATION_FAILED_MESSAGE)
+                        else:
+                            st.warning("Please select a company.")
+            else:
+                st.info("No companies found.")
+        except Exception as e:
+            st.error(f"Error searching companies: {str(e)}")
+
+@timed_run("amazon_section")
 def show_amazon_section():
     st.title("Amazon Submission")
 
@@ -36,7 +187,7 @@ def show_amazon_section():
     # Selection type radio buttons
     selection_type = st.radio(
         "Select Submission Type:",
-        ["Brand Name", "Company Name"],
+        ["Brand Name", "Company Name", "Upload File"],
         key="amazon_submission_type"
     )
 
@@ -45,197 +196,41 @@ def show_amazon_section():
         col1, col2 = st.columns(2)
 
         with col1:
-            st.subheader("Search Brands from HubSpot")
-            # Search box for brand selection
-            search_term = st.text_input(
-                "Search Brand:",
-                help="Type to search for available brands",
-                key="amazon_brand_search"
-            )
-            
-            if search_term:
-                try:
-                    search_results = search_items(search_term, "Brand Name")
-                    st.session_state.amazon_search_results = search_results
-                    
-                    if search_results:
-                        # Combine new search results with previously selected brands
-                        all_brand_options = list(set(search_results + st.session_state.amazon_selected_brands))
-                        selected_values = st.multiselect(
-                            "Select Brand(s):",
-                            options=all_brand_options,
-                            default=st.session_state.amazon_selected_brands,
-                            key="amazon_brand_select"
-                        )
-                        # Update session state with current selections
-                        st.session_state.amazon_selected_brands = selected_values
-                    else:
-                        st.info("No brands found in search results.")
-                except Exception as e:
-                    st.error(f"Error searching brands: {str(e)}")
-                    st.info("You can still add new brands manually.")
-            else:
-                # If no search term, show currently selected brands
-                if st.session_state.amazon_selected_brands:
-                    selected_values = st.multiselect(
-                        "Select Brand(s):",
-                        options=st.session_state.amazon_selected_brands,
-                        default=st.session_state.amazon_selected_brands,
-                        key="amazon_brand_select"
-                    )
-                    st.session_state.amazon_selected_brands = selected_values
+            show_brand_search()
 
         with col2:
             st.subheader("Add Brands not in HubSpot")
             st.info("For multiple brands, enter them separated by semicolons (e.g., brand1;brand2;brand3)")
-            manual_brands = st.text_area(
+            st.text_area(
                 "Enter New Brand(s):",
                 value=st.session_state.amazon_manual_brands,
                 help="Enter brand name(s) separated by semicolons for multiple brands",
                 key="amazon_manual_brands"
             )
 
-        # Submit button for combined submission
-        if st.button("Submit All Brands"):
-            with st.spinner('Submitting brands...'):
-                try:
-                    # Collect all brands
-                    all_brands = []
-                    has_manual_brands = False
-                    
-                    # Add selected brands from dropdown
-                    if st.session_state.amazon_selected_brands:
-                        all_brands.extend(st.session_state.amazon_selected_brands)
-                    
-                    # Add manually entered brands
-                    if manual_brands:  # Use the widget value directly
-                        manual_brands_list = [brand.strip() for brand in manual_brands.split(";")]
-                        all_brands.extend(manual_brands_list)
-                        has_manual_brands = True
-                    
-                    if not all_brands:
-                        st.error("Please select or enter at least one brand")
-                    else:
-                        # Generate a single GUID for all brands in this submission
-                        req_guid = str(uuid.uuid4())
-                        
-                        # Separate brands into dropdown and manual entries
-                        dropdown_brands = st.session_state.amazon_selected_brands
-                        manual_brands = []
-                        
-                        # Get manual brands from the text area widget directly
-                        manual_brands_text = st.session_state.get('amazon_manual_brands', '')
-                        if manual_brands_text and manual_brands_text.strip():  # Check if there's any non-empty text
-                            manual_brands = [brand.strip() for brand in manual_brands_text.split(";")]
-                        
-                        # Calculate total brands and set is_multiple
-                        total_brands = len(dropdown_brands) + len(manual_brands)
-                        is_multiple = "TRUE" if total_brands > 1 else "FALSE"  # Changed to uppercase TRUE/FALSE
-                        
-                        # Debug log
-                        # st.write(f"Debug - Total brands: {total_brands}, is_multiple: {is_multiple}")
-                        # st.write(f"Debug - Dropdown brands: {dropdown_brands}")
-                        # st.write(f"Debug - Manual brands: {manual_brands}")
-                        
-                        # Handle dropdown brands first (Amazon Brand Name)
-                        if dropdown_brands:
-                            with st.spinner('Submitting existing brands...'):
-                                # For each dropdown brand
-                                for brand in dropdown_brands:
-                                    update_multiple_brands(
-                                        brands_list=[brand],  # Submit one at a time
-                                        x_amazon_type=None,
-                                        req_guid=req_guid,  # Use the same GUID
-                                        request_type="Amazon Brand Name",
-                                        is_multiple=is_multiple  # Use the same is_multiple for all submissions
-                                    )
-                                st.success(f"Successfully submitted brands from HubSpot: {', '.join(dropdown_brands)}")
-                        
-                        # Handle manual brands (Amazon Brand Name New)
-                        if manual_brands:
-                            with st.spinner('Submitting new brands...'):
-                                # Set submission type for manual brands
-                                st.session_state.submission_type = "Brand Not in HubSpot"
-                                # For each manual brand
-                                for brand in manual_brands:
-                                    update_multiple_brands(
-                                        brands_list=[brand],  # Submit one at a time
-                                        x_amazon_type=None,
-                                        req_guid=req_guid,  # Use the same GUID
-                                        request_type="Amazon Brand Name New",
-                                        is_multiple=is_multiple  # Use the same is_multiple for all submissions
-                                    )
-                                st.success(f"Successfully submitted new brands: {', '.join(manual_brands)}")
-                        
-                        # Store success message in session state
-                        st.session_state.success_message = f"Successfully submitted {len(all_brands)} brand(s) with request GUID: {req_guid}"
-                        
-                        # Send email notification after successful submission
-                        query_value = ", ".join(all_brands)  # Combine all brands into a single string
-                        if send_email_notification(query_value, st.session_state.requestor_email):
-                            st.success("Email notification sent successfully")
-                        
-                        # Clear the form after successful submission
-                        st.session_state.amazon_search_results = None
-                        st.session_state.amazon_selected_brands = []
-                        st.session_state.submission_type = None
-                        
-                        # Display final success message
-                        st.success(f"Successfully submitted {len(all_brands)} brand(s)")
-                        
-                        # Use rerun with a delay to keep the message visible
-                        time.sleep(2)  # Wait for 2 seconds
-                        st.rerun()
-                        
-                except Exception as e:
-                    st.error(f"Error submitting brands: {str(e)}")
-
-        # Display current selections
-        if st.session_state.amazon_selected_brands:
-            st.info(f"Selected Brands from HubSpot: {', '.join(st.session_state.amazon_selected_brands)}")
-        
+        # Submit button for combined submission; the submission runs in the background
+        st.button("Submit All Brands", on_click=start_brand_submission)
+        if st.session_state.get('amazon_submit_error'):
+            st.error(st.session_state.amazon_submit_error)
+        show_submission_job("amazon_brand_job", on_done=clear_brand_form)
+
         # Get manual brands from the text area widget
         manual_brands_text = st.session_state.amazon_manual_brands
         if manual_brands_text and manual_brands_text.strip():  # Check if there's any non-empty text
             st.info(f"New Brands to Add: {manual_brands_text}")
 
     elif selection_type == "Company Name":
-        # Search box for company selection
-        search_term = st.text_input(
-            "Search Company:",
-            help="Type to search for available companies",
-            key="amazon_company_search"
-        )
-        
-        if search_term:
-            try:
-                search_results = search_items(search_term, "Company Name")
-                st.session_state.amazon_search_results = search_results
-                
-                if search_results:
-                    # For company search, show company names in dropdown
-                    company_names = [row[1] for row in search_results]
-                    selected_company = st.selectbox(
-                        "Select Company:",
-                        options=company_names,
-                        key="amazon_company_select"
-                    )
-                    
-                    if st.button("Submit Selected Company"):
-                        with st.spinner('Submitting company...'):
-                            if selected_company:
-                                update_selection("Company", selected_company)
-                                st.success("Successfully submitted company to Amazon")
-                                
-                                # Send email notification for company submission
-                                if send_email_notification(selected_company, st.session_state.requestor_email):
-                                    st.success("Email notification sent successfully")
-                            else:
-                                st.warning("Please select a company.")
-                else:
-                    st.info("No companies found.")
-            except Exception as e:
-                st.error(f"Error searching companies: {str(e)}")
+        show_company_search()
+
+    elif selection_type == "Upload File":
+        # Bulk submission of brands or company ids from a CSV/XLSX file
+        summary = show_bulk_upload(["Amazon"], key="amazon_upload")
+        if summary and summary['submitted']:
+            query_value = {"Amazon": [f"{summary['filename']} ({summary['submitted']} rows)"]}
+            if send_email_notification(query_value, st.session_state.requestor_email):
+                st.success("Email notification queued")
+            else:
+                st.error(NOTIFICATION_FAILED_MESSAGE)
 
 if __name__ == "__main__":
     show_amazon_section() 
@@ -0,0 +1,201 @@
+"""HTTP API for other tools: search HubSpot and submit requests as JSON
+
+Runs the same pipeline as the app and the CLI (core.py) on a bounded pool
+of worker threads; database access goes through the shared connection pool.
+
+Endpoints:
+    GET  /health
+    GET  /search?type=brand|company&q=<term>&limit=<n>
+    POST /submissions   one submission, or {"submissions": [...]} for a batch
+
+A submission is {"retailer": "Amazon", "kind": "Brand", "values": [...],
+"requestor": "...", "requestor_email": "..."}; each one gets its own
+REQ_GUID. Run with:
+    python api.py
+"""
+import hmac
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+from config import API_HOST, API_PORT, API_WORKERS, API_MAX_BODY_BYTES, API_TOKEN
+import core
+
+logger = logging.getLogger(__name__)
+
+SUBMISSION_FIELDS = ("retailer", "values", "requestor", "requestor_email")
+
+class APIError(Exception):
+    """An error reported to the client with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def parse_submission(payload):
+    """Validate one submission payload; returns the core.submit_values arguments"""
+    if not isinstance(payload, dict):
+        raise APIError(400, "A submission must be a JSON object")
+    missing = [field for field in SUBMISSION_FIELDS if not payload.get(field)]
+    if missing:
+        raise APIError(400, f"Missing fields: {', '.join(missing)}")
+    values = payload["values"]
+    if not isinstance(values, list) or not all(isinstance(value, (str, int)) for value in values):
+        raise APIError(400, "values must be a list of strings")
+    return {
+        'values': [str(value) for value in values],
+        'kind': payload.get("kind", "Brand"),
+        'retailer': payload["retailer"],
+        'requestor': payload["requestor"],
+        'requestor_email': payload["requestor_email"],
+    }
+
+def submit(payload):
+    """Run one submission; returns its summary, or {'error'} with the HTTP status it maps to"""
+    try:
+        arguments = parse_submission(payload)
+        return 200, core.submit_values(**arguments)
+    except APIError as e:
+        return e.status, {'error': str(e)}
+    except ValueError as e:
+        return 400, {'error': str(e)}
+    except Exception as e:
+        logger.exception("Submission failed")
+        return 500, {'error': f"Submission failed, nothing was released for processing: {e}"}
+
+def search(query):
+    item_type = {"brand": "Brand Name", "company": "Company Name"}.get(query.get("type", ["brand"])[0])
+    term = query.get("q", [""])[0].strip()
+    if item_type is None or not term:
+        raise APIError(400, "Use /search?type=brand|company&q=<term>")
+    try:
+        limit = int(query.get("limit", ["100"])[0])
+    except ValueError:
+        raise APIError(400, "limit must be a number")
+    results = core.find_items(term, item_type)[:limit]
+    if item_type == "Company Name":
+        results = [dict(zip(core.COMPANY_COLUMNS, row)) for row in results]
+    return {'results': results}
+
+def health():
+    return {
+        'status': 'ok',
+        'brand_catalog_loaded': core.get_brand_catalog().is_loaded,
+        'company_catalog_loaded': core.get_company_catalog().is_loaded,
+        'connection_pool': core.get_connection_pool().stats(),
+        'write_coalescer': core.get_write_coalescer().stats(),
+    }
+
+class APIHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients sending many requests reuse their connection
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections give their worker back after this many seconds
+    timeout = 30
+    # Headers and body are written separately; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def check_token(self):
+        if API_TOKEN is None:
+            return
+        header = self.headers.get("Authorization", "")
+        if not hmac.compare_digest(header.encode(), f"Bearer {API_TOKEN}".encode()):
+            raise APIError(401, "Missing or invalid bearer token")
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > API_MAX_BODY_BYTES:
+            raise APIError(413, f"Request body larger than {API_MAX_BODY_BYTES} bytes")
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            raise APIError(400, "Request body is not valid JSON")
+
+    def handle_api(self, route):
+        try:
+            self.check_token()
+            status, payload = route()
+        except APIError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception as e:
+            logger.exception("Error handling %s", self.path)
+            status, payload = 500, {'error': str(e)}
+        if status >= 400 and self.command == "POST":
+            # The body may not have been read, so the connection can't be reused
+            self.close_connection = True
+        self.send_json(status, payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self.handle_api(lambda: (200, health()))
+        elif url.path == "/search":
+            self.handle_api(lambda: (200, search(parse_qs(url.query))))
+        else:
+            self.send_json(404, {'error': f"No such endpoint: {url.path}"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/submissions":
+            self.handle_api(lambda: (404, {'error': f"No such endpoint: {self.path}"}))
+            return
+        self.handle_api(self.post_submissions)
+
+    def post_submissions(self):
+        payload = self.read_json()
+        if isinstance(payload, dict) and "submissions" in payload:
+            if not isinstance(payload["submissions"], list):
+                raise APIError(400, "submissions must be a list")
+            results = [submit(item) for item in payload["submissions"]]
+            # Per-submission statuses are in the body; the batch itself was accepted
+            return 200, {'results': [dict(result, status=status) for status, result in results]}
+        return submit(payload)
+
+class APIServer(HTTPServer):
+    """HTTP server that handles requests on a bounded pool of worker threads"""
+
+    def __init__(self, address, handler=APIHandler, workers=API_WORKERS):
+        super().__init__(address, handler)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Load the HubSpot catalogs before serving, so submissions don't all wait on the first load
+    core.get_brand_catalog().refresh()
+    core.get_company_catalog().refresh()
+    server = APIServer((API_HOST, API_PORT))
+    logger.info("Listening on http://%s:%s", API_HOST, API_PORT)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,121 @@ import snowflake.connector
 import os
 import pandas as pd
 import uuid
-from config import SNOWFLAKE_CONFIG, KEEPA_QUERIES_TABLE, RUN_TYPE, ENV_TYPE
-from x_amazon import show_x_amazon_section
+from config import SNOWFLAKE_CONFIG, KEEPA_QUERIES_TABLE, RUN_TYPE, ENV_TYPE, SHOW_RERUN_TIMINGS
+from x_amazon import show_x_amazon_section, WIDGET_KEYS as X_AMAZON_WIDGET_KEYS
 from shared_functions import (
     get_snowflake_connection,
-    get_keepa_connection,
     search_items,
-    insert_into_keepa_table,
-    update_bullseye_status,
     update_selection,
-    update_multiple_brands
+    update_multiple_brands,
+    get_submission_outbox,
+    get_company,
+    timed_run,
+    get_rerun_stats,
+    keep_widget_state
 )
+from submission import SubmissionUnitOfWork, get_queries_target, NOT_SPECIFIED
 import re
 import getpass
-from amazon import show_amazon_section
+from amazon import show_amazon_section, WIDGET_KEYS as AMAZON_WIDGET_KEYS
+
+# Page styles, sent once per run
+PAGE_STYLE = """
+<style>
+.small-text {
+    font-size: 12px;
+    color: #ff0000;
+    font-style: italic;
+}
+.instruction-box {
+    background-color: #f5f5f5;
+    padding: 20px;
+    border-radius: 5px;
+    margin: 10px 0;
+}
+</style>
+"""
+
+# Instructions shown above each section
+AMAZON_INSTRUCTIONS = """
+<div class="instruction-box">
+<h3 style="font-style: italic;">📝 Instructions</h3>
+<div style="font-size: 11px; line-height: 1.6; font-style: italic;">
+<p><strong>1. Choose Submission Type</strong></p>
+<ul>
+    <li>Select either Brand Name or Company Name as your submission type.</li>
+    <li>Brand Name: Submit one or more individual brands.</li>
+    <li>Company Name: Submit a single company name.</li>
+</ul>
+
+<p><strong>2. If Submitting a Brand Name</strong></p>
+<ul>
+    <li>Search for your brand(s) in the HubSpot dropdown.</li>
+    <li>If available, select the brand(s) from the dropdown. You can select multiple.</li>
+    <li>If not listed, enter the brand name(s) manually in the Add Brands not in HubSpot textbox.
+        <ul>
+            <li>You can use both options—select some from the dropdown and add others manually.</li>
+            <li>To submit multiple brand names manually, separate them with a semicolon (;).</li>
+        </ul>
+    </li>
+</ul>
+
+<p><strong>3. If Submitting a Company Name</strong></p>
+<ul>
+    <li>Search for the company name in the dropdown list.</li>
+    <li>Select the company from the dropdown.</li>
+    <li>Note: Only one company can be submitted per request.</li>
+</ul>
+
+<p><strong>4. Submit Your Request</strong></p>
+<ul>
+    <li>Click the Submit button.</li>
+    <li>You will receive an email confirmation once your submission is received.</li>
+</ul>
+</div>
+</div>
+"""
+
+X_AMAZON_INSTRUCTIONS = """
+<div class="instruction-box">
+<h3 style="font-style: italic;">📝 Instructions</h3>
+<div style="font-size: 11px; line-height: 1.6; font-style: italic;">
+<p><strong>1. Select Retailers</strong></p>
+<ul>
+    <li>Check the boxes next to the retailers you wish to submit your request.</li>
+    <li>You can select multiple retailers in one submission.</li>
+</ul>
+
+<p><strong>2. For Walmart and Target</strong></p>
+<ul>
+    <li>Search for your brand in the HubSpot dropdown.
+        <ul>
+            <li>If found, select it from the list.</li>
+            <li>If not found, enter the brand name manually in the Add Brands not in HubSpot textbox.</li>
+        </ul>
+    </li>
+</ul>
+
+<p><strong>3. For Home Depot and Lowes</strong></p>
+<ul>
+    <li>Provide the full brand URL, starting with http:// or https://.</li>
+    <li>Make sure the URL is correct and accessible.</li>
+</ul>
+
+<p><strong>4. Submit Your Request</strong></p>
+<ul>
+    <li>Click the Submit All Selected Retailers button once all entries are complete.</li>
+    <li>You will receive an email confirmation upon successful submission.</li>
+</ul>
+</div>
+</div>
+"""
+
+# Page sections: label -> (instructions, render function, widget keys kept while the section is hidden)
+SECTIONS = {
+    "Amazon Submission": (AMAZON_INSTRUCTIONS, show_amazon_section, AMAZON_WIDGET_KEYS),
+    "X-Amazon Submission": (X_AMAZON_INSTRUCTIONS, show_x_amazon_section, X_AMAZON_WIDGET_KEYS),
+}
 
 def is_valid_url(url):
     """Validate if the input is a valid URL"""
@@ -99,355 +200,122 @@ def get_companies():
             st.error(f"Error fetching companies: {str(e)}")
     return []
 
-def insert_into_keepa_table(company_data, req_guid, selection_type, brand_name=None, x_amazon_type=None):
-    """Insert data into the Keepa Table or Echo Queries Table based on submission type"""
-    conn = get_keepa_connection()
-    if not conn:
-        return False
-    
+def update_selection(selection_type, selection_value, x_amazon_type=None):
+    """Update the selection in Snowflake"""
     try:
-        cursor = conn.cursor()
-        
-        # Set query type and value based on selection type and X-Amazon type
-        if x_amazon_type:
-            # For X-Amazon submissions, use ECHO_QUERIES table
-            query_type = "homedepot_brand" if x_amazon_type == "Home Depot" else "lowes_brand" if x_amazon_type == "Lowes" else f"{x_amazon_type.lower()}_brand"
-            query_value = brand_name if x_amazon_type.lower() in ['homedepot', 'lowes'] else brand_name
-            table_name = "BOABD.INPUTDATA.ECHO_QUERIES_DEV" if ENV_TYPE == "Test" else "BOABD.INPUTDATA.ECHO_QUERIES"
-            st.write(f"Debug - Using ECHO_QUERIES table for {x_amazon_type} submission")  # Debug log
-        else:
-            # For Amazon submissions, use KEEPA_QUERIES table
-            query_type = "manufacturer_only" if selection_type == "Company" else "brand"
-            query_value = company_data[3] if selection_type == "Company" else brand_name
-            table_name = "BOABD.INPUTDATA.KEEPA_QUERIES_DEV" if ENV_TYPE == "Test" else "BOABD.INPUTDATA.KEEPA_QUERIES"
-            st.write(f"Debug - Using KEEPA_QUERIES table for Amazon {selection_type} submission")  # Debug log
+        # Generate a unique GUID for the request
+        req_guid = str(uuid.uuid4())
         
-        st.write(f"Debug - ENV_TYPE: {ENV_TYPE}")  # Debug log for ENV_TYPE
-        st.write(f"Debug - Using table: {table_name}")  # Debug log for table selection
+        # Get requestor from session state
+        requestor = st.session_state.requestor_name
+        requestor_email = st.session_state.requestor_email
         
-        query = f"""
-        INSERT INTO {table_name} (
-            QUERY_TYPE,
-            QUERY_VALUE,
-            WRITE_TIME,
-            REQUEST_GUID,
-            STATUS
-        ) VALUES (
-            %s,
-            %s,
-            CURRENT_TIMESTAMP,
-            %s,
-            %s
-        )
-        """
-        
-        cursor.execute(query, (
-            query_type,
-            query_value,
-            req_guid,
-            "0"  # STATUS
-        ))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        st.error(f"Error inserting into {table_name}: {str(e)}")
-        return False
-
-def update_bullseye_status(req_guid, status):
-    """Update the status in BULLSEYE_REQUEST table"""
-    conn = get_snowflake_connection()
-    if not conn:
-        return False
-    
-    try:
-        cursor = conn.cursor()
-        query = """
-        UPDATE BOABD.POWERAPP.BULLSEYE_REQUEST
-        SET STATUS = %s
-        WHERE REQ_GUID = %s
-        """
+        # Use RUN_TYPE from config
+        uow = SubmissionUnitOfWork(req_guid, run_type=RUN_TYPE)
         
-        cursor.execute(query, (status, req_guid))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        st.error(f"Error updating BULLSEYE_REQUEST status: {str(e)}")
-        return False
-
-def update_selection(selection_type, selection_value, x_amazon_type=None):
-    """Update the selection in Snowflake"""
-    conn = get_snowflake_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # Generate a unique GUID for the request
-            req_guid = str(uuid.uuid4())
-            
-            # Get requestor from session state
-            requestor = st.session_state.requestor_name
-            
-            # Use RUN_TYPE from config
-            run_type = RUN_TYPE
+        # Prepare values based on selection type
+        if selection_type == "Company":
+            # selection_value is the company_id; names aren't unique
+            company_data = get_company(selection_value)
+            if not company_data:
+                st.error(f"Company data not found for ID: {selection_value}. Please search for the company again.")
+                st.write(f"Debug - Available search results: {st.session_state.amazon_search_results}")  # Debug log
+                return
+            st.write(f"Debug - Company Data: {company_data}")  # Debug log
             
-            # Prepare values based on selection type
-            if selection_type == "Company":
-                # Check if search results exist
-                if not st.session_state.amazon_search_results:
-                    st.error("No search results available. Please search for a company first.")
-                    return
-                
-                # Find the company data from search results
-                company_data = next((row for row in st.session_state.amazon_search_results if row[1] == selection_value), None)
-                if company_data:
-                    company_name = company_data[1]  # Use company_name from row[1]
-                    concat_lead_list_name = company_data[3]  # Use concat_lead_list_name from row[3]
-                    brand_name = "NOTSPECIFIEDUNUSED"
-                    request_type = "Amazon Company Name"
-                    status = "0"
-                    is_multiple = "False"  # Single entry for company name
-                    url_value = None  # URL is blank for company name
-                    requestor_email = st.session_state.requestor_email  # Capture requestor email
-                    st.write(f"Debug - Company Data: {company_data}")  # Debug log
-                else:
-                    st.error(f"Company data not found for: {selection_value}")
-                    st.write(f"Debug - Available search results: {st.session_state.amazon_search_results}")  # Debug log
-                    return
-            else:  # Brand selection
-                if x_amazon_type == "Home Depot":
-                    brand_name = "NOTSPECIFIEDUNUSED"
-                    company_name = "NOTSPECIFIEDUNUSED"
-                    concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                    request_type = "HomeDepot Brand"
-                    status = "0"
-                    is_multiple = "Yes"  # Assume multiple brands for Home Depot
-                    url_value = selection_value  # Use URL for Home Depot
-                    requestor_email = st.session_state.requestor_email
-                elif x_amazon_type == "Lowes":
-                    brand_name = "NOTSPECIFIEDUNUSED"
-                    company_name = "NOTSPECIFIEDUNUSED"
-                    concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                    request_type = "Lowes Brand"
-                    status = "0"
-                    is_multiple = "Yes"  # Assume multiple brands for Lowes
-                    url_value = selection_value  # Use URL for Lowes
-                    requestor_email = st.session_state.requestor_email
-                elif x_amazon_type == "Target":
-                    brand_name = selection_value
-                    company_name = "NOTSPECIFIEDUNUSED"
-                    concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                    request_type = "Target Brand New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Target Brand"
-                    status = "0"
-                    is_multiple = "Yes"  # Assume multiple brands for Target
-                    url_value = None
-                    requestor_email = st.session_state.requestor_email
-                elif x_amazon_type == "Walmart":
-                    brand_name = selection_value
-                    company_name = "NOTSPECIFIEDUNUSED"
-                    concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                    request_type = "Walmart Brand New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Walmart Brand"
-                    status = "0"
-                    is_multiple = "Yes"  # Assume multiple brands for Walmart
-                    url_value = None
-                    requestor_email = st.session_state.requestor_email
-                else:
-                    brand_name = selection_value
-                    company_name = "NOTSPECIFIEDUNUSED"
-                    concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                    # Set request type based on submission type
-                    request_type = "Amazon Brand Name New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Amazon Brand Name"
-                    status = "0"
-                    is_multiple = "Yes"  # Assume multiple brands for general brand submissions
-                    url_value = None
-                    requestor_email = st.session_state.requestor_email
-
+            uow.add_request(
+                brand_name=NOT_SPECIFIED,
+                request_type="Amazon Company Name",
+                requestor=requestor,
+                requestor_email=requestor_email,
+                is_multiple="False",  # Single entry for company name
+                company_name=company_data[1],  # Use company_name from row[1]
+                concat_lead_list_name=company_data[3]  # Use concat_lead_list_name from row[3]
+            )
+            uow.add_query(*get_queries_target(selection_type, company_data=company_data))
+        else:  # Brand selection
             # Check if selection_value contains semicolons (multiple brands)
             if ";" in selection_value:
                 # Split the brands and handle them as multiple submissions
                 brands_list = [brand.strip() for brand in selection_value.split(";")]
                 update_multiple_brands(brands_list, x_amazon_type)
                 return
-
-            # Insert into the BULLSEYE_REQUEST table
-            query = """
-            INSERT INTO BOABD.POWERAPP.BULLSEYE_REQUEST (
-                BRANDNAME,
-                COMPANYNAME,
-                CONCAT_LEAD_LIST_NAME,
-                REQUEST_SUBMISSION_TIME,
-                REQUEST_TYPE,
-                REQUESTOR,
-                REQUESTOR_EMAIL,
-                STATUS,
-                ISMULTIPLEBRANDSUBMISSION,
-                REQ_GUID,
-                RUN_TYPE,
-                URL
-            ) VALUES (
-                %s,
-                %s,
-                %s,
-                CURRENT_TIMESTAMP,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s
-            )
-            """
             
-            try:
-                cursor.execute(query, (
-                    brand_name,
-                    company_name,
-                    concat_lead_list_name,
-                    request_type,
-                    requestor,
-                    requestor_email,  # Include requestor email
-                    status,
-                    is_multiple,
-                    req_guid,
-                    run_type,
-                    url_value
-                ))
-                conn.commit()
-                st.success(f"✅ Record Added to Request Table: {selection_value}")
-            except Exception as e:
-                st.error(f"Failed to insert into BULLSEYE_REQUEST: {str(e)}")
-                return
-
-            # For company submissions, insert into Keepa Table and update status
-            if selection_type == "Company":
-                st.write(f"Debug - Attempting to insert company data: {company_data}")  # Debug log
-                if not company_data:  # Additional check
-                    st.error("Company data is missing. Cannot proceed with submission.")
-                    return
-                    
-                if insert_into_keepa_table(company_data, req_guid, selection_type):
-                    st.success(f"✅ Sent to Keepa/Echo Table: {selection_value}")
-                    if update_bullseye_status(req_guid, "2"):
-                        st.success(f"✅ Successfully Submitted: {selection_value}")
-                    else:
-                        st.error(f"❌ Failed to update status for: {selection_value}")
-                else:
-                    st.error(f"❌ Failed to process company '{selection_value}'. The request was not added to the processing queue. Please try again or contact support.")
+            if x_amazon_type in ["Home Depot", "Lowes"]:
+                brand_name = NOT_SPECIFIED
+                request_type = "HomeDepot Brand" if x_amazon_type == "Home Depot" else "Lowes Brand"
+                url_value = selection_value  # Use URL for Home Depot / Lowes
             else:
-                # For brand submissions, also insert into Keepa Table and update status
-                if insert_into_keepa_table(None, req_guid, selection_type, selection_value, x_amazon_type):
-                    st.success(f"✅ Sent to Keepa/Echo Table: {selection_value}")
-                    if update_bullseye_status(req_guid, "2"):
-                        st.success(f"✅ Successfully Submitted: {selection_value}")
-                    else:
-                        st.error(f"❌ Failed to update status for: {selection_value}")
-                else:
-                    st.error(f"❌ Failed to process brand '{selection_value}'. The request was not added to the processing queue. Please try again or contact support.")
-
-            cursor.close()
-            conn.close()
+                brand_name = selection_value
+                url_value = None
+                # Set request type based on submission type
+                prefix = x_amazon_type if x_amazon_type in ["Target", "Walmart"] else "Amazon"
+                suffix = "Brand" if x_amazon_type in ["Target", "Walmart"] else "Brand Name"
+                request_type = f"{prefix} {suffix} New" if st.session_state.submission_type == "Brand Not in HubSpot" else f"{prefix} {suffix}"
+            
+            uow.add_request(
+                brand_name=brand_name,
+                request_type=request_type,
+                requestor=requestor,
+                requestor_email=requestor_email,
+                is_multiple="Yes",  # Assume multiple brands for brand submissions
+                url_value=url_value
+            )
+            uow.add_query(*get_queries_target(selection_type, x_amazon_type, brand_name=selection_value))
 
+        # Saved locally right away; the outbox writes it to Snowflake in one transaction
+        try:
+            get_submission_outbox().append(uow)
         except Exception as e:
-            st.error(f"Error submitting request: {str(e)}")
+            st.error(f"❌ Failed to process '{selection_value}': {str(e)}. Nothing was saved; please try again or contact support.")
+            return
+
+        st.success(f"✅ Successfully Submitted: {selection_value}")
+
+    except Exception as e:
+        st.error(f"Error submitting request: {str(e)}")
 
 # Add new function to handle multiple brand submissions
 def update_multiple_brands(brands_list, x_amazon_type):
     """Handle multiple brand submissions with the same REQ_GUID"""
-    conn = get_snowflake_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            req_guid = str(uuid.uuid4())
-            # Get requestor from session state
-            requestor = st.session_state.requestor_name
-            run_type = RUN_TYPE  # Use RUN_TYPE from config
-            
-            # Determine request type based on submission type and X-Amazon type
-            if x_amazon_type == "Home Depot":
-                request_type = "HomeDepot Brand"
-            elif x_amazon_type == "Lowes":
-                request_type = "Lowes Brand"
-            elif x_amazon_type == "Target":
-                request_type = "Target Brand"
-            elif x_amazon_type == "Walmart":
-                request_type = "Walmart Brand"
-            else:
-                request_type = "Amazon Brand Name New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Amazon Brand Name"
-            
-            # Set ISMULTIPLEBRANDSUBMISSION based on number of brands
-            is_multiple = 'Yes' if len(brands_list) > 1 else 'No'
-            
-            for brand in brands_list:
-                query = """
-                INSERT INTO BOABD.POWERAPP.BULLSEYE_REQUEST (
-                    BRANDNAME,
-                    COMPANYNAME,
-                    CONCAT_LEAD_LIST_NAME,
-                    REQUEST_SUBMISSION_TIME,
-                    REQUEST_TYPE,
-                    REQUESTOR,
-                    REQUESTOR_EMAIL,
-                    STATUS,
-                    ISMULTIPLEBRANDSUBMISSION,
-                    REQ_GUID,
-                    RUN_TYPE,
-                    URL
-                ) VALUES (
-                    %s,
-                    'NOTSPECIFIEDUNUSED',
-                    'NOTSPECIFIEDUNUSED',
-                    CURRENT_TIMESTAMP,
-                    %s,
-                    %s,
-                    %s,
-                    '0',
-                    %s,
-                    %s,
-                    %s,
-                    %s
-                )
-                """
-                
+    try:
+        # Get requestor from session state
+        requestor = st.session_state.requestor_name
+        uow = SubmissionUnitOfWork(run_type=RUN_TYPE)  # Use RUN_TYPE from config
+        
+        # Determine request type based on submission type and X-Amazon type
+        if x_amazon_type == "Home Depot":
+            request_type = "HomeDepot Brand"
+        elif x_amazon_type == "Lowes":
+            request_type = "Lowes Brand"
+        elif x_amazon_type == "Target":
+            request_type = "Target Brand"
+        elif x_amazon_type == "Walmart":
+            request_type = "Walmart Brand"
+        else:
+            request_type = "Amazon Brand Name New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Amazon Brand Name"
+        
+        # Set ISMULTIPLEBRANDSUBMISSION based on number of brands
+        is_multiple = 'Yes' if len(brands_list) > 1 else 'No'
+        
+        for brand in brands_list:
+            uow.add_request(
+                brand_name=brand,  # brand is already a string
+                request_type=request_type,
+                requestor=requestor,
+                requestor_email=st.session_state.requestor_email,  # Add requestor email
+                is_multiple=is_multiple,
                 # Set URL value based on x_amazon_type
-                url_value = brand if x_amazon_type in ["Home Depot", "Lowes"] else None
-                
-                cursor.execute(query, (
-                    brand,  # brand is already a string
-                    request_type,
-                    requestor,
-                    st.session_state.requestor_email,  # Add requestor email
-                    is_multiple,
-                    req_guid,
-                    run_type,
-                    url_value
-                ))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-
-            # Insert all brands into Keepa Table and update status
-            keepa_success = True
-            for brand in brands_list:
-                if not insert_into_keepa_table(None, req_guid, "Brand", brand, x_amazon_type):
-                    keepa_success = False
-                    break
-            
-            if keepa_success:
-                if update_bullseye_status(req_guid, "2"):
-                    st.success(f"Successfully submitted {len(brands_list)} brand requests")
-                else:
-                    st.warning(f"Brand requests submitted but status update failed")
-            else:
-                st.warning(f"Brand requests submitted but Keepa Table insertion failed for some brands")
-        except Exception as e:
-            st.error(f"Error submitting multiple brand requests: {str(e)}")
+                url_value=brand if x_amazon_type in ["Home Depot", "Lowes"] else None
+            )
+            uow.add_query(*get_queries_target("Brand", x_amazon_type, brand_name=brand))
+        
+        # All BULLSEYE_REQUEST rows, Keepa/Echo rows and the status update are written together
+        get_submission_outbox().append(uow)
+        
+        st.success(f"Successfully submitted {len(brands_list)} brand requests")
+    except Exception as e:
+        st.error(f"Error submitting multiple brand requests: {str(e)}. None of the brands were saved.")
 
 def validate_email(email):
     """Validate email format"""
@@ -460,6 +328,17 @@ def validate_email(email):
     
     return True, ""
 
+def show_rerun_timings():
+    """Runs and mean time per page/search panel rerun, across all sessions"""
+    with st.expander("Rerun timings"):
+        st.caption("A keystroke in a search box reruns only its panel; the page itself reruns on other interactions.")
+        st.dataframe(
+            [{"Function": name, **stats} for name, stats in sorted(get_rerun_stats().items())],
+            hide_index=True,
+            use_container_width=True
+        )
+
+@timed_run("page")
 def main():
     st.set_page_config(
         page_title="Amazon Submission App",
@@ -467,6 +346,9 @@ def main():
         layout="wide"
     )
 
+    # Start the outbox writer, which also sends anything left queued from before a restart
+    get_submission_outbox()
+
     # Add SOP links in the top right
     col1, col2 = st.columns([0.85, 0.15])
     with col1:
@@ -513,124 +395,30 @@ def main():
             else:
                 st.session_state.requestor_email = requestor_email
 
-    st.markdown("""
-    <style>
-    .small-text {
-        font-size: 12px;
-        color: #ff0000;
-        font-style: italic;
-    }
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 2rem;
-    }
-    .stTabs [data-baseweb="tab"] {
-        height: 3rem;
-        white-space: pre-wrap;
-        gap: 1rem;
-        padding-top: 0.5rem;
-        padding-bottom: 0.5rem;
-        font-weight: 500;
-    }
-    .stTabs [aria-selected="true"] {
-        border-bottom: 3px solid #1a73e8;
-        color: #1a73e8;
-        font-weight: 600;
-    }
-    .instruction-box {
-        background-color: #f5f5f5;
-        padding: 20px;
-        border-radius: 5px;
-        margin: 10px 0;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(PAGE_STYLE, unsafe_allow_html=True)
 
     st.markdown('<p class="small-text">** Please provide your information above. This is required for tracking your submissions and sending confirmation emails.</p>', unsafe_allow_html=True)
 
     # Only proceed if email is valid
     if requestor_email and validate_email(requestor_email)[0]:
-        # Create tabs for Amazon and X-Amazon sections
-        tab1, tab2 = st.tabs(["Amazon Submission", "X-Amazon Submission"])
-        
-        with tab1:
-            st.markdown("""
-            <div class="instruction-box">
-            <h3 style="font-style: italic;">📝 Instructions</h3>
-            <div style="font-size: 11px; line-height: 1.6; font-style: italic;">
-            <p><strong>1. Choose Submission Type</strong></p>
-            <ul>
-                <li>Select either Brand Name or Company Name as your submission type.</li>
-                <li>Brand Name: Submit one or more individual brands.</li>
-                <li>Company Name: Submit a single company name.</li>
-            </ul>
-
-            <p><strong>2. If Submitting a Brand Name</strong></p>
-            <ul>
-                <li>Search for your brand(s) in the HubSpot dropdown.</li>
-                <li>If available, select the brand(s) from the dropdown. You can select multiple.</li>
-                <li>If not listed, enter the brand name(s) manually in the Add Brands not in HubSpot textbox.
-                    <ul>
-                        <li>You can use both options—select some from the dropdown and add others manually.</li>
-                        <li>To submit multiple brand names manually, separate them with a semicolon (;).</li>
-                    </ul>
-                </li>
-            </ul>
-
-            <p><strong>3. If Submitting a Company Name</strong></p>
-            <ul>
-                <li>Search for the company name in the dropdown list.</li>
-                <li>Select the company from the dropdown.</li>
-                <li>Note: Only one company can be submitted per request.</li>
-            </ul>
-
-            <p><strong>4. Submit Your Request</strong></p>
-            <ul>
-                <li>Click the Submit button.</li>
-                <li>You will receive an email confirmation once your submission is received.</li>
-            </ul>
-            </div>
-            </div>
-            """, unsafe_allow_html=True)
-
-            show_amazon_section()
-        
-        with tab2:
-            st.markdown("""
-            <div class="instruction-box">
-            <h3 style="font-style: italic;">📝 Instructions</h3>
-            <div style="font-size: 11px; line-height: 1.6; font-style: italic;">
-            <p><strong>1. Select Retailers</strong></p>
-            <ul>
-                <li>Check the boxes next to the retailers you wish to submit your request.</li>
-                <li>You can select multiple retailers in one submission.</li>
-            </ul>
-
-            <p><strong>2. For Walmart and Target</strong></p>
-            <ul>
-                <li>Search for your brand in the HubSpot dropdown.
-                    <ul>
-                        <li>If found, select it from the list.</li>
-                        <li>If not found, enter the brand name manually in the Add Brands not in HubSpot textbox.</li>
-                    </ul>
-                </li>
-            </ul>
-
-            <p><strong>3. For Home Depot and Lowes</strong></p>
-            <ul>
-                <li>Provide the full brand URL, starting with http:// or https://.</li>
-                <li>Make sure the URL is correct and accessible.</li>
-            </ul>
-
-            <p><strong>4. Submit Your Request</strong></p>
-            <ul>
-                <li>Click the Submit All Selected Retailers button once all entries are complete.</li>
-                <li>You will receive an email confirmation upon successful submission.</li>
-            </ul>
-            </div>
-            </div>
-            """, unsafe_allow_html=True)
-
-            show_x_amazon_section()
+        # Only the selected section runs; the choice is kept in session state
+        active_section = st.radio(
+            "Section:",
+            list(SECTIONS),
+            horizontal=True,
+            label_visibility="collapsed",
+            key="active_section"
+        )
+        for section, (_, _, widget_keys) in SECTIONS.items():
+            if section != active_section:
+                keep_widget_state(widget_keys)
+
+        instructions, show_section, _ = SECTIONS[active_section]
+        st.markdown(instructions, unsafe_allow_html=True)
+        show_section()
+
+    if SHOW_RERUN_TIMINGS:
+        show_rerun_timings()
 
 if __name__ == "__main__":
     main() 
@@ -0,0 +1,420 @@
+"""Benchmarks for the submission pipeline and the in-memory search indexes
+
+Submission benchmarks run against a local stand-in database. The stand-in is an in-memory SQLite database behind a DB-API wrapper that
+accepts the Snowflake SQL used by the app and sleeps for a simulated network
+round trip on every statement, so the results show how many round trips a
+code path costs rather than how fast SQLite is.
+
+Run with:
+    python benchmark.py
+"""
+import http.client
+import json
+import random
+import sqlite3
+import string
+import threading
+import time
+import uuid
+import core
+from api import APIServer
+from coalescer import WriteCoalescer
+from catalog import TrigramIndex, BrandCatalog
+from db_pool import ConnectionPool
+from submission import SubmissionUnitOfWork, get_queries_target, BULLSEYE_REQUEST_INSERT, QUERIES_INSERT
+
+# Simulated client <-> warehouse round trip per statement (seconds)
+ROUND_TRIP = 0.002
+
+STAND_IN_SCHEMA = """
+CREATE TABLE IF NOT EXISTS BULLSEYE_REQUEST (
+    BRANDNAME, COMPANYNAME, CONCAT_LEAD_LIST_NAME, REQUEST_SUBMISSION_TIME, REQUEST_TYPE,
+    REQUESTOR, REQUESTOR_EMAIL, STATUS, ISMULTIPLEBRANDSUBMISSION, REQ_GUID, RUN_TYPE, URL
+);
+CREATE TABLE IF NOT EXISTS KEEPA_QUERIES (QUERY_TYPE, QUERY_VALUE, WRITE_TIME, REQUEST_GUID, STATUS);
+CREATE TABLE IF NOT EXISTS ECHO_QUERIES (QUERY_TYPE, QUERY_VALUE, WRITE_TIME, REQUEST_GUID, STATUS);
+"""
+
+def _to_sqlite(query):
+    """Translate the app's Snowflake SQL into something SQLite accepts"""
+    for schema in ("BOABD.POWERAPP.", "BOABD.INPUTDATA."):
+        query = query.replace(schema, "")
+    return query.replace("_DEV", "").replace("%s", "?")
+
+class StandInCursor:
+    """DB-API cursor over SQLite that charges one round trip per call"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection._db.cursor()
+
+    def execute(self, query, params=()):
+        self.connection.round_trip()
+        if query.strip().upper() == "BEGIN":
+            self.connection.pending = []
+        elif self.connection.pending is not None:
+            self.connection.pending.append((query, [params]))
+        else:
+            with self.connection._lock:
+                self._cursor.execute(_to_sqlite(query), params)
+        return self
+
+    def executemany(self, query, seq_of_params):
+        # One array-bound statement is one round trip, like the Snowflake connector
+        self.connection.round_trip()
+        if self.connection.pending is not None:
+            self.connection.pending.append((query, list(seq_of_params)))
+        else:
+            with self.connection._lock:
+                self._cursor.executemany(_to_sqlite(query), seq_of_params)
+        return self
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+class StandInConnection:
+    """DB-API connection to a shared in-memory SQLite database
+
+    Statements after BEGIN are held back and applied atomically at commit,
+    so connections used from different threads can have transactions open
+    at the same time, as they can against the warehouse.
+    """
+
+    def __init__(self, database, round_trip=ROUND_TRIP):
+        self._db = database.db
+        self._lock = database.lock
+        self._round_trip = round_trip
+        self.pending = None
+        self.statements = 0
+        self.closed = False
+
+    def round_trip(self):
+        self.statements += 1
+        if self._round_trip:
+            time.sleep(self._round_trip)
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def commit(self):
+        self.round_trip()
+        pending, self.pending = self.pending, None
+        if not pending:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for query, seq_of_params in pending:
+                    self._db.executemany(_to_sqlite(query), seq_of_params)
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def rollback(self):
+        self.pending = None
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+class StandInDatabase:
+    """Shared SQLite database that hands out StandInConnections"""
+
+    def __init__(self, round_trip=ROUND_TRIP):
+        self.db = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        self.db.executescript(STAND_IN_SCHEMA)
+        self.lock = threading.RLock()
+        self.round_trip = round_trip
+
+    def connect(self):
+        return StandInConnection(self, self.round_trip)
+
+    def count(self, table):
+        with self.lock:
+            return self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def _brands(count):
+    return [f"BENCH BRAND {i:06d}" for i in range(count)]
+
+def submit_row_by_row(database, brands):
+    """The previous flow: one INSERT per brand, then a connection per Keepa row and per status update"""
+    req_guid = str(uuid.uuid4())
+    conn = database.connect()
+    cursor = conn.cursor()
+    for brand in brands:
+        cursor.execute(BULLSEYE_REQUEST_INSERT, (
+            brand, "NOTSPECIFIEDUNUSED", "NOTSPECIFIEDUNUSED", "Amazon Brand Name",
+            "Benchmark", "bench@example.com", "0", "TRUE", req_guid, "Test", None
+        ))
+    conn.commit()
+    statements = conn.statements
+    for brand in brands:
+        keepa_conn = database.connect()
+        keepa_conn.round_trip()  # connection test query
+        table_name, query_type, query_value = get_queries_target("Brand", brand_name=brand)
+        keepa_conn.cursor().execute(QUERIES_INSERT.format(table_name=table_name), (query_type, query_value, req_guid, "0"))
+        keepa_conn.commit()
+        statements += keepa_conn.statements
+    status_conn = database.connect()
+    status_conn.cursor().execute(
+        "UPDATE BOABD.POWERAPP.BULLSEYE_REQUEST SET STATUS = %s WHERE REQ_GUID = %s", ("2", req_guid)
+    )
+    status_conn.commit()
+    return statements + status_conn.statements
+
+def submit_batched(database, brands):
+    """The unit-of-work flow: chunked executemany and one set-based status flip"""
+    uow = SubmissionUnitOfWork(run_type="Test")
+    for brand in brands:
+        uow.add_request(brand, "Amazon Brand Name", "Benchmark", "bench@example.com", "TRUE")
+        uow.add_query(*get_queries_target("Brand", brand_name=brand))
+    conn = database.connect()
+    uow.commit(conn)
+    return conn.statements
+
+def bench_multi_brand_submission(brand_counts=(10, 100, 1000, 5000)):
+    """Compare row-by-row and batched multi-brand submissions"""
+    print(f"Multi-brand submission ({ROUND_TRIP * 1000:.1f} ms simulated round trip)")
+    print(f"{'brands':>8} {'row-by-row':>14} {'stmts':>7} {'batched':>12} {'stmts':>7} {'speedup':>9}")
+    for count in brand_counts:
+        brands = _brands(count)
+
+        database = StandInDatabase()
+        started = time.perf_counter()
+        slow_statements = submit_row_by_row(database, brands)
+        slow = time.perf_counter() - started
+
+        database = StandInDatabase()
+        started = time.perf_counter()
+        fast_statements = submit_batched(database, brands)
+        fast = time.perf_counter() - started
+        assert database.count("BULLSEYE_REQUEST") == count
+        assert database.count("KEEPA_QUERIES") == count
+
+        print(f"{count:>8} {slow:>13.3f}s {slow_statements:>7} {fast:>11.3f}s {fast_statements:>7} {slow / fast:>8.1f}x")
+
+def _random_names(count, seed=42):
+    """Brand-like names: one to three words of 3-10 letters"""
+    generator = random.Random(seed)
+    def word():
+        return "".join(generator.choice(string.ascii_uppercase) for _ in range(generator.randint(3, 10)))
+    return [" ".join(word() for _ in range(generator.randint(1, 3))) for _ in range(count)]
+
+def bench_infix_search(name_counts=(10000, 100000, 300000), limit=100, queries=200):
+    """Compare trigram-index infix search with a linear scan over the same names"""
+    print(f"\nInfix search, LIMIT {limit} ({queries} queries per size)")
+    print(f"{'names':>8} {'build':>8} {'postings':>10} {'linear':>10} {'trigram':>10} {'speedup':>9}")
+    generator = random.Random(7)
+    for count in name_counts:
+        keys = sorted(_random_names(count))
+        # Realistic terms: 3-6 character slices of existing names, plus a few misses
+        terms = []
+        for _ in range(queries):
+            name = generator.choice(keys)
+            start = generator.randint(0, max(0, len(name) - 3))
+            terms.append(name[start:start + generator.randint(3, 6)])
+        terms[::10] = ["QZXJ"] * len(terms[::10])
+
+        started = time.perf_counter()
+        index = TrigramIndex(keys)
+        build = time.perf_counter() - started
+        postings_bytes = sum(posting.itemsize * len(posting) for posting in index.postings.values())
+
+        started = time.perf_counter()
+        expected = [[i for i, key in enumerate(keys) if term in key][:limit] for term in terms]
+        linear = (time.perf_counter() - started) / queries
+
+        started = time.perf_counter()
+        actual = [index.search(term, keys.__getitem__, limit) for term in terms]
+        trigram = (time.perf_counter() - started) / queries
+        assert actual == expected
+
+        print(f"{count:>8} {build:>7.2f}s {postings_bytes / 1e6:>8.1f}MB "
+              f"{linear * 1000:>8.2f}ms {trigram * 1000:>8.3f}ms {linear / trigram:>8.1f}x")
+
+def _typo(term, generator):
+    """Apply one random substitution, deletion or adjacent swap"""
+    position = generator.randrange(len(term) - 1)
+    edit = generator.choice(("substitute", "delete", "swap"))
+    if edit == "substitute":
+        return term[:position] + generator.choice(string.ascii_uppercase) + term[position + 1:]
+    if edit == "delete":
+        return term[:position] + term[position + 1:]
+    return term[:position] + term[position + 1] + term[position] + term[position + 2:]
+
+def bench_ranked_search(name_counts=(10000, 100000, 300000), limit=50, queries=200):
+    """Latency and typo recall of ranked (fuzzy) brand suggestions"""
+    print(f"\nRanked search, top {limit} ({queries} misspelled queries per size)")
+    print(f"{'names':>8} {'build':>8} {'mean':>9} {'p95':>9} {'found':>7}")
+    generator = random.Random(11)
+    for count in name_counts:
+        names = _random_names(count)
+        catalog = BrandCatalog(lambda: names)
+        started = time.perf_counter()
+        catalog.load(names)
+        build = time.perf_counter() - started
+
+        # Misspell 5-8 character words taken from real names
+        targets = []
+        while len(targets) < queries:
+            word = generator.choice(generator.choice(names).split())
+            if 5 <= len(word) <= 8:
+                targets.append(word)
+        timings, found = [], 0
+        for word in targets:
+            started = time.perf_counter()
+            suggestions = catalog.rank(_typo(word, generator), limit=limit)
+            timings.append(time.perf_counter() - started)
+            found += any(word in suggestion.upper() for suggestion in suggestions)
+        timings.sort()
+        mean = sum(timings) / len(timings)
+        p95 = timings[int(len(timings) * 0.95)]
+        print(f"{count:>8} {build:>7.2f}s {mean * 1000:>7.2f}ms {p95 * 1000:>7.2f}ms {found / queries:>6.0%}")
+
+def bench_brand_classification(catalog_size=300000, list_sizes=(100, 1000, 10000)):
+    """Time classifying pasted brand lists (half HubSpot brands, half new) against the catalog"""
+    print(f"\nPasted list classification against {catalog_size} catalog brands")
+    print(f"{'entries':>8} {'existing':>9} {'new':>7} {'time':>9}")
+    generator = random.Random(5)
+    names = _random_names(catalog_size)
+    catalog = BrandCatalog(lambda: names)
+    catalog.load(names)
+    for size in list_sizes:
+        # Existing brands typed in a different case, with stray spaces
+        entries = [f" {generator.choice(names).lower()} " for _ in range(size // 2)]
+        entries += [f"NEW BRAND {i}" for i in range(size - size // 2)]
+        generator.shuffle(entries)
+        started = time.perf_counter()
+        existing, new = catalog.classify(entries)
+        elapsed = time.perf_counter() - started
+        assert len(new) == size - size // 2
+        print(f"{size:>8} {len(existing):>9} {len(new):>7} {elapsed * 1000:>7.1f}ms")
+
+def bench_http_submissions(client_counts=(1, 8, 32), duration=3.0, brands_per_submission=3, pool_size=8):
+    """Load-test POST /submissions of api.py against the stand-in database
+
+    Each client keeps one HTTP connection open and sends small brand
+    submissions back to back for `duration` seconds.
+    """
+    print(f"\nHTTP submissions, {brands_per_submission} brands each, {pool_size} pooled connections "
+          f"({ROUND_TRIP * 1000:.1f} ms simulated round trip)")
+    print(f"{'clients':>8} {'requests':>9} {'per sec':>9} {'mean':>9} {'p95':>9}")
+    names = _random_names(10000)
+    core.get_brand_catalog().load(names)
+    core.get_company_catalog().load([])
+    for clients in client_counts:
+        database = StandInDatabase()
+        core.set_connection_pool(ConnectionPool(database.connect, max_size=pool_size, validate_after=None))
+        server = APIServer(("127.0.0.1", 0), workers=clients)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+        timings, errors = [], []
+        deadline = time.perf_counter() + duration
+
+        def client(seed):
+            generator = random.Random(seed)
+            connection = http.client.HTTPConnection("127.0.0.1", port)
+            while time.perf_counter() < deadline:
+                # Mix of HubSpot brands and new ones, so classification does real work
+                values = generator.sample(names, brands_per_submission - 1)
+                values.append(f"NEW BRAND {seed}-{len(timings)}-{generator.random()}")
+                body = json.dumps({"retailer": "Amazon", "kind": "Brand", "values": values,
+                                   "requestor": "Benchmark", "requestor_email": "bench@example.com"}).encode()
+                started = time.perf_counter()
+                connection.request("POST", "/submissions", body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                payload = json.loads(response.read())
+                timings.append(time.perf_counter() - started)
+                if response.status != 200:
+                    errors.append(payload)
+            connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        server.shutdown()
+        server.server_close()
+        assert not errors, errors[:3]
+        assert database.count("BULLSEYE_REQUEST") == len(timings) * brands_per_submission
+
+        timings.sort()
+        mean = sum(timings) / len(timings)
+        p95 = timings[int(len(timings) * 0.95)]
+        print(f"{clients:>8} {len(timings):>9} {len(timings) / elapsed:>9.0f} {mean * 1000:>7.1f}ms {p95 * 1000:>7.1f}ms")
+
+def bench_coalesced_submissions(session_counts=(1, 8, 32), duration=2.0, brands_per_submission=3, pool_size=8):
+    """Compare sessions committing their own submissions with the shared write coalescer
+
+    Each simulated session submits small brand lists back to back for
+    `duration` seconds, either through its own pooled connection and
+    transaction or through one WriteCoalescer shared by all sessions.
+    """
+    print(f"\nConcurrent sessions, {brands_per_submission} brands per submission, {pool_size} pooled connections "
+          f"({ROUND_TRIP * 1000:.1f} ms simulated round trip)")
+    print(f"{'sessions':>8} {'mode':>10} {'per sec':>9} {'stmts/sub':>10} {'mean':>9} {'p95':>9}")
+    for sessions in session_counts:
+        for mode in ("direct", "coalesced"):
+            database = StandInDatabase()
+            connections = []
+
+            def connect():
+                conn = database.connect()
+                connections.append(conn)
+                return conn
+
+            pool = ConnectionPool(connect, max_size=pool_size, validate_after=None)
+            coalescer = WriteCoalescer(pool.connection) if mode == "coalesced" else None
+            timings = []
+            deadline = time.perf_counter() + duration
+
+            def session(number):
+                count = 0
+                while time.perf_counter() < deadline:
+                    uow = SubmissionUnitOfWork(run_type="Test")
+                    for i in range(brands_per_submission):
+                        brand = f"BRAND {number}-{count}-{i}"
+                        uow.add_request(brand, "Amazon Brand Name", "Benchmark", "bench@example.com", "TRUE")
+                        uow.add_query(*get_queries_target("Brand", brand_name=brand))
+                    started = time.perf_counter()
+                    if coalescer is not None:
+                        coalescer.write(uow)
+                    else:
+                        with pool.connection() as conn:
+                            uow.commit(conn)
+                    timings.append(time.perf_counter() - started)
+                    count += 1
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            assert database.count("BULLSEYE_REQUEST") == len(timings) * brands_per_submission
+            assert database.count("KEEPA_QUERIES") == len(timings) * brands_per_submission
+
+            statements = sum(conn.statements for conn in connections)
+            timings.sort()
+            mean = sum(timings) / len(timings)
+            p95 = timings[int(len(timings) * 0.95)]
+            print(f"{sessions:>8} {mode:>10} {len(timings) / elapsed:>9.0f} {statements / len(timings):>10.2f} "
+                  f"{mean * 1000:>7.1f}ms {p95 * 1000:>7.1f}ms")
+
+if __name__ == "__main__":
+    bench_multi_brand_submission()
+    bench_infix_search()
+    bench_ranked_search()
+    bench_brand_classification()
+    bench_coalesced_submissions()
+    bench_http_submissions()
@@ -0,0 +1,214 @@
+import itertools
+import re
+import pandas as pd
+from openpyxl import load_workbook
+from config import SUBMISSION_CHUNK_ROWS
+from catalog import normalize_brand_name
+from submission import get_queries_target, submit_in_chunks, NOT_SPECIFIED
+
+# What an uploaded file may contain, per retailer
+UPLOAD_KINDS = {
+    "Amazon": ("Brand", "Company"),
+    "Walmart": ("Brand",),
+    "Target": ("Brand",),
+    "Home Depot": ("URL",),
+    "Lowes": ("URL",),
+}
+
+# Accepted column headers per kind (case-insensitive); otherwise the first column is used
+UPLOAD_COLUMNS = {
+    "Brand": ("brand", "brand_name", "brand name", "brandname"),
+    "Company": ("company_id", "company id", "companyid", "id"),
+    "URL": ("url", "brand_url", "brand url", "link"),
+}
+
+# Same rule as x_amazon.validate_url
+URL_PATTERN = r'^https?://([a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}(/[a-zA-Z0-9-._~:/?#[\]@!$&\'()*+,;=]*)?$'
+_URL = re.compile(URL_PATTERN)
+_EXCEL_NUMBER_SUFFIX = re.compile(r"\.0+$")
+
+def is_excel(filename):
+    return filename.lower().endswith((".xlsx", ".xlsm"))
+
+def count_upload_rows(file, filename):
+    """Approximate number of data rows, for progress reporting"""
+    if is_excel(filename):
+        workbook = load_workbook(file, read_only=True)
+        try:
+            # Taken from the sheet's dimension record, without reading the rows
+            return max((workbook.active.max_row or 1) - 1, 0)
+        finally:
+            workbook.close()
+            file.seek(0)
+    count = file.getvalue().count(b"\n")
+    return max(count - 1, 0)
+
+def _read_excel_chunks(file, chunk_rows):
+    """Yield DataFrames of the first sheet, streaming rows with openpyxl's read-only mode"""
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(value) if value is not None else f"column_{i}" for i, value in enumerate(header)]
+        width = len(columns)
+        while True:
+            batch = list(itertools.islice(rows, chunk_rows))
+            if not batch:
+                break
+            # Short rows are padded, extra cells dropped
+            batch = [tuple(row[:width]) + (None,) * (width - len(row)) for row in batch]
+            yield pd.DataFrame(batch, columns=columns, dtype="object")
+    finally:
+        workbook.close()
+
+def read_upload_chunks(file, filename, chunk_rows=SUBMISSION_CHUNK_ROWS):
+    """Yield an uploaded CSV/XLSX file as DataFrames of at most `chunk_rows` rows"""
+    if is_excel(filename):
+        yield from _read_excel_chunks(file, chunk_rows)
+    else:
+        yield from pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+
+def find_upload_column(columns, kind):
+    """The column holding `kind` values: a known header, else the first column"""
+    for column in columns:
+        if str(column).strip().lower() in UPLOAD_COLUMNS[kind]:
+            return column
+    return columns[0]
+
+def clean_values(values, kind, seen):
+    """Trim, validate and deduplicate one chunk of values
+
+    Returns (values, invalid, duplicates); `seen` holds the keys of values
+    accepted from earlier chunks and is updated in place. A plain loop, which
+    beats pandas string methods on both small lists and 5000-row chunks.
+    """
+    cleaned, invalid, duplicates = [], 0, 0
+    for value in values:
+        value = "" if value is None else str(value).strip()
+        if not value:
+            continue
+        if kind == "Brand":
+            key, valid = normalize_brand_name(value), True
+        elif kind == "Company":
+            # Excel stores ids as numbers, which can come back as "12345.0"
+            value = _EXCEL_NUMBER_SUFFIX.sub("", value)
+            key, valid = value, value.isascii() and value.isdigit()
+        else:  # URL
+            key, valid = value, _URL.fullmatch(value) is not None
+        if not valid:
+            invalid += 1
+        elif key in seen:
+            duplicates += 1
+        else:
+            seen.add(key)
+            cleaned.append(value)
+    return cleaned, invalid, duplicates
+
+def iter_upload_values(file, filename, kind, chunk_rows=SUBMISSION_CHUNK_ROWS):
+    """Yield (values, invalid, duplicates) per chunk of an uploaded file
+
+    Values are trimmed and validated for their kind (URL format, numeric
+    company ids) and deduplicated across the whole file; only the set of keys
+    seen so far is kept between chunks.
+    """
+    seen = set()
+    column = None
+    for frame in read_upload_chunks(file, filename, chunk_rows):
+        if column is None:
+            column = find_upload_column(list(frame.columns), kind)
+        yield clean_values(frame[column], kind, seen)
+
+def iter_value_chunks(values, kind, chunk_rows=SUBMISSION_CHUNK_ROWS):
+    """Yield (values, invalid, duplicates) per chunk of a list of values, like iter_upload_values"""
+    seen = set()
+    for start in range(0, len(values), chunk_rows):
+        yield clean_values(values[start:start + chunk_rows], kind, seen)
+
+def add_upload_rows(uow, values, kind, retailer, requestor, requestor_email,
+                    classify_brands=None, get_company=None, summary=None):
+    """Queue the BULLSEYE_REQUEST and KEEPA/ECHO rows for one chunk of uploaded values"""
+    x_amazon_type = None if retailer == "Amazon" else retailer
+    is_multiple = "TRUE" if retailer == "Amazon" else "Yes"
+    summary = summary if summary is not None else {}
+
+    if kind == "Brand":
+        # Brands already in HubSpot keep the regular request type
+        existing, new = classify_brands(values) if classify_brands else ([], values)
+        regular_type = "Amazon Brand Name" if retailer == "Amazon" else f"{retailer} Brand"
+        for request_type, brands in [(regular_type, existing), (f"{regular_type} New", new)]:
+            for brand in brands:
+                uow.add_request(brand, request_type, requestor, requestor_email, is_multiple)
+                uow.add_query(*get_queries_target("Brand", x_amazon_type, brand_name=brand))
+        summary['existing'] = summary.get('existing', 0) + len(existing)
+        summary['new'] = summary.get('new', 0) + len(new)
+    elif kind == "Company":
+        for company_id in values:
+            company_data = get_company(company_id)
+            if company_data is None:
+                summary['unknown'] = summary.get('unknown', 0) + 1
+                continue
+            uow.add_request(
+                NOT_SPECIFIED, "Amazon Company Name", requestor, requestor_email, is_multiple,
+                company_name=company_data[1],
+                concat_lead_list_name=company_data[3]
+            )
+            uow.add_query(*get_queries_target("Company", company_data=company_data))
+    else:  # URL
+        request_type = "HomeDepot Brand" if retailer == "Home Depot" else "Lowes Brand"
+        for url in values:
+            uow.add_request(NOT_SPECIFIED, request_type, requestor, requestor_email, is_multiple, url_value=url)
+            uow.add_query(*get_queries_target("Brand", x_amazon_type, brand_name=url))
+    return len(uow)
+
+def submit_upload(chunks, kind, retailer, requestor, requestor_email, connection,
+                  classify_brands=None, get_company=None, run_type=None, req_guid=None,
+                  checkpoints=None, key=None, retries=2, on_chunk=None, writer=None):
+    """Write an uploaded file chunk by chunk under one REQ_GUID
+
+    `chunks` comes from iter_upload_values and `connection` is a context
+    manager factory yielding a DB-API connection (e.g. ConnectionPool.connection).
+    Chunks are written through submission.submit_in_chunks: each in its own
+    transaction, checkpointed under `key` so a retry of the same file resumes,
+    and released for processing only once every chunk is in; a file that
+    fits in one chunk is committed through `writer(uow)` if given.
+    `on_chunk(summary)` is called after each chunk. Raises on failure.
+    """
+    summary = {
+        'req_guid': None,
+        'resumed': False,
+        'chunks': 0,
+        'rows_read': 0,
+        'submitted': 0,
+        'existing': 0,
+        'new': 0,
+        'unknown': 0,
+        'invalid': 0,
+        'duplicates': 0,
+    }
+
+    def add_rows(uow, chunk):
+        values, invalid, duplicates = chunk
+        add_upload_rows(uow, values, kind, retailer, requestor, requestor_email,
+                        classify_brands, get_company, summary)
+        summary['rows_read'] += len(values) + invalid + duplicates
+        summary['invalid'] += invalid
+        summary['duplicates'] += duplicates
+
+    def update(progress):
+        summary.update(req_guid=progress['req_guid'], resumed=progress['resumed'],
+                       chunks=progress['chunks'], submitted=progress['rows'])
+
+    def report(progress):
+        update(progress)
+        if on_chunk:
+            on_chunk(summary)
+
+    progress = submit_in_chunks(
+        chunks, add_rows, connection, run_type=run_type, req_guid=req_guid, checkpoints=checkpoints,
+        key=key, details={'retailer': retailer, 'kind': kind}, retries=retries, on_chunk=report,
+        writer=writer
+    )
+    update(progress)
+    return summary
@@ -0,0 +1,439 @@
+import logging
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Separator between names in the search blob; never part of a brand name
+_SEPARATOR = "\x00"
+
+# Fuzzy matching compares at most this many leading characters of each name
+FUZZY_MAX_NAME_LENGTH = 64
+
+# Characters that are wildcards in SQL LIKE, which a plain substring search can't reproduce
+LIKE_WILDCARDS = ("%", "_")
+
+class TrigramIndex:
+    """Trigram inverted index for infix (LIKE '%term%') search over case-folded keys
+
+    Each trigram maps to an ascending array('I') of key ids. A query walks the
+    shortest posting list, keeps ids present in every other list (binary
+    search), and verifies the full term against the key, so results come out
+    in id order and the walk stops as soon as `limit` matches are found.
+    """
+
+    def __init__(self, keys):
+        self.size = 0
+        self.postings = {}
+        for key in keys:
+            self.add(key)
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, key):
+        """Index the next key; ids are assigned in insertion order"""
+        key_id = self.size
+        postings = self.postings
+        for trigram in self.trigrams(key):
+            posting = postings.get(trigram)
+            if posting is None:
+                posting = postings[trigram] = array('I')
+            posting.append(key_id)
+        self.size += 1
+
+    def search(self, term, get_key, limit):
+        """Ids whose key contains `term`, or None if the term is too short to index"""
+        if len(term) < 3:
+            return None
+        postings = []
+        for trigram in self.trigrams(term):
+            posting = self.postings.get(trigram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        shortest, others = postings[0], postings[1:]
+
+        results = []
+        for key_id in shortest:
+            for posting in others:
+                position = bisect_left(posting, key_id)
+                if position == len(posting) or posting[position] != key_id:
+                    break
+            else:
+                # Trigrams can match out of order, so verify the whole term
+                if term in get_key(key_id):
+                    results.append(key_id)
+                    if len(results) >= limit:
+                        break
+        return results
+
+# Lists shorter than this are classified in plain Python, below pandas' per-call overhead
+CLASSIFY_VECTORIZE_MIN = 64
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_brand_name(name):
+    """Upper-cased, trimmed name with runs of whitespace collapsed (one name of normalize_brand_names)"""
+    return _WHITESPACE.sub(" ", name.strip()).upper()
+
+def normalize_brand_names(names):
+    """Upper-cased, trimmed names with runs of whitespace collapsed, as a string Series"""
+    return (pd.Series(list(names), dtype="object").astype("string")
+            .str.strip().str.replace(r"\s+", " ", regex=True).str.upper())
+
+def classify_brands(entries, lookup):
+    """Split entered brand names into (existing, new) against a normalized lookup
+
+    `lookup` is a Series of HubSpot names indexed by their normalized form.
+    Blank and repeated entries are dropped; existing brands are returned in
+    their HubSpot spelling, new ones as entered (trimmed).
+    """
+    entries = list(entries)
+    if len(entries) < CLASSIFY_VECTORIZE_MIN:
+        existing, new, seen = [], [], set()
+        for entry in entries:
+            entry = entry.strip() if isinstance(entry, str) else ""
+            key = normalize_brand_name(entry)
+            if not entry or key in seen:
+                continue
+            seen.add(key)
+            if key in lookup.index:
+                existing.append(lookup[key])
+            else:
+                new.append(entry)
+        return list(dict.fromkeys(existing)), new
+
+    entries = pd.Series(list(entries), dtype="object").astype("string").str.strip()
+    entries = entries[entries.notna() & (entries != "")]
+    frame = pd.DataFrame({'entry': entries, 'key': normalize_brand_names(entries).values})
+    frame = frame.drop_duplicates('key')
+    matched = frame['key'].isin(lookup.index)
+    existing = lookup.reindex(frame.loc[matched, 'key']).tolist()
+    new = frame.loc[~matched, 'entry'].tolist()
+    return list(dict.fromkeys(existing)), new
+
+def substring_edit_distance(term, names):
+    """Edit distance from `term` to its closest substring in each name
+
+    `names` is a (candidates, length) array of code points padded with zeros.
+    Rows of the edit table (Levenshtein plus adjacent transpositions) are
+    computed for all candidates at once; a match may start and end anywhere
+    in the name, so a typo inside a longer brand name costs the same as in
+    the bare name.
+    """
+    positions = np.arange(names.shape[1] + 1)
+    # Row 0 is all zeros: skipping leading characters of the name is free
+    previous = np.zeros((names.shape[0], names.shape[1] + 1), dtype=np.int32)
+    before_previous, last_char = None, None
+    for char in np.array([term]).view(np.uint32).tolist():
+        # Deleting the term character, or matching / substituting it
+        current = previous + 1
+        np.minimum(current[:, 1:], previous[:, :-1] + (names != char), out=current[:, 1:])
+        if before_previous is not None:
+            # Swapping this character with the previous one counts as one edit
+            swapped = (names[:, :-1] == char) & (names[:, 1:] == last_char)
+            current[:, 2:] = np.where(swapped, np.minimum(current[:, 2:], before_previous[:, :-2] + 1), current[:, 2:])
+        # Inserting name characters: D[j] = min over k <= j of D[k] + (j - k)
+        current = np.minimum.accumulate(current - positions, axis=1) + positions
+        before_previous, previous, last_char = previous, current, char
+    return previous.min(axis=1)
+
+class _NameIndex:
+    """Immutable infix search structure over an ordered list of names"""
+
+    def __init__(self, names):
+        upper_names = [(name or "").upper().replace(_SEPARATOR, " ") for name in names]
+        # One case-folded string for all names; str.find scans it in C
+        self.blob = _SEPARATOR.join(upper_names)
+        self.offsets = array('I')
+        position = 0
+        for upper_name in upper_names:
+            self.offsets.append(position)
+            position += len(upper_name) + 1
+        self.index = TrigramIndex(upper_names)
+        # Positions ordered by upper-cased name, for prefix lookups
+        self.sorted_ids = array('I', sorted(range(len(upper_names)), key=upper_names.__getitem__))
+
+    def key(self, index):
+        """Upper-cased name at `index`, sliced out of the blob"""
+        end = self.offsets[index + 1] - 1 if index + 1 < len(self.offsets) else len(self.blob)
+        return self.blob[self.offsets[index]:end]
+
+    def search(self, term, limit):
+        """Positions of names containing `term` (already upper-cased), in list order"""
+        results = []
+        if not term or _SEPARATOR in term:
+            return results
+        # Terms of three or more characters go through the trigram index
+        ids = self.index.search(term, self.key, limit)
+        if ids is not None:
+            return ids
+
+        # Shorter terms match so many names that a scan of the blob finishes almost at once
+        blob, offsets = self.blob, self.offsets
+        position = blob.find(term)
+        while position != -1 and len(results) < limit:
+            index = bisect_right(offsets, position) - 1
+            results.append(index)
+            # Continue after this name so each name is returned once
+            if index + 1 >= len(offsets):
+                break
+            position = blob.find(term, offsets[index + 1])
+        return results
+
+    def prefix_search(self, term, limit):
+        """Positions of names starting with `term` (already upper-cased), alphabetically"""
+        results = []
+        start = bisect_left(self.sorted_ids, term, key=self.key)
+        for index in self.sorted_ids[start:start + limit]:
+            if not self.key(index).startswith(term):
+                break
+            results.append(index)
+        return results
+
+    def fuzzy_search(self, term, limit, exclude=(), max_candidates=256):
+        """Positions of names approximately containing `term`, best first
+
+        Candidates are the names sharing the most trigrams with the term or
+        with a copy of it with two adjacent characters swapped (counted with
+        one bincount over the posting lists); they are then scored by
+        substring edit distance and ranked by distance, shared trigrams,
+        closeness in length and position.
+        """
+        trigrams = TrigramIndex.trigrams(term)
+        for i in range(len(term) - 1):
+            trigrams |= TrigramIndex.trigrams(term[:i] + term[i + 1] + term[i] + term[i + 2:])
+        postings = [self.index.postings.get(trigram) for trigram in trigrams]
+        postings = [np.frombuffer(posting, dtype=np.uint32) for posting in postings if posting]
+        if not postings:
+            return []
+        shared = np.bincount(np.concatenate(postings))
+        excluded = [index for index in exclude if index < len(shared)]
+        shared[excluded] = 0
+        candidates = np.flatnonzero(shared)
+        if len(candidates) > max_candidates:
+            candidates = candidates[np.argpartition(shared[candidates], -max_candidates)[-max_candidates:]]
+        if not len(candidates):
+            return []
+
+        keys = [self.key(index)[:FUZZY_MAX_NAME_LENGTH] for index in candidates.tolist()]
+        names = np.array(keys)
+        names = names.view(np.uint32).reshape(len(keys), -1)
+        distances = substring_edit_distance(term, names)
+
+        # Roughly one typo per three characters
+        keep = distances <= max(1, len(term) // 3)
+        candidates, distances = candidates[keep], distances[keep]
+        length_gaps = np.abs(np.array([len(key) for key in keys])[keep] - len(term))
+        order = np.lexsort((candidates, length_gaps, -shared[candidates], distances))
+        return candidates[order][:limit].tolist()
+
+    def ranked_search(self, term, limit):
+        """Positions of names matching `term` (already upper-cased), best first
+
+        Prefix matches come first, then other names containing the term, then
+        fuzzy matches for terms of three or more characters.
+        """
+        if not term or _SEPARATOR in term:
+            return []
+        results = self.prefix_search(term, limit)
+        seen = set(results)
+        for index in self.search(term, limit + len(results)):
+            if len(results) >= limit:
+                break
+            if index not in seen:
+                seen.add(index)
+                results.append(index)
+        if len(results) < limit and len(term) >= 3:
+            results.extend(self.fuzzy_search(term, limit - len(results), exclude=seen))
+        return results
+
+class _Catalog:
+    """Process-wide, in-memory copy of a HubSpot lookup table, refreshed in the background
+
+    Data is loaded through `loader` (a zero-argument callable) and reloaded
+    every `refresh_interval` seconds; until the first load finishes `search`
+    returns None so callers can fall back to the warehouse. Subclasses turn
+    the loaded data into an immutable snapshot with `_build`.
+    """
+
+    name = "catalog"
+
+    def __init__(self, loader, refresh_interval=900):
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._loaded_at = None
+        self._refreshing = False  # a background refresh is running
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # held while loading
+        self._stats = {'searches': 0, 'fallbacks': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+    def _build(self, data):
+        raise NotImplementedError
+
+    def load(self, data):
+        """Replace the catalog contents"""
+        snapshot = self._build(data)
+        self._snapshot, self._loaded_at = snapshot, time.monotonic()
+        return snapshot
+
+    def refresh(self):
+        """Reload the catalog synchronously from the loader
+
+        Refreshes never overlap: a call made while another one is loading
+        waits for it and doesn't load again if that one succeeded.
+        """
+        requested_at = time.monotonic()
+        with self._refresh_lock:
+            loaded_at = self._loaded_at
+            if loaded_at is not None and loaded_at >= requested_at:
+                return
+            try:
+                self.load(self._loader())
+                with self._lock:
+                    self._stats['refreshes'] += 1
+            except Exception:
+                logger.exception("Error refreshing %s", self.name)
+                with self._lock:
+                    self._stats['refresh_errors'] += 1
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _refresh_in_background(self):
+        """Start a background reload if the catalog is missing or stale"""
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name=f"{self.name}-refresh", daemon=True).start()
+
+    @property
+    def is_loaded(self):
+        return self._snapshot is not None
+
+    def _searchable_snapshot(self, search_term):
+        """The current snapshot, or None (counted as a fallback) if it can't answer the term"""
+        self._refresh_in_background()
+        snapshot = self._snapshot
+        if snapshot is None or any(wildcard in search_term for wildcard in LIKE_WILDCARDS):
+            with self._lock:
+                self._stats['fallbacks'] += 1
+            return None
+        with self._lock:
+            self._stats['searches'] += 1
+        return snapshot
+
+    def _size(self, snapshot):
+        raise NotImplementedError
+
+    def stats(self):
+        """Snapshot of catalog size and counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot['size'] = self._size(self._snapshot) if self._snapshot is not None else 0
+        return snapshot
+
+class BrandCatalog(_Catalog):
+    """In-memory HubSpot brand list for typeahead search
+
+    Serves `UPPER(brand) LIKE '%term%' ORDER BY brand_name LIMIT n` locally;
+    `loader` returns brand names.
+    """
+
+    name = "brand-catalog"
+
+    def _build(self, names):
+        # Same order as ORDER BY brand_name (binary collation)
+        names = tuple(sorted({name for name in names if name}))
+        # HubSpot spelling by normalized name, for classifying pasted lists
+        lookup = pd.Series(names, index=normalize_brand_names(names).values, dtype="object")
+        lookup = lookup[~lookup.index.duplicated()]
+        return names, _NameIndex(names), lookup
+
+    def _size(self, snapshot):
+        return len(snapshot[0])
+
+    def names(self):
+        """All brand names in the loaded catalog (empty until loaded)"""
+        snapshot = self._snapshot
+        return snapshot[0] if snapshot is not None else ()
+
+    def search(self, search_term, limit=100):
+        """Brands whose upper-cased name contains the term, or None if the catalog can't answer"""
+        snapshot = self._searchable_snapshot(search_term)
+        if snapshot is None:
+            return None
+        names, index, _ = snapshot
+        return [names[position] for position in index.search(search_term.upper(), limit)]
+
+    def rank(self, search_term, limit=50):
+        """Best-matching brands for the term, typos included, or None until the catalog has loaded"""
+        self._refresh_in_background()
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        with self._lock:
+            self._stats['ranked_searches'] = self._stats.get('ranked_searches', 0) + 1
+        names, index, _ = snapshot
+        return [names[position] for position in index.ranked_search(search_term.strip().upper(), limit)]
+
+    def classify(self, brands):
+        """Split brand names into (existing, new) against HubSpot, or None until the catalog has loaded"""
+        self._refresh_in_background()
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return classify_brands(brands, snapshot[2])
+
+class CompanyCatalog(_Catalog):
+    """In-memory HubSpot company list keyed by company_id
+
+    `loader` returns (company_id, company_name, concat_lead_list_name,
+    concat_lead_list_name_final) rows, the same shape as the company search
+    query. Rows are searchable by name with `UPPER(company_name) LIKE
+    UPPER('%term%') ORDER BY company_name LIMIT n` semantics and can be looked
+    up by id in O(1).
+    """
+
+    name = "company-catalog"
+
+    def _build(self, rows):
+        rows = tuple(sorted((tuple(row) for row in rows), key=lambda row: row[1] or ""))
+        by_id = {}
+        for row in rows:
+            by_id.setdefault(row[0], row)
+        return rows, _NameIndex([row[1] for row in rows]), by_id
+
+    def _size(self, snapshot):
+        return len(snapshot[2])
+
+    def get(self, company_id):
+        """The company row for `company_id`, or None if unknown or not loaded yet"""
+        self._refresh_in_background()
+        snapshot = self._snapshot
+        return snapshot[2].get(company_id) if snapshot is not None else None
+
+    def search(self, search_term, limit=100):
+        """Company rows whose name contains the term, or None if the catalog can't answer"""
+        snapshot = self._searchable_snapshot(search_term)
+        if snapshot is None:
+            return None
+        rows, index, _ = snapshot
+        return [rows[position] for position in index.search(search_term.upper(), limit)]
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submission_checkpoints (
+    req_guid TEXT PRIMARY KEY,
+    job_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    chunks_committed INTEGER NOT NULL DEFAULT 0,
+    rows_committed INTEGER NOT NULL DEFAULT 0,
+    details TEXT,
+    error TEXT,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submission_checkpoints_job ON submission_checkpoints (job_key, status);
+"""
+
+def job_key(*parts):
+    """Stable identity of a submission's input, so a retry of the same input finds its checkpoint"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class CheckpointStore:
+    """Local SQLite record of chunked submissions, keyed by REQ_GUID
+
+    Each chunked submission is recorded as "running" with the number of
+    chunks and BULLSEYE_REQUEST rows committed so far, then marked "done"
+    (or "failed"). A retry of the same input (same `job_key`) finds the
+    unfinished record and continues under the same REQ_GUID.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(CHECKPOINT_SCHEMA)
+
+    def find_unfinished(self, key):
+        """(req_guid, chunks_committed, rows_committed) of the latest unfinished run of `key`, or None"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT req_guid, chunks_committed, rows_committed FROM submission_checkpoints "
+                "WHERE job_key = ? AND status != 'done' ORDER BY started_at DESC LIMIT 1",
+                (key,)
+            ).fetchone()
+
+    def start(self, key, req_guid, details=None):
+        """Record a new chunked submission (or reopen an unfinished one)"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO submission_checkpoints (req_guid, job_key, status, details, started_at, updated_at) "
+                "VALUES (?, ?, 'running', ?, ?, ?) "
+                "ON CONFLICT (req_guid) DO UPDATE SET status = 'running', error = NULL, updated_at = excluded.updated_at",
+                (req_guid, key, json.dumps(details or {}), now, now)
+            )
+
+    def record_chunk(self, req_guid, chunks_committed, rows_committed):
+        """Remember that the first `chunks_committed` chunks are in Snowflake"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE submission_checkpoints SET chunks_committed = ?, rows_committed = ?, updated_at = ? "
+                "WHERE req_guid = ?",
+                (chunks_committed, rows_committed, time.time(), req_guid)
+            )
+
+    def finish(self, req_guid):
+        with self._lock:
+            self._db.execute(
+                "UPDATE submission_checkpoints SET status = 'done', updated_at = ? WHERE req_guid = ?",
+                (time.time(), req_guid)
+            )
+
+    def fail(self, req_guid, error):
+        with self._lock:
+            self._db.execute(
+                "UPDATE submission_checkpoints SET status = 'failed', error = ?, updated_at = ? WHERE req_guid = ?",
+                (str(error), time.time(), req_guid)
+            )
+
+    def get(self, req_guid):
+        """The checkpoint record for `req_guid` as a dict, or None"""
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM submission_checkpoints WHERE req_guid = ?", (req_guid,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
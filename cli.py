@@ -0,0 +1,85 @@
+"""Headless batch entry point: search HubSpot and submit requests without Streamlit
+
+Uses the same pipeline as the app (core.py): validation, HubSpot brand
+classification, batched and checkpointed writes. Credentials come from the
+RPA_BULLSEYE_SNOWFLAKE_* environment variables. Results are printed as JSON.
+
+Examples:
+    python cli.py submit --retailer Amazon --kind Brand --requestor "Jane Doe" --email jane@example.com brands.csv
+    cat urls.txt | python cli.py submit --retailer "Home Depot" --kind URL --requestor "Jane Doe" --email jane@example.com -
+    python cli.py search brand "acme"
+"""
+import argparse
+import io
+import json
+import sys
+from config import SUBMISSION_CHUNK_ROWS
+from checkpoint import job_key
+from bulk_upload import UPLOAD_KINDS, is_excel, iter_upload_values
+import core
+
+def read_values(source):
+    """One value per line of a text file or stdin ("-")"""
+    if source == "-":
+        text = sys.stdin.read()
+    else:
+        with open(source, encoding="utf-8-sig") as file:
+            text = file.read()
+    return [line for line in text.splitlines() if line.strip()]
+
+def run_submit(args):
+    def on_chunk(summary):
+        if not args.quiet:
+            print(f"chunk {summary['chunks']}: {summary['submitted']} rows written", file=sys.stderr)
+
+    if args.source != "-" and (is_excel(args.source) or args.source.lower().endswith(".csv")):
+        with open(args.source, "rb") as file:
+            data = file.read()
+        # Same checkpoint key as uploading the file in the app
+        key = job_key(data, args.retailer, args.kind, SUBMISSION_CHUNK_ROWS, args.email)
+        chunks = iter_upload_values(io.BytesIO(data), args.source, args.kind)
+        return core.submit_values(chunks, args.kind, args.retailer, args.requestor, args.email,
+                                  key=key, on_chunk=on_chunk)
+    return core.submit_values(read_values(args.source), args.kind, args.retailer, args.requestor, args.email,
+                              on_chunk=on_chunk)
+
+def run_search(args):
+    item_type = "Brand Name" if args.item_type == "brand" else "Company Name"
+    results = core.find_items(args.term, item_type)
+    if item_type == "Company Name":
+        results = [dict(zip(core.COMPANY_COLUMNS, row)) for row in results]
+    return results[:args.limit]
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Submit Bullseye requests or search HubSpot without the Streamlit app")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="Submit brands, company ids or brand URLs")
+    submit.add_argument("source", help='CSV/XLSX file (column brand, company_id or url), text file with one value per line, or "-" for stdin')
+    submit.add_argument("--retailer", required=True, choices=list(UPLOAD_KINDS))
+    submit.add_argument("--kind", default="Brand", choices=["Brand", "Company", "URL"])
+    submit.add_argument("--requestor", required=True, help="Requestor name recorded on every request")
+    submit.add_argument("--email", required=True, help="Requestor email recorded on every request")
+    submit.add_argument("--quiet", action="store_true", help="Don't report progress on stderr")
+    submit.set_defaults(run=run_submit)
+
+    search = commands.add_parser("search", help="Search HubSpot brands or companies")
+    search.add_argument("item_type", choices=["brand", "company"])
+    search.add_argument("term")
+    search.add_argument("--limit", type=int, default=100)
+    search.set_defaults(run=run_search)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        result = args.run(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    json.dump(result, sys.stdout, indent=2, default=str)
+    print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
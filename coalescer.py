@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from submission import SubmissionUnitOfWork, existing_request_guids
+
+logger = logging.getLogger(__name__)
+
+class WriteCoalescer:
+    """Process-wide group commit for submissions from every session
+
+    `submit(uow)` queues a unit of work and returns a Future. A writer thread
+    merges everything queued into one unit of work and commits it, so
+    concurrent submissions share their INSERT batches, status update and
+    commit. While another batch is being written, a writer first waits up to
+    `max_delay` seconds after the first queued submission (or until
+    `max_rows` rows are waiting) to let the batch fill; a submission arriving
+    when nothing else is being written goes out straight away.
+
+    Each Future resolves to the submission's row count once its rows are
+    committed. If a merged batch fails, the REQ_GUIDs are checked against
+    BULLSEYE_REQUEST (the commit may have gone through) and otherwise every
+    submission is retried in its own transaction, so one bad submission only
+    fails its own Future.
+    """
+
+    def __init__(self, connection, max_rows=5000, max_delay=0.005, writers=4):
+        self.connection = connection  # context manager factory yielding a DB-API connection
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.writers = writers
+
+        self._queue = deque()
+        self._queued_rows = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._workers = []
+        self._writing = 0
+        self._stats = {
+            'submitted': 0,
+            'written': 0,
+            'failed': 0,
+            'batches': 0,
+            'fallback_batches': 0,
+            'largest_batch': 0,
+        }
+
+    def start(self):
+        """Start the writers if they aren't running yet"""
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.writers:
+                worker = threading.Thread(target=self._run, name=f"write-coalescer-{len(self._workers)}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, uow):
+        """Queue a unit of work; returns a Future resolved once it is committed"""
+        future = Future()
+        with self._ready:
+            self._queue.append((uow, future))
+            self._queued_rows += len(uow)
+            self._stats['submitted'] += 1
+            self._ready.notify()
+        self.start()
+        return future
+
+    def write(self, uow, timeout=None):
+        """Queue a unit of work and wait for it to be committed (raises if it wasn't)"""
+        return self.submit(uow).result(timeout)
+
+    def _collect(self):
+        """Wait for a batch of up to `max_rows` rows, filling it for `max_delay` while other batches are in flight"""
+        with self._ready:
+            while True:
+                while not self._queue:
+                    self._ready.wait()
+                deadline = time.monotonic() + self.max_delay
+                while self._writing and self._queued_rows < self.max_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(remaining)
+                # Another writer may have taken everything while this one waited
+                if self._queue:
+                    break
+            batch, rows = [], 0
+            while self._queue and (not batch or rows + len(self._queue[0][0]) <= self.max_rows):
+                uow, future = self._queue.popleft()
+                rows += len(uow)
+                batch.append((uow, future))
+            self._queued_rows -= rows
+            self._writing += 1
+        return batch
+
+    def _commit(self, uow):
+        with self.connection() as conn:
+            uow.commit(conn)
+
+    def _write(self, batch):
+        if len(batch) == 1:
+            uow, future = batch[0]
+            try:
+                self._commit(uow)
+            except Exception as e:
+                self._resolve(future, error=e)
+            else:
+                self._resolve(future, len(uow))
+            return
+
+        merged = SubmissionUnitOfWork(chunk_size=batch[0][0].chunk_size)
+        for uow, _ in batch:
+            merged.merge(uow)
+        try:
+            self._commit(merged)
+        except Exception as e:
+            logger.warning("Error writing %s coalesced submissions, retrying them one by one: %s", len(batch), e)
+        else:
+            for uow, future in batch:
+                self._resolve(future, len(uow))
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            return
+
+        with self._lock:
+            self._stats['fallback_batches'] += 1
+        # The merged commit is all or nothing: if any of its requests landed, they all did
+        try:
+            with self.connection() as conn:
+                landed = bool(existing_request_guids(conn, merged.req_guids))
+        except Exception as e:
+            for _, future in batch:
+                self._resolve(future, error=e)
+            return
+        for uow, future in batch:
+            if landed:
+                self._resolve(future, len(uow))
+                continue
+            try:
+                self._commit(uow)
+            except Exception as e:
+                self._resolve(future, error=e)
+            else:
+                self._resolve(future, len(uow))
+
+    def _resolve(self, future, rows=None, error=None):
+        with self._lock:
+            self._stats['failed' if error is not None else 'written'] += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(rows)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.exception("Unexpected error in write coalescer")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._writing -= 1
+
+    def stats(self):
+        """Snapshot of submission and batch counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['queued'] = len(self._queue)
+        return snapshot
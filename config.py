@@ -1,5 +1,9 @@
 import os
-import streamlit as st
+import sys
+
+# Streamlit secrets are only read inside the app; headless entry points (cli.py)
+# use environment variables and don't pay for importing Streamlit
+st = sys.modules.get('streamlit')
 
 # =============================================
 # Environment Configuration
@@ -20,8 +24,12 @@ RUN_TYPE = ENV_TYPE
 # If not found, fall back to environment variables (for local development)
 def get_snowflake_config():
     """Get Snowflake configuration from Streamlit secrets or environment variables"""
-    if 'SNOWFLAKE_CONFIG' in st.secrets:
-        return st.secrets['SNOWFLAKE_CONFIG']
+    try:
+        if st is not None and 'SNOWFLAKE_CONFIG' in st.secrets:
+            return st.secrets['SNOWFLAKE_CONFIG']
+    except FileNotFoundError:
+        # No secrets.toml at all (local development, scripts), use environment variables
+        pass
     
     return {
         'user': os.getenv('RPA_BULLSEYE_SNOWFLAKE_USER'),
@@ -46,3 +54,80 @@ KEEPA_SNOWFLAKE_CONFIG = {
     'schema': os.getenv('RPA_BULLSEYE_SNOWFLAKE_SCHEMA'),
     'role': os.getenv('RPA_BULLSEYE_SNOWFLAKE_ROLE')
 }
+
+# Connection pool configuration (shared by every Streamlit session in the process)
+SNOWFLAKE_POOL_SIZE = int(os.getenv('RPA_BULLSEYE_POOL_SIZE', '5'))
+SNOWFLAKE_POOL_IDLE_TIMEOUT = int(os.getenv('RPA_BULLSEYE_POOL_IDLE_TIMEOUT', '300'))  # seconds
+SNOWFLAKE_POOL_MAX_LIFETIME = int(os.getenv('RPA_BULLSEYE_POOL_MAX_LIFETIME', '3600'))  # seconds
+SNOWFLAKE_POOL_ACQUIRE_TIMEOUT = int(os.getenv('RPA_BULLSEYE_POOL_ACQUIRE_TIMEOUT', '60'))  # seconds
+
+# Maximum rows bound into a single batched INSERT (keeps statements within Snowflake's bind limits)
+SNOWFLAKE_BIND_CHUNK_SIZE = int(os.getenv('RPA_BULLSEYE_BIND_CHUNK_SIZE', '1000'))
+
+# Maximum retailers submitted concurrently from the X-Amazon tab
+X_AMAZON_MAX_WORKERS = int(os.getenv('RPA_BULLSEYE_X_AMAZON_MAX_WORKERS', '4'))
+
+# Show per-rerun timings of the page and its search panels at the bottom of the app ("1" to enable)
+SHOW_RERUN_TIMINGS = os.getenv('RPA_BULLSEYE_SHOW_RERUN_TIMINGS', '0') == '1'
+
+# Email notifications for the same requestor within this window are sent as one digest (seconds)
+EMAIL_DIGEST_WINDOW_SECONDS = float(os.getenv('RPA_BULLSEYE_EMAIL_DIGEST_WINDOW', '30'))
+
+# On shutdown, pending digests are sent right away; wait at most this long for them (seconds)
+EMAIL_EXIT_FLUSH_SECONDS = float(os.getenv('RPA_BULLSEYE_EMAIL_EXIT_FLUSH', '15'))
+
+# How often the in-memory HubSpot brand catalog is reloaded from Snowflake (seconds)
+BRAND_CATALOG_REFRESH_SECONDS = int(os.getenv('RPA_BULLSEYE_BRAND_CATALOG_REFRESH', '900'))
+
+# How often the in-memory HubSpot company catalog is reloaded from Snowflake (seconds)
+COMPANY_CATALOG_REFRESH_SECONDS = int(os.getenv('RPA_BULLSEYE_COMPANY_CATALOG_REFRESH', '900'))
+
+# Shared search result cache: lifetime of results, of empty results, and size bounds
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv('RPA_BULLSEYE_SEARCH_CACHE_TTL', '300'))
+SEARCH_CACHE_NEGATIVE_TTL_SECONDS = int(os.getenv('RPA_BULLSEYE_SEARCH_CACHE_NEGATIVE_TTL', '60'))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('RPA_BULLSEYE_SEARCH_CACHE_MAX_ENTRIES', '1000'))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv('RPA_BULLSEYE_SEARCH_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+# How long a search waits on an identical search already running in another session (seconds)
+SEARCH_FLIGHT_TIMEOUT_SECONDS = int(os.getenv('RPA_BULLSEYE_SEARCH_FLIGHT_TIMEOUT', '60'))
+
+# Rows written per checkpointed chunk for uploaded files and multi-brand lists longer than this
+SUBMISSION_CHUNK_ROWS = int(os.getenv('RPA_BULLSEYE_SUBMISSION_CHUNK_ROWS', '5000'))
+
+# Extra attempts for a chunk whose commit fails before the submission gives up
+SUBMISSION_CHUNK_RETRIES = int(os.getenv('RPA_BULLSEYE_SUBMISSION_CHUNK_RETRIES', '2'))
+
+# Local SQLite file recording the progress of chunked submissions, so retries resume
+SUBMISSION_CHECKPOINT_PATH = os.getenv(
+    'RPA_BULLSEYE_CHECKPOINT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.bullseye_checkpoints.sqlite')
+)
+
+# Local SQLite outbox submissions are queued in before the background writer sends them to Snowflake
+SUBMISSION_OUTBOX_PATH = os.getenv(
+    'RPA_BULLSEYE_OUTBOX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.bullseye_outbox.sqlite')
+)
+
+# How often the outbox writer checks for new entries, and the longest it waits between retries (seconds)
+SUBMISSION_OUTBOX_FLUSH_INTERVAL = float(os.getenv('RPA_BULLSEYE_OUTBOX_FLUSH_INTERVAL', '0.2'))
+SUBMISSION_OUTBOX_MAX_BACKOFF = float(os.getenv('RPA_BULLSEYE_OUTBOX_MAX_BACKOFF', '60'))
+
+# Submissions from all sessions are written together: a batch closes this long after its first
+# submission (seconds) or once it holds this many rows, and this many batches are written at once
+SUBMISSION_COALESCE_MAX_DELAY = float(os.getenv('RPA_BULLSEYE_COALESCE_MAX_DELAY', '0.005'))
+SUBMISSION_COALESCE_MAX_ROWS = int(os.getenv('RPA_BULLSEYE_COALESCE_MAX_ROWS', str(SUBMISSION_CHUNK_ROWS)))
+SUBMISSION_COALESCE_WRITERS = int(os.getenv('RPA_BULLSEYE_COALESCE_WRITERS', '4'))
+
+# Background submission jobs run at once per process, and how often their progress panel refreshes (seconds)
+SUBMISSION_JOB_WORKERS = int(os.getenv('RPA_BULLSEYE_SUBMISSION_JOB_WORKERS', '4'))
+SUBMISSION_JOB_POLL_SECONDS = float(os.getenv('RPA_BULLSEYE_SUBMISSION_JOB_POLL', '1'))
+
+# HTTP API (api.py): listen address, worker threads and largest accepted request body (bytes)
+API_HOST = os.getenv('RPA_BULLSEYE_API_HOST', '127.0.0.1')
+API_PORT = int(os.getenv('RPA_BULLSEYE_API_PORT', '8502'))
+API_WORKERS = int(os.getenv('RPA_BULLSEYE_API_WORKERS', '16'))
+API_MAX_BODY_BYTES = int(os.getenv('RPA_BULLSEYE_API_MAX_BODY_BYTES', str(10 * 1024 * 1024)))
+
+# Bearer token API clients must send; unset means no authentication (bind to localhost only)
+API_TOKEN = os.getenv('RPA_BULLSEYE_API_TOKEN')
@@ -0,0 +1,484 @@
+"""Search and submission pipeline without Streamlit
+
+Everything here raises on failure and returns plain results instead of
+writing to the page, so the same code serves the Streamlit app
+(shared_functions.py wraps it with the UI), the command line (cli.py) and
+other services. Importing this module does not import Streamlit.
+"""
+import threading
+import time
+import snowflake.connector
+from config import (
+    SNOWFLAKE_CONFIG,
+    RUN_TYPE,
+    SNOWFLAKE_POOL_SIZE,
+    SNOWFLAKE_POOL_IDLE_TIMEOUT,
+    SNOWFLAKE_POOL_MAX_LIFETIME,
+    SNOWFLAKE_POOL_ACQUIRE_TIMEOUT,
+    BRAND_CATALOG_REFRESH_SECONDS,
+    COMPANY_CATALOG_REFRESH_SECONDS,
+    SEARCH_CACHE_TTL_SECONDS,
+    SEARCH_CACHE_NEGATIVE_TTL_SECONDS,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_MAX_BYTES,
+    SEARCH_FLIGHT_TIMEOUT_SECONDS,
+    SUBMISSION_CHUNK_ROWS,
+    SUBMISSION_CHUNK_RETRIES,
+    SUBMISSION_CHECKPOINT_PATH,
+    SUBMISSION_OUTBOX_PATH,
+    SUBMISSION_OUTBOX_FLUSH_INTERVAL,
+    SUBMISSION_OUTBOX_MAX_BACKOFF,
+    SUBMISSION_COALESCE_MAX_DELAY,
+    SUBMISSION_COALESCE_MAX_ROWS,
+    SUBMISSION_COALESCE_WRITERS,
+    SUBMISSION_JOB_WORKERS
+)
+from db_pool import ConnectionPool
+from catalog import BrandCatalog, CompanyCatalog
+from search_cache import SearchCache, SingleFlight, InflightQueries, SearchCancelled, normalize_key
+from submission import SubmissionUnitOfWork, chunked, submit_in_chunks
+from checkpoint import CheckpointStore, job_key
+from outbox import SubmissionOutbox
+from coalescer import WriteCoalescer
+from jobs import JobRunner
+from bulk_upload import UPLOAD_KINDS, iter_value_chunks, submit_upload
+
+# Process-wide connection pool, created on first use
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+# Process-wide HubSpot brand catalog for typeahead search, created on first use
+_brand_catalog = None
+_brand_catalog_lock = threading.Lock()
+
+# Process-wide HubSpot company catalog keyed by company_id, created on first use
+_company_catalog = None
+_company_catalog_lock = threading.Lock()
+
+# Process-wide cache of warehouse search results, created on first use
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+# Process-wide record of chunked submission progress, created on first use
+_checkpoint_store = None
+_checkpoint_store_lock = threading.Lock()
+
+# Process-wide group commit shared by every session's submissions, started on first use
+_write_coalescer = None
+_write_coalescer_lock = threading.Lock()
+
+# Process-wide durable queue of submissions waiting to be written, started on first use
+_submission_outbox = None
+_submission_outbox_lock = threading.Lock()
+
+# Process-wide pool running background submission jobs, created on first use
+_job_runner = None
+_job_runner_lock = threading.Lock()
+
+# Coalesces identical warehouse searches running at the same time
+_search_flight = SingleFlight(timeout=SEARCH_FLIGHT_TIMEOUT_SECONDS)
+
+# Running warehouse searches per (session, search box), so newer terms can cancel them
+_inflight_searches = InflightQueries()
+
+# Field names of company search rows, for JSON output
+COMPANY_COLUMNS = ("company_id", "company_name", "concat_lead_list_name", "concat_lead_list_name_final")
+
+# Polling interval for asynchronous search queries (seconds), doubling up to the maximum
+SEARCH_POLL_INTERVAL = 0.05
+SEARCH_POLL_MAX_INTERVAL = 0.5
+
+def create_snowflake_connection():
+    """Open a new raw Snowflake connection (raises on failure)"""
+    # Create connection parameters dictionary
+    conn_params = {
+        'user': SNOWFLAKE_CONFIG['user'],
+        'password': SNOWFLAKE_CONFIG['password'],
+        'account': SNOWFLAKE_CONFIG['account'],
+        'warehouse': SNOWFLAKE_CONFIG['warehouse'],
+        'database': SNOWFLAKE_CONFIG['database'],
+        'schema': SNOWFLAKE_CONFIG['schema'],
+        'role': SNOWFLAKE_CONFIG['role'],
+        'protocol': 'https',
+        'host': f"{SNOWFLAKE_CONFIG['account']}.snowflakecomputing.com",
+        'port': 443,
+        'timeout': 60,
+        'retry_count': 3,
+        'retry_delay': 5
+    }
+
+    return snowflake.connector.connect(**conn_params)
+
+def get_connection_pool():
+    """Return the process-wide Snowflake connection pool"""
+    global _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            _connection_pool = ConnectionPool(
+                create_snowflake_connection,
+                max_size=SNOWFLAKE_POOL_SIZE,
+                idle_timeout=SNOWFLAKE_POOL_IDLE_TIMEOUT,
+                max_lifetime=SNOWFLAKE_POOL_MAX_LIFETIME,
+                acquire_timeout=SNOWFLAKE_POOL_ACQUIRE_TIMEOUT
+            )
+        return _connection_pool
+
+def set_connection_pool(pool):
+    """Use `pool` for every query from now on (e.g. a pool over a local stand-in database)"""
+    global _connection_pool
+    with _connection_pool_lock:
+        _connection_pool = pool
+
+def borrow_connection():
+    """Borrow a connection from the current pool, following set_connection_pool"""
+    return get_connection_pool().connection()
+
+def fetch_brand_names():
+    """Fetch every distinct HubSpot brand name from Snowflake (raises on failure)"""
+    pool = get_connection_pool()
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT DISTINCT brand as brand_name
+            FROM boabd.hubspot.company_brand_associations
+            ORDER BY brand_name
+        """)
+        brands = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+    return brands
+
+def get_brand_catalog():
+    """Return the process-wide brand catalog"""
+    global _brand_catalog
+    with _brand_catalog_lock:
+        if _brand_catalog is None:
+            _brand_catalog = BrandCatalog(fetch_brand_names, refresh_interval=BRAND_CATALOG_REFRESH_SECONDS)
+        return _brand_catalog
+
+def fetch_company_rows():
+    """Fetch every HubSpot company with its lead list from Snowflake (raises on failure)"""
+    pool = get_connection_pool()
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT cmp1.company_id, cmp1.company_name, cmp1.concat_lead_list_name,
+                   cmp2.concat_lead_list_name as concat_lead_list_name_final
+            FROM boabd.hubspot.company_data cmp1
+            INNER JOIN boabd.hubspot.COMPANY_LEADLISTID_ASSOCIATIONS cmp2
+            ON cmp1.company_id = cmp2.company_id
+            ORDER BY cmp1.company_name
+        """)
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+def get_company_catalog():
+    """Return the process-wide company catalog"""
+    global _company_catalog
+    with _company_catalog_lock:
+        if _company_catalog is None:
+            _company_catalog = CompanyCatalog(fetch_company_rows, refresh_interval=COMPANY_CATALOG_REFRESH_SECONDS)
+        return _company_catalog
+
+def get_search_cache():
+    """Return the process-wide search result cache"""
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = SearchCache(
+                ttl=SEARCH_CACHE_TTL_SECONDS,
+                negative_ttl=SEARCH_CACHE_NEGATIVE_TTL_SECONDS,
+                max_entries=SEARCH_CACHE_MAX_ENTRIES,
+                max_bytes=SEARCH_CACHE_MAX_BYTES
+            )
+        return _search_cache
+
+def get_checkpoint_store():
+    """Return the process-wide submission checkpoint store"""
+    global _checkpoint_store
+    with _checkpoint_store_lock:
+        if _checkpoint_store is None:
+            _checkpoint_store = CheckpointStore(SUBMISSION_CHECKPOINT_PATH)
+        return _checkpoint_store
+
+def get_write_coalescer():
+    """Return the process-wide write coalescer"""
+    global _write_coalescer
+    with _write_coalescer_lock:
+        if _write_coalescer is None:
+            _write_coalescer = WriteCoalescer(
+                borrow_connection,
+                max_rows=SUBMISSION_COALESCE_MAX_ROWS,
+                max_delay=SUBMISSION_COALESCE_MAX_DELAY,
+                writers=SUBMISSION_COALESCE_WRITERS
+            )
+            _write_coalescer.start()
+        return _write_coalescer
+
+def get_submission_outbox():
+    """Return the process-wide submission outbox, starting its writer (and any leftover entries) on first use"""
+    global _submission_outbox
+    with _submission_outbox_lock:
+        if _submission_outbox is None:
+            _submission_outbox = SubmissionOutbox(
+                SUBMISSION_OUTBOX_PATH,
+                borrow_connection,
+                batch_rows=SUBMISSION_CHUNK_ROWS,
+                flush_interval=SUBMISSION_OUTBOX_FLUSH_INTERVAL,
+                max_backoff=SUBMISSION_OUTBOX_MAX_BACKOFF,
+                writer=get_write_coalescer().write
+            )
+            _submission_outbox.start()
+        return _submission_outbox
+
+def get_job_runner():
+    """Return the process-wide runner for background submission jobs"""
+    global _job_runner
+    with _job_runner_lock:
+        if _job_runner is None:
+            _job_runner = JobRunner(workers=SUBMISSION_JOB_WORKERS)
+        return _job_runner
+
+def cancel_query(conn, sfqid):
+    """Ask Snowflake to abort a running query"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT SYSTEM$CANCEL_QUERY(%s)", (sfqid,))
+    finally:
+        cursor.close()
+
+def query_search_items(conn, search_term, item_type, cancelled=None, on_submit=None):
+    """Run a brand or company search against Snowflake (raises on failure)
+
+    The query is submitted asynchronously and polled, so it can be abandoned
+    while it runs: `on_submit(sfqid)` is called once it has a query id, and
+    None is returned if the `cancelled` event is set before it finishes.
+    """
+    cursor = conn.cursor()
+    try:
+        if item_type == "Brand Name":
+            # Convert search term to uppercase for matching
+            search_term = search_term.upper()
+            query = """
+            SELECT DISTINCT brand as brand_name
+            FROM boabd.hubspot.company_brand_associations
+            WHERE UPPER(brand) LIKE %s
+            ORDER BY brand_name
+            LIMIT 100
+            """
+        else:  # Company Name
+            query = """
+            SELECT cmp1.company_id, cmp1.company_name, cmp1.concat_lead_list_name,
+                   cmp2.concat_lead_list_name as concat_lead_list_name_final
+            FROM boabd.hubspot.company_data cmp1
+            INNER JOIN boabd.hubspot.COMPANY_LEADLISTID_ASSOCIATIONS cmp2
+            ON cmp1.company_id = cmp2.company_id
+            WHERE UPPER(cmp1.company_name) LIKE UPPER(%s)
+            ORDER BY cmp1.company_name
+            LIMIT 100
+            """
+        cursor.execute_async(query, (f'%{search_term}%',))
+        sfqid = cursor.sfqid
+        if on_submit:
+            on_submit(sfqid)
+
+        delay = SEARCH_POLL_INTERVAL
+        while True:
+            try:
+                status = conn.get_query_status_throw_if_error(sfqid)
+            except Exception:
+                # A cancelled query reports as failed
+                if cancelled is not None and cancelled.is_set():
+                    return None
+                raise
+            if not conn.is_still_running(status):
+                break
+            if cancelled is not None and cancelled.is_set():
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, SEARCH_POLL_MAX_INTERVAL)
+
+        cursor.get_results_from_sfqid(sfqid)
+        rows = cursor.fetchall()
+        return [row[0] for row in rows] if item_type == "Brand Name" else rows
+    finally:
+        cursor.close()
+
+def cached_items(search_term, item_type):
+    """Search results from the in-memory catalogs or the shared cache, or None if Snowflake is needed"""
+    # Served from the in-memory catalogs once they have loaded
+    if item_type == "Brand Name":
+        results = get_brand_catalog().search(search_term, limit=100)
+    else:  # Company Name
+        results = get_company_catalog().search(search_term, limit=100)
+    if results is not None:
+        return results
+
+    # Warehouse results are shared across sessions, so reruns and popular terms don't re-query
+    return get_search_cache().get(normalize_key(search_term, item_type))
+
+def load_items(search_term, item_type, owner=None):
+    """Search Snowflake, sharing the query with identical searches in flight (raises on failure)
+
+    `owner` identifies the search box ((session id, key)) whose running query
+    may be cancelled by a newer term; it raises SearchCancelled when that happens.
+    """
+    cache = get_search_cache()
+    key = normalize_key(search_term, item_type)
+
+    def load():
+        cancelled = threading.Event()
+        token = None
+
+        def on_submit(sfqid):
+            nonlocal token
+            if owner is None:
+                return
+
+            def cancel():
+                cancelled.set()
+                try:
+                    cancel_query(conn, sfqid)
+                except Exception:
+                    pass  # The poll loop stops on the event either way
+
+            token = _inflight_searches.register(owner, key, cancel)
+
+        try:
+            with get_connection_pool().connection() as conn:
+                results = query_search_items(conn, search_term, item_type, cancelled, on_submit)
+        finally:
+            if token is not None:
+                _inflight_searches.unregister(owner, token)
+        if results is None:
+            raise SearchCancelled(owner)
+        # Only successful lookups are cached (empty ones too, for a shorter time)
+        cache.put(key, results)
+        return results
+
+    # Callers searching the same term at once share one query (and its errors)
+    try:
+        return _search_flight.do(key, load)
+    except SearchCancelled as e:
+        if e.owner == owner:
+            raise
+        # Joined another box's query just as it was cancelled; run our own
+        return _search_flight.do(key, load)
+
+def supersede_search(owner, search_term, item_type):
+    """Cancel `owner`'s running search if it is for another term and nobody else waits on it"""
+    return _inflight_searches.supersede(
+        owner,
+        normalize_key(search_term, item_type),
+        lambda key: _search_flight.waiter_count(key) > 0
+    )
+
+def find_items(search_term, item_type, owner=None):
+    """Look a term up in the catalogs, the shared cache, then Snowflake (raises on failure)"""
+    results = cached_items(search_term, item_type)
+    if results is None:
+        results = load_items(search_term, item_type, owner)
+    return results
+
+def classify_brands(brands):
+    """Split brands into (existing HubSpot brands, new brands)
+
+    Loads the brand catalog first if it isn't loaded yet; if that fails every
+    entry is treated as new.
+    """
+    catalog = get_brand_catalog()
+    if not catalog.is_loaded:
+        catalog.refresh()
+    result = catalog.classify(brands)
+    if result is None:
+        return [], list(dict.fromkeys(brand.strip() for brand in brands if brand.strip()))
+    return result
+
+def find_company(company_id):
+    """Company row for a company_id (int or numeric text), loading the catalog if needed; None if unknown"""
+    catalog = get_company_catalog()
+    if not catalog.is_loaded:
+        catalog.refresh()
+    try:
+        company_id = int(company_id)
+    except (TypeError, ValueError):
+        return None
+    return catalog.get(company_id)
+
+def submit_rows(items, add_row, key_parts, run_type=RUN_TYPE, req_guid=None, on_chunk=None, outbox=None):
+    """Submit one request row per item under one REQ_GUID (raises on failure)
+
+    `add_row(uow, item)` queues an item's BULLSEYE_REQUEST and Keepa/Echo
+    rows. Up to SUBMISSION_CHUNK_ROWS items commit in a single transaction
+    shared with other sessions' submissions (the write coalescer), or are
+    queued in `outbox` (a SubmissionOutbox) and written in the background.
+    Longer lists are written in checkpointed chunks, keyed by `key_parts` and
+    the items, so submitting the same list again after a failure resumes
+    where it stopped; `on_chunk(progress)` is called after each chunk.
+    Returns {'req_guid', 'rows', 'chunks', 'resumed', 'skipped_chunks'}.
+    """
+    if len(items) <= SUBMISSION_CHUNK_ROWS:
+        uow = SubmissionUnitOfWork(req_guid, run_type=run_type)
+        for item in items:
+            add_row(uow, item)
+        rows = len(uow)
+        if outbox is not None:
+            outbox.append(uow)
+        else:
+            get_write_coalescer().write(uow)
+        return {'req_guid': uow.req_guid, 'rows': rows, 'chunks': 1, 'resumed': False, 'skipped_chunks': 0}
+
+    def add_rows(uow, chunk):
+        for item in chunk:
+            add_row(uow, item)
+
+    return submit_in_chunks(
+        chunked(items, SUBMISSION_CHUNK_ROWS),
+        add_rows,
+        get_connection_pool().connection,
+        run_type=run_type,
+        req_guid=req_guid,
+        checkpoints=get_checkpoint_store(),
+        key=job_key(*key_parts, *items),
+        retries=SUBMISSION_CHUNK_RETRIES,
+        on_chunk=on_chunk
+    )
+
+def submit_values(values, kind, retailer, requestor, requestor_email, run_type=RUN_TYPE,
+                  req_guid=None, key=None, on_chunk=None):
+    """Submit brands, company ids or brand URLs for a retailer (raises on failure)
+
+    `values` is an iterable of strings, or the (values, invalid, duplicates)
+    chunks of bulk_upload.iter_upload_values. Values go through the same
+    validation, HubSpot classification and checkpointed chunking as an
+    uploaded file. Progress is checkpointed under `key` (derived from the
+    values when they are a list longer than one chunk) so the same input
+    submitted again resumes an unfinished request. Returns the bulk_upload.submit_upload summary.
+    """
+    if kind not in UPLOAD_KINDS.get(retailer, ()):
+        raise ValueError(f"{retailer} doesn't accept {kind} values")
+    if isinstance(values, (list, tuple)):
+        values = list(values)
+        # A list that fits in one chunk is written in one transaction, so there is nothing to resume
+        if key is None and len(values) > SUBMISSION_CHUNK_ROWS:
+            key = job_key(retailer, kind, SUBMISSION_CHUNK_ROWS, requestor_email, *values)
+        chunks = iter_value_chunks(values, kind)
+    else:
+        chunks = values
+    return submit_upload(
+        chunks,
+        kind,
+        retailer,
+        requestor,
+        requestor_email,
+        get_connection_pool().connection,
+        classify_brands=classify_brands,
+        get_company=find_company,
+        run_type=run_type,
+        req_guid=req_guid,
+        checkpoints=get_checkpoint_store() if key else None,
+        key=key,
+        retries=SUBMISSION_CHUNK_RETRIES,
+        on_chunk=on_chunk,
+        writer=get_write_coalescer().write
+    )
@@ -0,0 +1,227 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class NestedBorrowError(RuntimeError):
+    """Raised when a thread borrows a second connection while still holding one"""
+
+
+class _PooledConnection:
+    """Bookkeeping wrapper around a raw DB-API connection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.owner = None  # ident of the thread borrowing it
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections shared by the whole process
+
+    Connections are created lazily through `connect` (any zero-argument
+    callable returning a DB-API connection), handed out LIFO so the warmest
+    connection is reused first, and recycled once they exceed `max_lifetime`
+    or sit idle longer than `idle_timeout` seconds.
+
+    A thread may hold one connection at a time. Borrowing a second one while
+    holding the first raises NestedBorrowError: with `max_size` threads doing
+    that, each would wait on the others until `acquire_timeout`. Pass the held
+    connection down instead.
+    """
+
+    def __init__(self, connect, max_size=5, idle_timeout=300, max_lifetime=3600,
+                 acquire_timeout=30, validate_after=60, validate_query="SELECT 1"):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.acquire_timeout = acquire_timeout
+        # Only round-trip a liveness query for connections idle this long
+        self.validate_after = validate_after
+        self.validate_query = validate_query
+
+        self._idle = []  # LIFO stack of _PooledConnection
+        self._in_use = {}  # id(conn) -> _PooledConnection
+        self._cond = threading.Condition()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'created': 0,
+            'evicted': 0,
+            'discarded': 0,
+        }
+
+    def _is_expired(self, pooled, now):
+        """Check whether a connection has outlived its lifetime or idle window"""
+        if self.max_lifetime and now - pooled.created_at > self.max_lifetime:
+            return True
+        if self.idle_timeout and now - pooled.last_used > self.idle_timeout:
+            return True
+        return False
+
+    def _is_alive(self, pooled, now):
+        """Liveness check, only hitting the server for long-idle connections"""
+        is_closed = getattr(pooled.conn, 'is_closed', None)
+        if callable(is_closed) and is_closed():
+            return False
+        if self.validate_after is not None and now - pooled.last_used >= self.validate_after:
+            try:
+                cursor = pooled.conn.cursor()
+                cursor.execute(self.validate_query)
+                cursor.fetchall()
+                cursor.close()
+            except Exception:
+                return False
+        return True
+
+    def _close_quietly(self, pooled):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self, now):
+        """Drop expired idle connections (caller holds the lock)"""
+        expired = [pooled for pooled in self._idle if self._is_expired(pooled, now)]
+        if expired:
+            self._idle = [pooled for pooled in self._idle if pooled not in expired]
+            self._stats['evicted'] += len(expired)
+        return expired
+
+    def acquire(self, timeout=None):
+        """Borrow a connection, creating one if the pool has spare capacity"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+        wait_started = None
+
+        owner = threading.get_ident()
+        while True:
+            candidate = None
+            create = False
+            with self._cond:
+                if any(pooled.owner == owner for pooled in self._in_use.values()):
+                    raise NestedBorrowError("This thread already holds a pooled connection; pass it down instead")
+
+                for pooled in self._evict_idle(time.monotonic()):
+                    self._close_quietly(pooled)
+
+                if self._idle:
+                    candidate = self._idle.pop()
+                    candidate.owner = owner
+                    self._in_use[id(candidate.conn)] = candidate
+                elif len(self._in_use) < self.max_size:
+                    # Reserve the slot before connecting outside the lock
+                    candidate = _PooledConnection(None)
+                    candidate.owner = owner
+                    self._in_use[id(candidate)] = candidate
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        if waited:
+                            self._stats['wait_time'] += time.monotonic() - wait_started
+                        raise PoolTimeoutError(
+                            f"No database connection available after {timeout} seconds"
+                        )
+                    if not waited:
+                        waited = True
+                        wait_started = time.monotonic()
+                        self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                    continue
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        del self._in_use[id(candidate)]
+                        self._cond.notify()
+                    raise
+                candidate.conn = conn
+                with self._cond:
+                    del self._in_use[id(candidate)]
+                    self._in_use[id(conn)] = candidate
+                    self._stats['created'] += 1
+                    self._stats['misses'] += 1
+                    if waited:
+                        self._stats['wait_time'] += time.monotonic() - wait_started
+                candidate.last_used = time.monotonic()
+                return conn
+
+            # Reused connection: verify it outside the lock
+            if self._is_alive(candidate, time.monotonic()):
+                with self._cond:
+                    self._stats['hits'] += 1
+                    if waited:
+                        self._stats['wait_time'] += time.monotonic() - wait_started
+                candidate.last_used = time.monotonic()
+                return candidate.conn
+
+            self.release(candidate.conn, discard=True)
+
+    def release(self, conn, discard=False):
+        """Return a borrowed connection, or close it if it is no longer usable"""
+        with self._cond:
+            pooled = self._in_use.pop(id(conn), None)
+            if pooled is None:
+                return
+            pooled.owner = None
+            pooled.last_used = time.monotonic()
+            if discard or self._is_expired(pooled, pooled.last_used):
+                self._stats['discarded' if discard else 'evicted'] += 1
+                close = True
+            else:
+                self._idle.append(pooled)
+                close = False
+            self._cond.notify()
+        if close:
+            self._close_quietly(pooled)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Borrow a connection for the duration of a `with` block
+
+        The connection goes back to the pool on success; if the block raises,
+        any open transaction is rolled back and the connection is discarded,
+        since its state can no longer be trusted.
+        """
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        """Close every idle connection; borrowed ones are returned as usual"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+    def stats(self):
+        """Snapshot of pool counters and current occupancy"""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot['idle'] = len(self._idle)
+            snapshot['in_use'] = len(self._in_use)
+            snapshot['max_size'] = self.max_size
+        borrows = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = snapshot['hits'] / borrows if borrows else 0.0
+        return snapshot
@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class SubmissionJob:
+    """A submission running in the background, polled by the page that started it
+
+    The worker updates the job through its methods while the page reads
+    `snapshot()`; both sides go through the job's lock. `items` are the
+    values being submitted, in submission order, and `done` counts how many
+    of them have been written.
+    """
+
+    def __init__(self, description, items=()):
+        self.id = uuid.uuid4().hex
+        self.description = description
+        self._lock = threading.Lock()
+        self._items = list(items)
+        self._done = 0
+        self._state = "queued"  # queued, running, done or failed
+        self._messages = []
+        self._req_guid = None
+        self._error = None
+        self._result = None
+        self._created_at = time.time()
+        self._finished_at = None
+
+    @property
+    def finished(self):
+        with self._lock:
+            return self._state in ("done", "failed")
+
+    def set_items(self, items):
+        with self._lock:
+            self._items = list(items)
+
+    def add_message(self, level, text):
+        """Queue a message for the progress panel (level is "info", "success", "warning" or "error")"""
+        with self._lock:
+            self._messages.append((level, text))
+
+    def progress(self, done, req_guid=None):
+        with self._lock:
+            self._done = min(done, len(self._items))
+            self._req_guid = req_guid or self._req_guid
+
+    def _start(self):
+        with self._lock:
+            self._state = "running"
+
+    def _finish(self, result=None, error=None):
+        with self._lock:
+            self._finished_at = time.time()
+            if error is not None:
+                self._state, self._error = "failed", error
+            else:
+                self._state, self._result, self._done = "done", result, len(self._items)
+
+    def snapshot(self):
+        """Consistent copy of the job's progress for display"""
+        with self._lock:
+            return {
+                'id': self.id,
+                'description': self.description,
+                'state': self._state,
+                'items': list(self._items),
+                'done': self._done,
+                'messages': list(self._messages),
+                'req_guid': self._req_guid,
+                'error': None if self._error is None else str(self._error),
+                'result': self._result,
+                'elapsed': (self._finished_at or time.time()) - self._created_at,
+            }
+
+class JobRunner:
+    """Runs submission jobs on a bounded pool of background threads
+
+    `run(job, work)` calls `work(job)` on a worker thread and returns right
+    away; `work` reports progress through the job and its return value
+    becomes the job's result. Exceptions mark the job failed. Jobs must not
+    call Streamlit: the script run that started them has usually finished.
+    """
+
+    def __init__(self, workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="submission-job")
+        self._lock = threading.Lock()
+        self._stats = {'started': 0, 'done': 0, 'failed': 0}
+
+    def run(self, job, work):
+        with self._lock:
+            self._stats['started'] += 1
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def _run(self, job, work):
+        job._start()
+        try:
+            result = work(job)
+        except Exception as e:
+            logger.exception("Submission job %s failed", job.description)
+            job._finish(error=e)
+            outcome = 'failed'
+        else:
+            job._finish(result)
+            outcome = 'done'
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,265 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from submission import SubmissionUnitOfWork, existing_request_guids
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submission_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    req_guids TEXT NOT NULL,
+    record TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submission_outbox_state ON submission_outbox (state, id);
+"""
+
+class SubmissionOutbox:
+    """Durable local write-ahead log of submissions, drained to Snowflake in the background
+
+    `append` writes a unit of work to a SQLite file (fsync'd before it
+    returns) and hands back immediately; a daemon thread writes pending
+    entries to Snowflake oldest first, merging up to `batch_rows` rows of
+    consecutive entries into one transaction, and deletes them once
+    committed. Entries survive restarts: a new outbox on the same file picks
+    up where the last one stopped.
+
+    An entry is marked "sending" before its batch is written. After a failed
+    or interrupted write, entries whose REQ_GUIDs are already in
+    BULLSEYE_REQUEST are treated as delivered (the commit went through but
+    the reply was lost) and the rest go back to "pending", so nothing is
+    written twice. While writes keep failing the flusher backs off
+    exponentially up to `max_backoff` seconds and retries entries one at a
+    time; an entry that still fails while Snowflake answers `SELECT 1` is
+    marked "failed" and left in the file for inspection.
+    """
+
+    def __init__(self, path, connection, batch_rows=5000, flush_interval=0.2, backoff=1.0, max_backoff=60,
+                 writer=None):
+        self.path = path
+        self.connection = connection  # context manager factory yielding a DB-API connection
+        self.writer = writer  # commits a unit of work, e.g. WriteCoalescer.write; defaults to a direct commit
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Every committed append is on disk before the submission is acknowledged
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(OUTBOX_SCHEMA)
+        self._db_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Condition(self._lock)
+        self._worker = None
+        self._failures = 0
+        # Entries a previous process was sending when it stopped are checked first
+        self._needs_reconcile = True
+        self._stats = {
+            'appended': 0,
+            'delivered': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'recovered': 0,
+            'dead': 0,
+            'last_latency': None,
+        }
+
+    def start(self):
+        """Start the flusher if it isn't running yet"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="submission-outbox", daemon=True)
+                self._worker.start()
+
+    def append(self, uow):
+        """Durably queue a unit of work for writing; returns its outbox entry id"""
+        record = json.dumps(uow.to_record())
+        with self._db_lock:
+            cursor = self._db.execute(
+                "INSERT INTO submission_outbox (req_guids, record, row_count, created_at) VALUES (?, ?, ?, ?)",
+                (json.dumps(uow.req_guids), record, len(uow), time.time())
+            )
+            entry_id = cursor.lastrowid
+        with self._lock:
+            self._stats['appended'] += 1
+        self.start()
+        self._wake.set()
+        return entry_id
+
+    def pending_count(self):
+        """Entries not yet written to Snowflake (pending or being sent)"""
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM submission_outbox WHERE state IN ('pending', 'sending')"
+            ).fetchone()[0]
+
+    def join(self, timeout=None):
+        """Block until every pending entry has been written (or `timeout` passes); returns True if drained"""
+        self.start()
+        self._wake.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self.pending_count():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(0.5 if remaining is None else min(remaining, 0.5))
+        return True
+
+    def _next_batch(self, max_entries):
+        """Mark the oldest pending entries as sending, up to `batch_rows` rows; returns [(id, created_at, record)]"""
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT id, created_at, record, row_count FROM submission_outbox "
+                "WHERE state = 'pending' ORDER BY id LIMIT ?",
+                (max_entries,)
+            ).fetchall()
+            batch, total = [], 0
+            for entry_id, created_at, record, row_count in rows:
+                if batch and total + row_count > self.batch_rows:
+                    break
+                batch.append((entry_id, created_at, record))
+                total += row_count
+            if batch:
+                self._db.executemany(
+                    "UPDATE submission_outbox SET state = 'sending' WHERE id = ?",
+                    [(entry_id,) for entry_id, _, _ in batch]
+                )
+        return batch
+
+    def _delete(self, entry_ids):
+        with self._db_lock:
+            self._db.executemany("DELETE FROM submission_outbox WHERE id = ?", [(entry_id,) for entry_id in entry_ids])
+
+    def _reconcile(self, error=None):
+        """Resolve entries left "sending": delete the ones already in Snowflake, requeue the rest"""
+        with self._db_lock:
+            sending = self._db.execute(
+                "SELECT id, req_guids FROM submission_outbox WHERE state = 'sending'"
+            ).fetchall()
+        if not sending:
+            return 0
+        guids = {entry_id: json.loads(req_guids) for entry_id, req_guids in sending}
+        with self.connection() as conn:
+            existing = existing_request_guids(conn, {guid for entry in guids.values() for guid in entry})
+        delivered = [entry_id for entry_id, entry in guids.items() if entry and set(entry) <= existing]
+        self._delete(delivered)
+        with self._db_lock:
+            self._db.execute(
+                "UPDATE submission_outbox SET state = 'pending', attempts = attempts + 1, last_error = ? "
+                "WHERE state = 'sending'",
+                (None if error is None else str(error),)
+            )
+        return len(delivered)
+
+    def _snowflake_answers(self):
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _try_reconcile(self, error=None):
+        """_reconcile, returning the number of delivered entries or None if Snowflake couldn't be asked"""
+        try:
+            delivered = self._reconcile(error)
+        except Exception as e:
+            # Can't tell what landed; the entries stay "sending" until the next attempt
+            logger.warning("Error checking which outbox entries reached Snowflake: %s", e)
+            self._needs_reconcile = True
+            return None
+        self._needs_reconcile = False
+        with self._lock:
+            self._stats['recovered'] += delivered
+        return delivered
+
+    def _back_off(self):
+        self._failures += 1
+        time.sleep(min(self.backoff * 2 ** (self._failures - 1), self.max_backoff))
+
+    def _flush_batch(self):
+        """Write one batch; returns True if something was written, False if idle or failing"""
+        if self._needs_reconcile and self._try_reconcile() is None:
+            self._back_off()
+            return False
+
+        # After a failure, retry entries one at a time so a bad one can't hold back the rest
+        batch = self._next_batch(1 if self._failures else 1000)
+        if not batch:
+            return False
+
+        uow = SubmissionUnitOfWork.from_record(json.loads(batch[0][2]))
+        for _, _, record in batch[1:]:
+            uow.merge(SubmissionUnitOfWork.from_record(json.loads(record)))
+        try:
+            if self.writer is not None:
+                self.writer(uow)
+            else:
+                with self.connection() as conn:
+                    uow.commit(conn)
+        except Exception as e:
+            logger.warning("Error writing %s outbox entries to Snowflake: %s", len(batch), e)
+            with self._lock:
+                self._stats['failed_batches'] += 1
+            delivered = self._try_reconcile(e)
+            if delivered is None or delivered == len(batch):
+                if delivered is None:
+                    self._back_off()
+                return delivered is not None
+            if len(batch) == 1 and self._failures and self._snowflake_answers():
+                # Snowflake is up but keeps rejecting this entry: park it instead of blocking the outbox
+                logger.error("Giving up on outbox entry %s: %s", batch[0][0], e)
+                with self._db_lock:
+                    self._db.execute("UPDATE submission_outbox SET state = 'failed' WHERE id = ?", (batch[0][0],))
+                with self._lock:
+                    self._stats['dead'] += 1
+                self._failures = 0
+                return True
+            self._back_off()
+            return False
+
+        self._delete([entry_id for entry_id, _, _ in batch])
+        self._failures = 0
+        with self._lock:
+            self._stats['delivered'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['last_latency'] = time.time() - batch[0][1]
+        return True
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                while self._flush_batch():
+                    pass
+            except Exception:
+                logger.exception("Unexpected error in submission outbox")
+            with self._idle:
+                self._idle.notify_all()
+            if self._failures or self._needs_reconcile:
+                # Keep retrying without waiting for a new append
+                self._wake.set()
+
+    def stats(self):
+        """Snapshot of delivery counters and backlog"""
+        with self._lock:
+            snapshot = dict(self._stats)
+        with self._db_lock:
+            for state, count in self._db.execute("SELECT state, COUNT(*) FROM submission_outbox GROUP BY state"):
+                snapshot[state] = count
+        return snapshot
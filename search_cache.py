@@ -0,0 +1,268 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+def approximate_size(value):
+    """Rough in-memory size of a search result (lists/tuples of strings and numbers)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+def normalize_key(search_term, item_type):
+    """Cache key for a search; matching is case-insensitive (UPPER ... LIKE) so case is folded"""
+    return (search_term.upper(), item_type)
+
+# Row cap of every search query (LIMIT 100); a result this long may be truncated
+SEARCH_LIMIT = 100
+
+# SQL LIKE wildcards; terms containing them can't be refined with a substring test
+_LIKE_WILDCARDS = ("%", "_")
+
+def refine_results(previous_term, previous_results, search_term, item_type, limit=SEARCH_LIMIT):
+    """Narrow an earlier result set to a longer term, or None if it has to be searched again
+
+    Every match for a term that contains the previous term is also a match
+    for the previous term, so filtering works as long as the previous result
+    wasn't cut off by the LIMIT.
+    """
+    term = search_term.upper()
+    if (previous_term is None or len(previous_results) >= limit
+            or previous_term not in term
+            or any(wildcard in term for wildcard in _LIKE_WILDCARDS)):
+        return None
+    if item_type == "Brand Name":
+        return [name for name in previous_results if term in (name or "").upper()]
+    # Company rows: (company_id, company_name, ...)
+    return [row for row in previous_results if term in (row[1] or "").upper()]
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'size')
+
+    def __init__(self, value, expires_at, size):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+class SearchCache:
+    """Thread-safe TTL + LRU cache for search results, shared by every session
+
+    Entries expire after `ttl` seconds (`negative_ttl` for empty results, so a
+    brand added in HubSpot shows up sooner) and the least recently used ones
+    are evicted once there are more than `max_entries` entries or their
+    approximate size exceeds `max_bytes`.
+    """
+
+    def __init__(self, ttl=300, negative_ttl=60, max_entries=1000, max_bytes=32 * 1024 * 1024):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'expirations': 0,
+            'evictions': 0,
+        }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, key):
+        """Cached result for `key` as a new list, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            if not entry.value:
+                self._stats['negative_hits'] += 1
+            # Callers keep results in session state, so never hand out the shared copy
+            return list(entry.value)
+
+    def put(self, key, value):
+        """Cache a result, evicting least recently used entries to stay within bounds"""
+        value = tuple(value)
+        size = approximate_size(value)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if value else self.negative_ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, time.monotonic() + ttl, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Snapshot of cache counters and occupancy"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['entries'] = len(self._entries)
+            snapshot['bytes'] = self._bytes
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = snapshot['hits'] / lookups if lookups else 0.0
+        return snapshot
+
+class SingleFlightTimeout(TimeoutError):
+    """Raised to a waiter when the in-flight call it joined doesn't finish in time"""
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait for it and receive the same result, or the
+    same exception if it fails. Waiters give up after `timeout` seconds (per
+    call) with SingleFlightTimeout; the leader's call itself is not interrupted.
+    """
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'coalesced': 0, 'timeouts': 0, 'errors': 0}
+
+    def do(self, key, fn, timeout=None):
+        """Run `fn()` for `key`, or wait for the identical call already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self._stats['coalesced'] += 1
+                leader = False
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                with self._lock:
+                    self._stats['errors'] += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result
+
+        timeout = self.timeout if timeout is None else timeout
+        if not call.done.wait(timeout):
+            with self._lock:
+                call.waiters -= 1
+                self._stats['timeouts'] += 1
+            raise SingleFlightTimeout(f"Identical request still running after {timeout} seconds")
+        if call.error is not None:
+            raise call.error
+        # Lists are handed out per caller, like SearchCache.get
+        return list(call.result) if isinstance(call.result, list) else call.result
+
+    def waiter_count(self, key):
+        """Number of callers currently waiting on the in-flight call for `key`"""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call is not None else 0
+
+    def stats(self):
+        """Snapshot of single-flight counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['in_flight'] = len(self._calls)
+        return snapshot
+
+class SearchCancelled(Exception):
+    """Raised in a search whose warehouse query was cancelled because a newer term arrived"""
+
+    def __init__(self, owner):
+        super().__init__("Search superseded by a newer term")
+        self.owner = owner
+
+class _InflightQuery:
+    __slots__ = ('flight_key', 'cancel')
+
+    def __init__(self, flight_key, cancel):
+        self.flight_key = flight_key
+        self.cancel = cancel
+
+class InflightQueries:
+    """The running warehouse query of each search box, so a newer term can cancel it
+
+    Owners are (session id, search box) pairs. Each owner has at most one
+    registered query, identified by its single-flight key and a `cancel`
+    callable.
+    """
+
+    def __init__(self):
+        self._queries = {}
+        self._lock = threading.Lock()
+        self._stats = {'cancelled': 0, 'kept_for_waiters': 0}
+
+    def register(self, owner, flight_key, cancel):
+        """Record the query now running for `owner`; returns a token for `unregister`"""
+        query = _InflightQuery(flight_key, cancel)
+        with self._lock:
+            self._queries[owner] = query
+        return query
+
+    def unregister(self, owner, token):
+        """Forget `owner`'s query, unless a newer one has replaced it"""
+        with self._lock:
+            if self._queries.get(owner) is token:
+                del self._queries[owner]
+
+    def supersede(self, owner, flight_key, is_shared):
+        """Cancel `owner`'s running query if it is for a different key
+
+        `is_shared(flight_key)` says whether other callers are waiting on
+        that query; those are left running.
+        """
+        with self._lock:
+            query = self._queries.get(owner)
+            if query is None or query.flight_key == flight_key:
+                return False
+            if is_shared(query.flight_key):
+                self._stats['kept_for_waiters'] += 1
+                return False
+            del self._queries[owner]
+            self._stats['cancelled'] += 1
+        query.cancel()
+        return True
+
+    def stats(self):
+        """Snapshot of cancellation counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['running'] = len(self._queries)
+        return snapshot
@@ -1,107 +1,378 @@
+import atexit
+import logging
+import queue
+import threading
+import time
 import requests
-import streamlit as st
+from requests.adapters import HTTPAdapter
+from config import EMAIL_DIGEST_WINDOW_SECONDS, EMAIL_EXIT_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Azure Logic App URL
+LOGIC_APP_URL = "https://prod-25.westus.logic.azure.com:443/workflows/8374cfcac0a24a5da20079e6d373b7be/triggers/manual/paths/invoke?api-version=2016-06-01&sp=%2Ftriggers%2Fmanual%2Frun&sv=1.0&sig=RD2GsB_9fQFXD1CGJX_UiLUO-nT-0p1nTI7anvclNyg"
+
+# Shown by the app when send_email_notification returns False
+NOTIFICATION_FAILED_MESSAGE = "Your submission was saved, but the email notification could not be queued"
+
+# Character limit for the human-readable summary in the email; the full list travels in "submissions"
+MAX_QUERY_LENGTH = 250
+
+class NotificationOutbox:
+    """In-process queue of email notifications delivered by a background worker
+
+    Submissions enqueue a payload and return immediately; a daemon thread
+    posts payloads to the Logic App over one keep-alive requests.Session,
+    retrying with exponential backoff. After `failure_threshold` consecutive
+    failed deliveries the circuit opens and delivery pauses for
+    `reset_timeout` seconds before a single trial request is let through.
+
+    Notifications added with `add_to_digest` are coalesced per requestor email
+    for `digest_window` seconds and sent as a single digest payload. Pending
+    digests only live in memory: call `flush` before the process exits
+    (get_notification_outbox registers it with atexit) so they aren't lost.
+    """
+
+    def __init__(self, url, session=None, timeout=(5, 30), max_attempts=4, backoff=1.0,
+                 failure_threshold=5, reset_timeout=60, max_queue_size=1000, digest_window=0):
+        self.url = url
+        self.digest_window = digest_window
+        self.timeout = timeout  # (connect, read) seconds
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session = session
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._consecutive_failures = 0
+        self._circuit_opened_at = None
+        # requestor email -> {'opened_at', 'sections', 'notifications'}
+        self._digests = {}
+        self._stats = {
+            'enqueued': 0,
+            'coalesced': 0,
+            'delivered': 0,
+            'failed': 0,
+            'dropped': 0,
+            'retries': 0,
+            'last_latency': None,
+            'total_latency': 0.0,
+        }
+
+    def start(self):
+        """Start the delivery worker if it isn't running yet"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="notification-outbox", daemon=True)
+                self._worker.start()
+
+    def enqueue(self, payload):
+        """Queue a payload for delivery, returning False if the outbox is full"""
+        self.start()
+        try:
+            self._queue.put_nowait((time.monotonic(), payload))
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return False
+        with self._lock:
+            self._stats['enqueued'] += 1
+        return True
+
+    def add_to_digest(self, requestor_email, sections):
+        """Coalesce a notification into the requestor's pending digest
+
+        `sections` is the structured {retailer: [values]} form. The digest is
+        sent once `digest_window` seconds have passed since its first entry.
+        """
+        self.start()
+        with self._lock:
+            digest = self._digests.get(requestor_email)
+            if digest is None:
+                digest = self._digests[requestor_email] = {
+                    'opened_at': time.monotonic(),
+                    'sections': {},
+                    'notifications': 0,
+                }
+            else:
+                self._stats['coalesced'] += 1
+            merge_query_values(digest['sections'], sections)
+            digest['notifications'] += 1
+            self._stats['enqueued'] += 1
+            new_digest = digest['notifications'] == 1
+        if not self.digest_window:
+            self._flush_digests(force=True)
+        elif new_digest:
+            # Wake the worker so it schedules the new digest's deadline
+            try:
+                self._queue.put_nowait((None, None))
+            except queue.Full:
+                pass
+        return True
+
+    def _flush_digests(self, force=False):
+        """Move digests whose window has elapsed onto the delivery queue"""
+        now = time.monotonic()
+        with self._lock:
+            due = [email for email, digest in self._digests.items()
+                   if force or now - digest['opened_at'] >= self.digest_window]
+            digests = [(email, self._digests.pop(email)) for email in due]
+        for email, digest in digests:
+            payload = build_digest_payload(email, digest['sections'], digest['notifications'])
+            try:
+                self._queue.put_nowait((digest['opened_at'], payload))
+            except queue.Full:
+                logger.error("Notification outbox full, dropping digest for %s", email)
+                with self._lock:
+                    self._stats['dropped'] += 1
+
+    def _next_digest_timeout(self):
+        """Seconds until the oldest pending digest is due (None if there are none)"""
+        with self._lock:
+            if not self._digests:
+                return None
+            oldest = min(digest['opened_at'] for digest in self._digests.values())
+        return max(0.0, oldest + self.digest_window - time.monotonic())
+
+    def join(self):
+        """Send pending digests now and block until everything has been processed"""
+        self._flush_digests(force=True)
+        self._queue.join()
+
+    def flush(self, timeout=None):
+        """Send pending digests now and wait up to `timeout` seconds for delivery; returns True if all were sent"""
+        self._flush_digests(force=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            if self._queue.unfinished_tasks:
+                self.start()
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    logger.error("%s email notifications were not sent before exit", self._queue.unfinished_tasks)
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _wait_for_circuit(self):
+        """Sleep out an open circuit; the next delivery is the half-open trial"""
+        with self._lock:
+            opened_at = self._circuit_opened_at
+        if opened_at is not None:
+            remaining = opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def _record_result(self, delivered, enqueued_at):
+        with self._lock:
+            if delivered:
+                latency = time.monotonic() - enqueued_at
+                self._stats['delivered'] += 1
+                self._stats['last_latency'] = latency
+                self._stats['total_latency'] += latency
+                self._consecutive_failures = 0
+                self._circuit_opened_at = None
+            else:
+                self._stats['failed'] += 1
+                self._consecutive_failures += 1
+                if self._consecutive_failures >= self.failure_threshold:
+                    self._circuit_opened_at = time.monotonic()
+
+    def _post(self, payload):
+        """Send one payload, returning True on a 200/202 response"""
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        # Check response - 200 and 202 are both success codes
+        if response.status_code in [200, 202]:
+            return True
+        logger.warning("Email notification rejected with status code %s", response.status_code)
+        return False
+
+    def _deliver(self, payload):
+        """Post a payload with bounded retries and exponential backoff"""
+        for attempt in range(self.max_attempts):
+            if attempt:
+                with self._lock:
+                    self._stats['retries'] += 1
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+            try:
+                if self._post(payload):
+                    return True
+            except requests.RequestException as e:
+                logger.warning("Error sending email notification: %s", e)
+        return False
+
+    def _run(self):
+        while True:
+            self._flush_digests()
+            try:
+                # Wake up when the next digest is due, or at least once a second
+                timeout = self._next_digest_timeout()
+                enqueued_at, payload = self._queue.get(timeout=1.0 if timeout is None else min(timeout, 1.0))
+            except queue.Empty:
+                continue
+            if payload is None:
+                # Wake-up signal from add_to_digest
+                self._queue.task_done()
+                continue
+            try:
+                self._wait_for_circuit()
+                delivered = self._deliver(payload)
+                if not delivered:
+                    logger.error("Giving up on email notification for %s", payload.get("email"))
+                self._record_result(delivered, enqueued_at)
+            except Exception:
+                logger.exception("Unexpected error in notification outbox")
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        """Snapshot of queue depth, delivery counters and latency"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['circuit_open'] = self._circuit_opened_at is not None
+            snapshot['pending_digests'] = len(self._digests)
+        snapshot['queue_depth'] = self._queue.qsize()
+        total_latency = snapshot.pop('total_latency')
+        snapshot['average_latency'] = total_latency / snapshot['delivered'] if snapshot['delivered'] else None
+        return snapshot
+
+# Process-wide outbox, created on first use
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_notification_outbox():
+    """Return the process-wide notification outbox"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = NotificationOutbox(LOGIC_APP_URL, digest_window=EMAIL_DIGEST_WINDOW_SECONDS)
+            # Digests still inside their window would otherwise die with the process
+            atexit.register(_outbox.flush, EMAIL_EXIT_FLUSH_SECONDS)
+        return _outbox
+
+def parse_query_value(query_value):
+    """
+    Convert a legacy query string into the structured form
+    
+    Args:
+        query_value (str): "Retailer: a, b | Retailer: c" or a plain comma-separated list
+    
+    Returns:
+        dict: {retailer: [values]}, with None as the retailer for unlabeled values
+    """
+    sections = {}
+    parts = query_value.split(" | ") if " | " in query_value else [query_value]
+    for part in parts:
+        label, separator, values = part.partition(":")
+        # A URL's scheme ("https:") is not a retailer label
+        if separator and " | " in query_value and not values.startswith("//"):
+            retailer = label.strip()
+        else:
+            retailer, values = None, part
+        sections.setdefault(retailer, []).extend(values.split(", "))
+    return sections
+
+def clean_value(value):
+    """Strip a single value, reducing URLs to their domain"""
+    value = value.strip()
+    if "http" in value:
+        # Extract domain from URL
+        return value.split("//")[-1].split("/")[0]
+    return value
 
 def clean_query_value(query_value):
     """
-    Clean and format the query value for email notification
+    Clean the structured query value for email notification
     
     Args:
-        query_value (str): The raw query value containing brands/companies/URLs
+        query_value (dict | str): {retailer: [brands/companies/URLs]} (None as the
+            retailer for unlabeled values), or a legacy " | " separated string
     
     Returns:
-        str: Cleaned and formatted query value
+        dict: Same shape, with blank values dropped and URLs reduced to their domain
     """
     try:
-        # Split by retailer separator if present
-        if " | " in query_value:
-            # Split into retailer sections
-            retailer_sections = query_value.split(" | ")
-            cleaned_sections = []
-            
-            for section in retailer_sections:
-                if ":" in section:
-                    retailer, values = section.split(":", 1)
-                    # Clean values (remove extra spaces, handle URLs)
-                    values = values.strip()
-                    if "http" in values:
-                        # For URLs, just keep the domain
-                        urls = values.split(", ")
-                        cleaned_urls = []
-                        for url in urls:
-                            if "http" in url:
-                                # Extract domain from URL
-                                domain = url.split("//")[-1].split("/")[0]
-                                cleaned_urls.append(domain)
-                            else:
-                                cleaned_urls.append(url)
-                        values = ", ".join(cleaned_urls)
-                    cleaned_sections.append(f"{retailer}: {values}")
-                else:
-                    cleaned_sections.append(section.strip())
-            
-            return " | ".join(cleaned_sections)
-        else:
-            # For single retailer submissions, just clean the values
-            if "http" in query_value:
-                # Handle URLs
-                urls = query_value.split(", ")
-                cleaned_urls = []
-                for url in urls:
-                    if "http" in url:
-                        domain = url.split("//")[-1].split("/")[0]
-                        cleaned_urls.append(domain)
-                    else:
-                        cleaned_urls.append(url)
-                return ", ".join(cleaned_urls)
-            else:
-                # For regular brand/company submissions
-                return query_value.strip()
+        if isinstance(query_value, str):
+            query_value = parse_query_value(query_value)
+        
+        cleaned = {}
+        for retailer, values in query_value.items():
+            # Handle both list and string inputs
+            if isinstance(values, str):
+                values = [values]
+            # Each URL is reduced to its domain exactly once
+            values = [clean_value(value) for value in values if value and value.strip()]
+            if values:
+                cleaned[retailer] = values
+        return cleaned
     except Exception as e:
-        st.warning(f"Error cleaning query value: {str(e)}")
-        return query_value
+        logger.warning("Error cleaning query value: %s", e)
+        return query_value if isinstance(query_value, dict) else {None: [str(query_value)]}
+
+def merge_query_values(target, sections):
+    """Merge structured sections into `target` in place, skipping duplicate values"""
+    for retailer, values in sections.items():
+        merged = target.setdefault(retailer, [])
+        for value in values:
+            if value not in merged:
+                merged.append(value)
+    return target
+
+def format_query_value(sections):
+    """Render structured sections as the "Retailer: a, b | Retailer: c" summary string"""
+    return " | ".join(
+        f"{retailer}: {', '.join(values)}" if retailer else ", ".join(values)
+        for retailer, values in sections.items()
+    )
+
+def build_digest_payload(requestor_email, sections, notifications=1):
+    """Build the Logic App payload for one requestor's (possibly coalesced) notifications"""
+    summary = format_query_value(sections)
+    if len(summary) > MAX_QUERY_LENGTH:
+        summary = summary[:MAX_QUERY_LENGTH] + "..."
+    return {
+        "email": requestor_email,
+        "query_value": summary,
+        # Full, untruncated list of everything in this digest
+        "submissions": [
+            {"retailer": retailer or "", "values": values}
+            for retailer, values in sections.items()
+        ],
+        "submission_count": notifications
+    }
 
 def send_email_notification(query_value, requestor_email):
     """
-    Send email notification for brand submissions using Azure Logic App
+    Queue an email notification for brand submissions (sent by the Azure Logic App)
+    
+    Notifications for the same requestor are coalesced into one digest email
+    over a short window, and delivery happens on the notification outbox's
+    background worker, so this returns as soon as the notification is queued.
     
     Args:
-        query_value (str): The brand(s) or company being submitted
+        query_value (dict | str): {retailer: [brands/companies/URLs]} being submitted
         requestor_email (str): Email address of the requestor
+    
+    Returns:
+        bool: True if the notification was queued; errors are logged, not shown,
+            so this can run on a worker thread (the caller reports a False)
     """
     try:
-        # Clean and format the query value
+        # Clean the structured query value (URLs reduced to domains)
         cleaned_query = clean_query_value(query_value)
-        
-        # Apply 250 character limit
-        MAX_QUERY_LENGTH = 250
-        if len(cleaned_query) > MAX_QUERY_LENGTH:
-            original_length = len(cleaned_query)
-            cleaned_query = cleaned_query[:MAX_QUERY_LENGTH] + "..."
-            st.warning(f"Query value was truncated from {original_length} to {MAX_QUERY_LENGTH} characters")
-        
-        # Azure Logic App URL
-        url = "https://prod-25.westus.logic.azure.com:443/workflows/8374cfcac0a24a5da20079e6d373b7be/triggers/manual/paths/invoke?api-version=2016-06-01&sp=%2Ftriggers%2Fmanual%2Frun&sv=1.0&sig=RD2GsB_9fQFXD1CGJX_UiLUO-nT-0p1nTI7anvclNyg"
-        
-        # Prepare payload
-        payload = {
-            "email": requestor_email,
-            "query_value": cleaned_query
-        }
-        
-        # Set headers
-        headers = {"Content-Type": "application/json"}
-        
-        # Send request to Azure Logic App
-        response = requests.post(url, json=payload, headers=headers)
-        
-        # Check response - 200 and 202 are both success codes
-        if response.status_code in [200, 202]:
-            st.success("Email notification sent successfully")
-            return True
-        else:
-            st.error(f"Failed to send email notification. Status code: {response.status_code}")
+        if not cleaned_query:
             return False
+        
+        return get_notification_outbox().add_to_digest(requestor_email, cleaned_query)
             
     except Exception as e:
-        st.error(f"Error sending email notification: {str(e)}")
-        return False 
+        logger.error("Error queueing email notification for %s: %s", requestor_email, e)
+        return False
@@ -1,272 +1,222 @@
 import streamlit as st
-import snowflake.connector
-from config import SNOWFLAKE_CONFIG, KEEPA_QUERIES_TABLE, RUN_TYPE, ENV_TYPE
+from config import (
+    RUN_TYPE,
+    SUBMISSION_CHUNK_ROWS,
+    SUBMISSION_CHUNK_RETRIES,
+    SUBMISSION_JOB_POLL_SECONDS
+)
+from core import (
+    create_snowflake_connection,
+    get_connection_pool,
+    get_brand_catalog,
+    get_company_catalog,
+    get_checkpoint_store,
+    get_submission_outbox,
+    get_job_runner,
+    cached_items,
+    load_items,
+    supersede_search,
+    classify_brands,
+    find_company
+)
+import core
+from search_cache import SearchCancelled, refine_results
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor
+from submission import SubmissionUnitOfWork, get_queries_target, NOT_SPECIFIED
+from checkpoint import job_key
+from jobs import SubmissionJob
+from send_email import send_email_notification, NOTIFICATION_FAILED_MESSAGE
+from bulk_upload import UPLOAD_KINDS, UPLOAD_COLUMNS, count_upload_rows, iter_upload_values, submit_upload
+import functools
+import re
+import threading
+import time
 import uuid
 
 # Global requestor variable
 REQUESTOR = "RPA Bot"
 
+# Searches answered by narrowing the session's previous results, across all sessions
+_refinement_stats = {'searches': 0, 'refined': 0}
+_refinement_stats_lock = threading.Lock()
+
+# Runs and time spent per page/fragment function, across all sessions
+_rerun_stats = {}
+_rerun_stats_lock = threading.Lock()
+
 def get_snowflake_connection():
     """Create and return a Snowflake connection"""
     try:
-        # Create connection parameters dictionary
-        conn_params = {
-            'user': SNOWFLAKE_CONFIG['user'],
-            'password': SNOWFLAKE_CONFIG['password'],
-            'account': SNOWFLAKE_CONFIG['account'],
-            'warehouse': SNOWFLAKE_CONFIG['warehouse'],
-            'database': SNOWFLAKE_CONFIG['database'],
-            'schema': SNOWFLAKE_CONFIG['schema'],
-            'role': SNOWFLAKE_CONFIG['role'],
-            'protocol': 'https',
-            'host': f"{SNOWFLAKE_CONFIG['account']}.snowflakecomputing.com",
-            'port': 443,
-            'timeout': 60,
-            'retry_count': 3,
-            'retry_delay': 5
-        }
-        
-        conn = snowflake.connector.connect(**conn_params)
-        return conn
+        return create_snowflake_connection()
     except Exception as e:
         st.error(f"Error connecting to Snowflake: {str(e)}")
         return None
 
-def get_keepa_connection():
-    """Create and return a connection to the Keepa Queries Table"""
-    try:
-        conn = snowflake.connector.connect(
-            user=SNOWFLAKE_CONFIG['user'],
-            password=SNOWFLAKE_CONFIG['password'],
-            account=SNOWFLAKE_CONFIG['account'],
-            warehouse=SNOWFLAKE_CONFIG['warehouse'],
-            database=SNOWFLAKE_CONFIG['database'],
-            schema=SNOWFLAKE_CONFIG['schema'],
-            role=SNOWFLAKE_CONFIG['role'],
-            timeout=30  # Increase timeout to 30 seconds
-        )
-        # Test the connection
-        cursor = conn.cursor()
-        cursor.execute("SELECT CURRENT_VERSION()")
-        cursor.close()
-        return conn
-    except Exception as e:
-        st.error(f"Error connecting to Keepa Queries Table: {str(e)}")
-        return None
+def get_company(company_id):
+    """Look up a company row by company_id without going back to Snowflake"""
+    company_data = get_company_catalog().get(company_id)
+    if company_data is None:
+        # Catalog not loaded yet: use the rows from this session's last company search
+        company_data = (st.session_state.get('amazon_company_rows') or {}).get(company_id)
+    return company_data
+
+def find_items(search_term, item_type, owner=None):
+    """Look a term up in the catalogs, the shared cache, then Snowflake (raises on failure)
 
-def search_items(search_term, item_type):
-    """Search for brands or companies in Snowflake"""
+    `owner` identifies the search box ((session id, key)) whose running query
+    may be cancelled by a newer term; it raises SearchCancelled when that happens.
+    """
+    results = cached_items(search_term, item_type)
+    if results is not None:
+        return results
     with st.spinner(f'Searching {item_type.lower()}s...'):
-        conn = get_snowflake_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                if item_type == "Brand Name":
-                    # Convert search term to uppercase for matching
-                    search_term = search_term.upper()
-                    query = """
-                    SELECT DISTINCT brand as brand_name
-                    FROM boabd.hubspot.company_brand_associations
-                    WHERE UPPER(brand) LIKE %s
-                    ORDER BY brand_name
-                    LIMIT 100
-                    """
-                    cursor.execute(query, (f'%{search_term}%',))
-                    results = [row[0] for row in cursor.fetchall()]
-                else:  # Company Name
-                    query = """
-                    SELECT cmp1.company_id, cmp1.company_name, cmp1.concat_lead_list_name, 
-                           cmp2.concat_lead_list_name as concat_lead_list_name_final 
-                    FROM boabd.hubspot.company_data cmp1
-                    INNER JOIN boabd.hubspot.COMPANY_LEADLISTID_ASSOCIATIONS cmp2
-                    ON cmp1.company_id = cmp2.company_id
-                    WHERE UPPER(cmp1.company_name) LIKE UPPER(%s)
-                    ORDER BY cmp1.company_name
-                    LIMIT 100
-                    """
-                    cursor.execute(query, (f'%{search_term}%',))
-                    results = cursor.fetchall()
-                cursor.close()
-                conn.close()
-                return results
-            except Exception as e:
-                st.error(f"Error searching {item_type.lower()}s: {str(e)}")
-        return []
-
-def insert_into_keepa_table(company_data, req_guid, selection_type, brand_name=None, x_amazon_type=None):
-    """Insert data into the Keepa Table or Echo Queries Table based on submission type"""
-    conn = get_keepa_connection()
-    if not conn:
-        return False
-    
-    try:
-        cursor = conn.cursor()
-        
-        # Set query type and value based on selection type and X-Amazon type
-        if x_amazon_type:
-            # For X-Amazon submissions, use ECHO_QUERIES table
-            query_type = "homedepot_brand" if x_amazon_type == "Home Depot" else "lowes_brand" if x_amazon_type == "Lowes" else f"{x_amazon_type.lower()}_brand"
-            query_value = brand_name if x_amazon_type.lower() in ['homedepot', 'lowes'] else brand_name
-            # Use ENV_TYPE from config
-            table_name = "BOABD.INPUTDATA.ECHO_QUERIES_DEV" if ENV_TYPE == "Test" else "BOABD.INPUTDATA.ECHO_QUERIES"
-            st.write(f"Debug - Using {table_name} for {x_amazon_type} submission")  # Debug log
-        else:
-            # For Amazon submissions, use KEEPA_QUERIES table
-            query_type = "manufacturer_only" if selection_type == "Company" else "brand"
-            query_value = company_data[3] if selection_type == "Company" else brand_name
-            # Use ENV_TYPE from config
-            table_name = "BOABD.INPUTDATA.KEEPA_QUERIES_DEV" if ENV_TYPE == "Test" else "BOABD.INPUTDATA.KEEPA_QUERIES"
-            st.write(f"Debug - Using {table_name} for Amazon {selection_type} submission")  # Debug log
-        
-        query = f"""
-        INSERT INTO {table_name} (
-            QUERY_TYPE,
-            QUERY_VALUE,
-            WRITE_TIME,
-            REQUEST_GUID,
-            STATUS
-        ) VALUES (
-            %s,
-            %s,
-            CURRENT_TIMESTAMP,
-            %s,
-            %s
-        )
-        """
-        
+        return load_items(search_term, item_type, owner)
+
+def search_items(search_term, item_type, search_key=None):
+    """Search for brands or companies in Snowflake
+
+    `search_key` names the search box (defaults to the item type); a newer
+    term in the same box of the same session cancels its running query.
+    """
+    ctx = get_script_run_ctx()
+    owner = (ctx.session_id, search_key or item_type) if ctx else None
+    if owner is not None:
+        # Only cancel queries nobody else is waiting on
+        supersede_search(owner, search_term, item_type)
+
+    # Last successful search per item type in this session, for narrowing as the user types
+    previous_searches = st.session_state.setdefault('previous_searches', {})
+    previous_term, previous_results = previous_searches.get(item_type, (None, ()))
+
+    results = refine_results(previous_term, previous_results, search_term, item_type)
+    refined = results is not None
+    if not refined:
         try:
-            cursor.execute(query, (
-                query_type,
-                query_value,
-                req_guid,  # Use REQUEST_GUID from BULLSEYE_REQUEST
-                "0"  # STATUS
-            ))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            return True
+            results = find_items(search_term, item_type, owner)
+        except SearchCancelled:
+            # A newer term in this box replaced the search; that rerun shows its own results
+            return []
         except Exception as e:
-            st.error(f"Error inserting into {table_name}: {str(e)}")
-            return False
-            
-    except Exception as e:
-        st.error(f"Error in database operation: {str(e)}")
-        return False
-
-def update_bullseye_status(req_guid, status):
-    """Update the status in BULLSEYE_REQUEST table"""
-    conn = get_snowflake_connection()
-    if not conn:
-        return False
-    
-    try:
-        cursor = conn.cursor()
-        query = """
-        UPDATE BOABD.POWERAPP.BULLSEYE_REQUEST
-        SET STATUS = %s
-        WHERE REQ_GUID = %s
-        """
-        
-        cursor.execute(query, (status, req_guid))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        st.error(f"Error updating BULLSEYE_REQUEST status: {str(e)}")
-        return False
+            st.error(f"Error searching {item_type.lower()}s: {str(e)}")
+            return []
+
+    previous_searches[item_type] = (search_term.upper(), tuple(results))
+    with _refinement_stats_lock:
+        _refinement_stats['searches'] += 1
+        if refined:
+            _refinement_stats['refined'] += 1
+    if refined:
+        st.session_state.searches_refined = st.session_state.get('searches_refined', 0) + 1
+    return results
+
+def suggest_brands(search_term, search_key=None, limit=50):
+    """Ranked brand suggestions (prefix, then substring, then typo-tolerant matches)
+
+    Falls back to the plain substring search until the brand catalog has loaded.
+    """
+    results = get_brand_catalog().rank(search_term, limit=limit)
+    if results is None:
+        return search_items(search_term, "Brand Name", search_key=search_key)
+    return results
+
+def split_brand_list(text):
+    """Split a pasted brand list on semicolons or new lines"""
+    return [brand.strip() for brand in re.split(r"[;\n]", text or "") if brand.strip()]
+
+def classify_brand_list(brands):
+    """Split entered brands into (existing HubSpot brands, new brands) in one pass
+
+    Loads the brand catalog first if it isn't loaded yet; if that fails every
+    entry is treated as new, as before.
+    """
+    if not get_brand_catalog().is_loaded:
+        with st.spinner('Loading HubSpot brands...'):
+            return classify_brands(brands)
+    return classify_brands(brands)
+
+def get_refinement_stats():
+    """Process-wide counts of searches and of searches answered by local refinement"""
+    with _refinement_stats_lock:
+        return dict(_refinement_stats)
+
+def timed_run(name):
+    """Decorator counting runs of a page or fragment function and the time they take (see get_rerun_stats)
+
+    CPU time is the script thread's, so it shows what each rerun costs the server.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started, started_cpu = time.perf_counter(), time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed, cpu = time.perf_counter() - started, time.thread_time() - started_cpu
+                with _rerun_stats_lock:
+                    stats = _rerun_stats.setdefault(name, {'runs': 0, 'seconds': 0.0, 'cpu_seconds': 0.0})
+                    stats['runs'] += 1
+                    stats['seconds'] += elapsed
+                    stats['cpu_seconds'] += cpu
+        return wrapper
+    return decorate
+
+def get_rerun_stats():
+    """Process-wide runs, mean wall time and mean CPU time (ms) per timed page/fragment function"""
+    with _rerun_stats_lock:
+        return {
+            name: {
+                'runs': stats['runs'],
+                'mean_ms': stats['seconds'] * 1000 / stats['runs'],
+                'mean_cpu_ms': stats['cpu_seconds'] * 1000 / stats['runs'],
+            }
+            for name, stats in _rerun_stats.items()
+        }
+
+def keep_widget_state(keys):
+    """Carry the values of widgets that aren't drawn on this run over to the next one
+
+    Streamlit forgets a keyed widget's value at the end of a run that doesn't
+    draw it; writing it back as plain session state keeps it until the
+    widget is shown again.
+    """
+    for key in keys:
+        if key in st.session_state:
+            st.session_state[key] = st.session_state[key]
 
 def update_selection(selection_type, selection_value, x_amazon_type=None):
     """Update the selection in Snowflake"""
-    conn = get_snowflake_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # Generate a unique GUID for the request
-            req_guid = str(uuid.uuid4())
-            
-            # Get requestor from session state
-            requestor = st.session_state.requestor_name
-            
-            # Use RUN_TYPE from config
-            run_type = RUN_TYPE
+    try:
+        # Generate a unique GUID for the request
+        req_guid = str(uuid.uuid4())
+        
+        # Get requestor from session state
+        requestor = st.session_state.requestor_name
+        requestor_email = st.session_state.requestor_email
+        
+        # Use RUN_TYPE from config
+        uow = SubmissionUnitOfWork(req_guid, run_type=RUN_TYPE)
+        
+        # Prepare values based on selection type
+        if selection_type == "Company":
+            # selection_value is the company_id; names aren't unique
+            company_data = get_company(selection_value)
+            if not company_data:
+                st.error(f"Company data not found for ID: {selection_value}. Please search for the company again.")
+                return
             
-            # Prepare values based on selection type
-            if selection_type == "Company":
-                # Check if search results exist
-                if not st.session_state.amazon_search_results:
-                    st.error("No search results available. Please search for a company first.")
-                    return
-                
-                # Find the company data from search results
-                company_data = next((row for row in st.session_state.amazon_search_results if row[1] == selection_value), None)
-                if company_data:
-                    company_name = company_data[1]  # Use company_name from row[1]
-                    concat_lead_list_name = company_data[3]  # Use concat_lead_list_name from row[3]
-                    brand_name = "NOTSPECIFIEDUNUSED"
-                    request_type = "Amazon Company Name"
-                    status = "0"
-                    is_multiple = "False"  # Single entry for company name
-                    url_value = None  # URL is blank for company name
-                    requestor_email = st.session_state.requestor_email  # Capture requestor email
-                else:
-                    st.error(f"Company data not found for: {selection_value}")
-                    return
-            else:  # Brand selection
-                if x_amazon_type == "Home Depot":
-                    brand_name = "NOTSPECIFIEDUNUSED"
-                    company_name = "NOTSPECIFIEDUNUSED"
-                    concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                    request_type = "HomeDepot Brand"
-                    status = "0"
-                    is_multiple = "False"  # Set to False for single brand submission
-                    url_value = selection_value  # Use URL for Home Depot
-                    requestor_email = st.session_state.requestor_email
-                elif x_amazon_type == "Lowes":
-                    brand_name = "NOTSPECIFIEDUNUSED"
-                    company_name = "NOTSPECIFIEDUNUSED"
-                    concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                    request_type = "Lowes Brand"
-                    status = "0"
-                    is_multiple = "False"  # Set to False for single brand submission
-                    url_value = selection_value  # Use URL for Lowes
-                    requestor_email = st.session_state.requestor_email
-                elif x_amazon_type == "Target":
-                    brand_name = selection_value
-                    company_name = "NOTSPECIFIEDUNUSED"
-                    concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                    request_type = "Target Brand"
-                    status = "0"
-                    is_multiple = "False"  # Set to False for single brand submission
-                    url_value = None
-                    requestor_email = st.session_state.requestor_email
-                    st.write(f"Debug - Processing Target brand submission: {selection_value}")  # Debug log
-                elif x_amazon_type == "Walmart":
-                    brand_name = selection_value
-                    company_name = "NOTSPECIFIEDUNUSED"
-                    concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                    request_type = "Walmart Brand"
-                    status = "0"
-                    is_multiple = "False"  # Set to False for single brand submission
-                    url_value = None
-                    requestor_email = st.session_state.requestor_email
-                    st.write(f"Debug - Processing Walmart brand submission: {selection_value}")  # Debug log
-                else:
-                    brand_name = selection_value
-                    company_name = "NOTSPECIFIEDUNUSED"
-                    concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                    # Determine request type based on submission type and X-Amazon type
-                    if hasattr(st.session_state, 'submission_type') and st.session_state.submission_type == "Brand Not in HubSpot":
-                        request_type = "Amazon Brand Name New"
-                    else:
-                        request_type = "Amazon Brand Name"
-                    status = "0"
-                    is_multiple = "False"  # Set to False for single brand submission
-                    url_value = None
-                    requestor_email = st.session_state.requestor_email
-
+            uow.add_request(
+                brand_name=NOT_SPECIFIED,
+                request_type="Amazon Company Name",
+                requestor=requestor,
+                requestor_email=requestor_email,
+                is_multiple="False",  # Single entry for company name
+                company_name=company_data[1],  # Use company_name from row[1]
+                concat_lead_list_name=company_data[3]  # Use concat_lead_list_name from row[3]
+            )
+            uow.add_query(*get_queries_target(selection_type, company_data=company_data))
+            display_value = company_data[1]
+        else:  # Brand selection
             # Check if selection_value contains semicolons (multiple brands)
             if ";" in selection_value:
                 # Split the brands and handle them as multiple submissions
@@ -274,184 +224,324 @@ def update_selection(selection_type, selection_value, x_amazon_type=None):
                 st.write(f"Debug - Multiple brands detected: {brands_list}")  # Debug log
                 update_multiple_brands(brands_list, x_amazon_type)
                 return
-
-            # Insert into the BULLSEYE_REQUEST table
-            query = """
-            INSERT INTO BOABD.POWERAPP.BULLSEYE_REQUEST (
-                BRANDNAME,
-                COMPANYNAME,
-                CONCAT_LEAD_LIST_NAME,
-                REQUEST_SUBMISSION_TIME,
-                REQUEST_TYPE,
-                REQUESTOR,
-                REQUESTOR_EMAIL,
-                STATUS,
-                ISMULTIPLEBRANDSUBMISSION,
-                REQ_GUID,
-                RUN_TYPE,
-                URL
-            ) VALUES (
-                %s,
-                %s,
-                %s,
-                CURRENT_TIMESTAMP,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s
-            )
-            """
             
-            try:
-                cursor.execute(query, (
-                    brand_name,
-                    company_name,
-                    concat_lead_list_name,
-                    request_type,
-                    requestor,
-                    requestor_email,
-                    status,
-                    is_multiple,
-                    req_guid,
-                    run_type,
-                    url_value
-                ))
-                conn.commit()
-                st.success(f"✅ Record Added to Request Table: {selection_value}")
-                st.write(f"Debug - Added to BULLSEYE_REQUEST: {selection_value} with is_multiple={is_multiple}")  # Debug log
-            except Exception as e:
-                st.error(f"Failed to insert into BULLSEYE_REQUEST: {str(e)}")
-                return
-
-            # For company submissions, insert into Keepa Table and update status
-            if selection_type == "Company":
-                if not company_data:
-                    st.error("Company data is missing. Cannot proceed with submission.")
-                    return
-                    
-                if insert_into_keepa_table(company_data, req_guid, selection_type):
-                    st.success(f"✅ Sent to Keepa/Echo Table: {selection_value}")
-                    if update_bullseye_status(req_guid, "2"):
-                        st.success(f"✅ Successfully Submitted: {selection_value}")
-                    else:
-                        st.error(f"❌ Failed to update status for: {selection_value}")
-                else:
-                    st.error(f"❌ Failed to process company '{selection_value}'. The request was not added to the processing queue. Please try again or contact support.")
+            if x_amazon_type in ["Home Depot", "Lowes"]:
+                brand_name = NOT_SPECIFIED
+                request_type = "HomeDepot Brand" if x_amazon_type == "Home Depot" else "Lowes Brand"
+                url_value = selection_value  # Use URL for Home Depot / Lowes
             else:
-                # For brand submissions, also insert into Keepa Table and update status
-                if insert_into_keepa_table(None, req_guid, selection_type, selection_value, x_amazon_type):
-                    st.success(f"✅ Sent to Keepa/Echo Table: {selection_value}")
-                    if update_bullseye_status(req_guid, "2"):
-                        st.success(f"✅ Successfully Submitted: {selection_value}")
-                    else:
-                        st.error(f"❌ Failed to update status for: {selection_value}")
+                brand_name = selection_value
+                url_value = None
+                if x_amazon_type in ["Target", "Walmart"]:
+                    request_type = f"{x_amazon_type} Brand"
+                    st.write(f"Debug - Processing {x_amazon_type} brand submission: {selection_value}")  # Debug log
+                # Determine request type based on submission type
+                elif hasattr(st.session_state, 'submission_type') and st.session_state.submission_type == "Brand Not in HubSpot":
+                    request_type = "Amazon Brand Name New"
                 else:
-                    st.error(f"❌ Failed to process brand '{selection_value}'. The request was not added to the processing queue. Please try again or contact support.")
-
-            cursor.close()
-            conn.close()
+                    request_type = "Amazon Brand Name"
+            
+            uow.add_request(
+                brand_name=brand_name,
+                request_type=request_type,
+                requestor=requestor,
+                requestor_email=requestor_email,
+                is_multiple="False",  # Set to False for single brand submission
+                url_value=url_value
+            )
+            uow.add_query(*get_queries_target(selection_type, x_amazon_type, brand_name=selection_value))
+            display_value = selection_value
 
+        # Saved locally right away; the outbox writes it to Snowflake in one transaction
+        try:
+            get_submission_outbox().append(uow)
         except Exception as e:
-            st.error(f"Error submitting request: {str(e)}")
+            st.error(f"❌ Failed to process '{display_value}': {str(e)}. Nothing was saved; please try again or contact support.")
+            return
+        
+        st.success(f"✅ Successfully Submitted: {display_value}")
+        return True
+
+    except Exception as e:
+        st.error(f"Error submitting request: {str(e)}")
+
+def submit_rows(items, add_row, key_parts, req_guid=None):
+    """Submit one request row per item under one REQ_GUID; returns the REQ_GUID
+
+    Runs core.submit_rows: short lists are queued in the submission outbox,
+    longer ones are written in checkpointed chunks behind a progress bar.
+    Raises on failure.
+    """
+    if len(items) <= SUBMISSION_CHUNK_ROWS:
+        return core.submit_rows(items, add_row, key_parts, RUN_TYPE, req_guid, outbox=get_submission_outbox())['req_guid']
+
+    total = len(items)
+    progress = st.progress(0.0, text=f"Submitting {total} rows...")
+
+    def on_chunk(state):
+        done = min(state['chunks'] * SUBMISSION_CHUNK_ROWS, total)
+        verb = "Resuming" if state['resumed'] else "Submitting"
+        progress.progress(done / total, text=f"{verb}: {done} of {total} rows written")
+
+    state = core.submit_rows(items, add_row, key_parts, RUN_TYPE, req_guid, on_chunk)
+    if state['skipped_chunks']:
+        st.info(f"Resumed request {state['req_guid']}: {state['skipped_chunks']} chunks were already saved by an earlier attempt")
+    return state['req_guid']
 
 def update_multiple_brands(brands_list, x_amazon_type=None, req_guid=None, request_type=None, is_multiple=None):
     """Handle multiple brand submissions with the same REQ_GUID"""
-    conn = get_snowflake_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            if not req_guid:
-                req_guid = str(uuid.uuid4())
-            # Get requestor from session state
-            requestor = st.session_state.requestor_name
-            run_type = RUN_TYPE  # Use RUN_TYPE from config
-            requestor_email = st.session_state.requestor_email  # Add requestor email
-            
-            # Determine request type based on submission type and X-Amazon type
-            if x_amazon_type == "Home Depot":
-                request_type = "HomeDepot Brand"
-            elif x_amazon_type == "Lowes":
-                request_type = "Lowes Brand"
-            elif x_amazon_type == "Target":
-                request_type = "Target Brand New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Target Brand"
-            elif x_amazon_type == "Walmart":
-                request_type = "Walmart Brand New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Walmart Brand"
-            else:
-                request_type = "Amazon Brand Name New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Amazon Brand Name"
-            
-            # Only set is_multiple if not provided
-            if is_multiple is None:
-                is_multiple = "TRUE" if len(brands_list) > 1 else "FALSE"
-            
-            # Debug log
-            st.write(f"Debug - update_multiple_brands: is_multiple={is_multiple}, brands_list={brands_list}")
-            
-            for brand in brands_list:
-                query = """
-                INSERT INTO BOABD.POWERAPP.BULLSEYE_REQUEST (
-                    BRANDNAME,
-                    COMPANYNAME,
-                    CONCAT_LEAD_LIST_NAME,
-                    REQUEST_SUBMISSION_TIME,
-                    REQUEST_TYPE,
-                    REQUESTOR,
-                    REQUESTOR_EMAIL,
-                    STATUS,
-                    ISMULTIPLEBRANDSUBMISSION,
-                    REQ_GUID,
-                    RUN_TYPE,
-                    URL
-                ) VALUES (
-                    %s,
-                    'NOTSPECIFIEDUNUSED',
-                    'NOTSPECIFIEDUNUSED',
-                    CURRENT_TIMESTAMP,
-                    %s,
-                    %s,
-                    %s,
-                    '0',
-                    %s,
-                    %s,
-                    %s,
-                    %s
-                )
-                """
-                
+    try:
+        # Get requestor from session state
+        requestor = st.session_state.requestor_name
+        requestor_email = st.session_state.requestor_email  # Add requestor email
+        
+        # Determine request type based on submission type and X-Amazon type
+        if x_amazon_type == "Home Depot":
+            request_type = "HomeDepot Brand"
+        elif x_amazon_type == "Lowes":
+            request_type = "Lowes Brand"
+        elif x_amazon_type == "Target":
+            request_type = "Target Brand New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Target Brand"
+        elif x_amazon_type == "Walmart":
+            request_type = "Walmart Brand New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Walmart Brand"
+        else:
+            request_type = "Amazon Brand Name New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Amazon Brand Name"
+        
+        # Only set is_multiple if not provided
+        if is_multiple is None:
+            is_multiple = "TRUE" if len(brands_list) > 1 else "FALSE"
+        
+        # Debug log
+        st.write(f"Debug - update_multiple_brands: is_multiple={is_multiple}, brands_list={brands_list}")
+        
+        def add_row(uow, brand):
+            uow.add_request(
+                brand_name=brand,  # brand is already a string
+                request_type=request_type,
+                requestor=requestor,
+                requestor_email=requestor_email,
+                is_multiple=is_multiple,
                 # Set URL value based on x_amazon_type
-                url_value = brand if x_amazon_type in ["Home Depot", "Lowes"] else None
-                
-                cursor.execute(query, (
-                    brand,  # brand is already a string
-                    request_type,
-                    requestor,
-                    requestor_email,
-                    is_multiple,
-                    req_guid,
-                    run_type,
-                    url_value
-                ))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-
-            # Insert all brands into Keepa Table and update status
-            keepa_success = True
-            for brand in brands_list:
-                if not insert_into_keepa_table(None, req_guid, "Brand", brand, x_amazon_type):
-                    keepa_success = False
-                    break
-            
-            if keepa_success:
-                if update_bullseye_status(req_guid, "2"):
-                    st.success(f"Successfully submitted {len(brands_list)} brand requests")
-                else:
-                    st.warning(f"Brand requests submitted but status update failed")
-            else:
-                st.warning(f"Brand requests submitted but Keepa Table insertion failed for some brands")
+                url_value=brand if x_amazon_type in ["Home Depot", "Lowes"] else None
+            )
+            uow.add_query(*get_queries_target("Brand", x_amazon_type, brand_name=brand))
+        
+        # Rows and the status update commit together (in checkpointed chunks for very long lists)
+        if not submit_rows(brands_list, add_row, (x_amazon_type, request_type, is_multiple, requestor_email), req_guid):
+            return
+        
+        st.success(f"Successfully submitted {len(brands_list)} brand requests")
+    except Exception as e:
+        st.error(f"Error submitting multiple brand requests: {str(e)}. Nothing was released for processing; submit again to retry.")
+
+def amazon_brand_rows(hubspot_brands, new_brands, requestor, requestor_email):
+    """(rows, add_row, key_parts) for submit_rows: HubSpot and new Amazon brands under one REQ_GUID"""
+    # Same ISMULTIPLEBRANDSUBMISSION for every row of the submission
+    is_multiple = "TRUE" if len(hubspot_brands) + len(new_brands) > 1 else "FALSE"
+    
+    rows = [("Amazon Brand Name", brand) for brand in hubspot_brands]
+    rows += [("Amazon Brand Name New", brand) for brand in new_brands]
+    
+    def add_row(uow, row):
+        request_type, brand = row
+        uow.add_request(
+            brand_name=brand,
+            request_type=request_type,
+            requestor=requestor,
+            requestor_email=requestor_email,
+            is_multiple=is_multiple
+        )
+        uow.add_query(*get_queries_target("Brand", brand_name=brand))
+    
+    return rows, add_row, ("Amazon", is_multiple, requestor_email)
+
+def submit_amazon_brands(hubspot_brands, new_brands, req_guid=None):
+    """Submit HubSpot and manually entered Amazon brands under one REQ_GUID
+
+    HubSpot brands are requested as "Amazon Brand Name" and manual ones as
+    "Amazon Brand Name New". Returns the REQ_GUID on success, None otherwise.
+    """
+    try:
+        rows, add_row, key_parts = amazon_brand_rows(
+            hubspot_brands, new_brands, st.session_state.requestor_name, st.session_state.requestor_email
+        )
+        return submit_rows(rows, add_row, key_parts, req_guid)
+    except Exception as e:
+        st.error(f"Error submitting brands: {str(e)}. Nothing was released for processing; submit again to retry.")
+        return None
+
+def start_amazon_brand_submission(hubspot_brands, manual_entries, requestor, requestor_email):
+    """Submit Amazon brands as a background job; returns its SubmissionJob
+
+    The job does what the Submit All Brands button used to do inline:
+    checks the manual entries against HubSpot, submits every brand under one
+    REQ_GUID (like submit_amazon_brands) and queues the email notification.
+    Returns immediately, so it can run from a button callback; show the job
+    with show_submission_job.
+    """
+    job = SubmissionJob("Amazon brands", list(dict.fromkeys(hubspot_brands + manual_entries)))
+
+    def work(job):
+        matched_brands, new_brands = classify_brands(manual_entries) if manual_entries else ([], [])
+        if matched_brands:
+            job.add_message("info", f"Already in HubSpot, submitting as existing brands: {', '.join(matched_brands)}")
+        existing_brands = list(dict.fromkeys(hubspot_brands + matched_brands))
+        rows, add_row, key_parts = amazon_brand_rows(existing_brands, new_brands, requestor, requestor_email)
+        job.set_items([brand for _, brand in rows])
+
+        state = core.submit_rows(
+            rows, add_row, key_parts, RUN_TYPE,
+            on_chunk=lambda progress: job.progress(progress['rows'], progress['req_guid']),
+            outbox=get_submission_outbox()
+        )
+        job.progress(state['rows'], state['req_guid'])
+        if state['skipped_chunks']:
+            job.add_message("info", f"Resumed request {state['req_guid']}: {state['skipped_chunks']} chunks were already saved by an earlier attempt")
+        if existing_brands:
+            job.add_message("success", f"Successfully submitted brands from HubSpot: {', '.join(existing_brands)}")
+        if new_brands:
+            job.add_message("success", f"Successfully submitted new brands: {', '.join(new_brands)}")
+
+        # One list per retailer, as for the other submissions
+        if send_email_notification({"Amazon": [brand for _, brand in rows]}, requestor_email):
+            job.add_message("success", "Email notification queued")
+        else:
+            job.add_message("error", NOTIFICATION_FAILED_MESSAGE)
+        return state
+
+    return get_job_runner().run(job, work)
+
+def show_submission_job(state_key, on_done=None):
+    """Progress panel for the background job kept in st.session_state[state_key]
+
+    While the job runs the panel is a fragment refreshing itself every
+    SUBMISSION_JOB_POLL_SECONDS, so polling doesn't rerun the page and the
+    rest of it stays usable. Once the job has finished, `on_done()` is
+    called (e.g. to clear the form) and the page reruns once to show it.
+    """
+    job = st.session_state.get(state_key)
+    if job is None:
+        return
+    polling = not job.finished
+
+    def render():
+        if st.session_state.get(state_key) is not job:
+            return
+        snapshot = job.snapshot()
+        items, done, state = snapshot['items'], snapshot['done'], snapshot['state']
+        if state in ("done", "failed") and st.session_state.get(f"{state_key}_finished") != job.id:
+            # Finished since the page last looked: stop polling and let the page catch up
+            st.session_state[f"{state_key}_finished"] = job.id
+            if state == "done" and on_done:
+                on_done()
+            st.rerun()
+
+        if state in ("queued", "running"):
+            st.progress(done / len(items) if items else 0.0,
+                        text=f"Submitting {snapshot['description']}: {done} of {len(items)} written")
+        for level, text in snapshot['messages']:
+            getattr(st, level)(text)
+        if state == "done":
+            st.success(f"Successfully submitted {len(items)} brand(s) with request GUID: {snapshot['req_guid']}")
+        elif state == "failed":
+            st.error(f"Error submitting brands: {snapshot['error']}. Nothing was released for processing; submit again to retry.")
+
+        failed = state == "failed"
+        with st.expander(f"Status per brand ({len(items)})"):
+            st.dataframe(
+                [{"Brand": item, "Status": "Submitted" if i < done else ("Failed" if failed else "Pending")}
+                 for i, item in enumerate(items)],
+                hide_index=True,
+                use_container_width=True
+            )
+        if state in ("done", "failed") and st.button("Dismiss", key=f"{state_key}_dismiss"):
+            del st.session_state[state_key]
+            st.rerun(scope="fragment")
+
+    st.fragment(render, run_every=SUBMISSION_JOB_POLL_SECONDS if polling else None)()
+
+def run_concurrently(tasks, max_workers=4):
+    """Run named zero-argument callables on a bounded thread pool
+
+    Worker threads are attached to the current Streamlit script run so the
+    tasks can still report through st.*. Returns {name: (result, error,
+    elapsed_seconds)} in the order the tasks were given.
+    """
+    if not tasks:
+        return {}
+    ctx = get_script_run_ctx()
+
+    def attach_script_run_ctx():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    def timed(task):
+        started = time.perf_counter()
+        try:
+            return task(), None, time.perf_counter() - started
+        except Exception as e:
+            return None, e, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks)), initializer=attach_script_run_ctx) as executor:
+        futures = {name: executor.submit(timed, task) for name, task in tasks.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+def show_bulk_upload(retailers, key):
+    """File upload submission mode: stream a CSV/XLSX file into batched requests"""
+    retailer = st.selectbox("Retailer:", retailers, key=f"{key}_retailer")
+    kinds = UPLOAD_KINDS[retailer]
+    kind = st.radio("File contains:", kinds, horizontal=True, key=f"{key}_kind") if len(kinds) > 1 else kinds[0]
+    headers = ", ".join(UPLOAD_COLUMNS[kind])
+    uploaded = st.file_uploader(
+        "Upload CSV or Excel file:",
+        type=["csv", "xlsx"],
+        help=f"One {kind.lower()} per row, in a column named one of: {headers} (otherwise the first column is used)",
+        key=f"{key}_file"
+    )
+
+    if uploaded is not None and st.button("Submit File", key=f"{key}_submit"):
+        total_rows = count_upload_rows(uploaded, uploaded.name)
+        progress = st.progress(0.0, text=f"Submitting {uploaded.name}...")
+
+        def on_chunk(summary):
+            done = min(summary['rows_read'] / total_rows, 1.0) if total_rows else 1.0
+            verb = "Resuming" if summary['resumed'] else "Chunk"
+            progress.progress(done, text=f"{verb} {summary['chunks']}: {summary['submitted']} of ~{total_rows} rows written")
+
+        try:
+            summary = submit_upload(
+                iter_upload_values(uploaded, uploaded.name, kind),
+                kind,
+                retailer,
+                st.session_state.requestor_name,
+                st.session_state.requestor_email,
+                get_connection_pool().connection,
+                classify_brands=classify_brand_list,
+                get_company=find_company,
+                run_type=RUN_TYPE,
+                checkpoints=get_checkpoint_store(),
+                # A retry of the same file by the same requestor resumes its unfinished request
+                key=job_key(uploaded.getvalue(), retailer, kind, SUBMISSION_CHUNK_ROWS, st.session_state.requestor_email),
+                retries=SUBMISSION_CHUNK_RETRIES,
+                on_chunk=on_chunk
+            )
         except Exception as e:
-            st.error(f"Error submitting multiple brand requests: {str(e)}") 
+            st.error(f"Error submitting {uploaded.name}: {str(e)}. The request was not released for processing; uploading the same file again resumes where it stopped.")
+            return None
+
+        progress.progress(1.0, text=f"Finished {uploaded.name}")
+        summary['retailer'], summary['filename'] = retailer, uploaded.name
+        if summary['resumed']:
+            st.info(f"Resumed request {summary['req_guid']} from an earlier attempt at {uploaded.name}")
+        if not summary['submitted']:
+            st.warning("No valid rows found in the file.")
+            return summary
+        details = []
+        if kind == "Brand":
+            details.append(f"{summary['existing']} from HubSpot, {summary['new']} new")
+        for field, label in [('invalid', 'invalid'), ('duplicates', 'duplicate'), ('unknown', 'unknown company ids')]:
+            if summary[field]:
+                details.append(f"{summary[field]} {label} skipped")
+        st.success(f"✅ Submitted {summary['submitted']} rows from {uploaded.name} ({'; '.join(details) or 'all rows valid'}) with request GUID: {summary['req_guid']}")
+        return summary
+    return None
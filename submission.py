@@ -0,0 +1,322 @@
+import time
+import uuid
+from config import KEEPA_QUERIES_TABLE, ECHO_QUERIES_TABLE, SNOWFLAKE_BIND_CHUNK_SIZE
+
+# Placeholder used by BULLSEYE_REQUEST for columns that don't apply to a request
+NOT_SPECIFIED = "NOTSPECIFIEDUNUSED"
+
+BULLSEYE_REQUEST_INSERT = """
+INSERT INTO BOABD.POWERAPP.BULLSEYE_REQUEST (
+    BRANDNAME,
+    COMPANYNAME,
+    CONCAT_LEAD_LIST_NAME,
+    REQUEST_SUBMISSION_TIME,
+    REQUEST_TYPE,
+    REQUESTOR,
+    REQUESTOR_EMAIL,
+    STATUS,
+    ISMULTIPLEBRANDSUBMISSION,
+    REQ_GUID,
+    RUN_TYPE,
+    URL
+) VALUES (
+    %s,
+    %s,
+    %s,
+    CURRENT_TIMESTAMP,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s
+)
+"""
+
+QUERIES_INSERT = """
+INSERT INTO {table_name} (
+    QUERY_TYPE,
+    QUERY_VALUE,
+    WRITE_TIME,
+    REQUEST_GUID,
+    STATUS
+) VALUES (
+    %s,
+    %s,
+    CURRENT_TIMESTAMP,
+    %s,
+    %s
+)
+"""
+
+BULLSEYE_STATUS_UPDATE = """
+UPDATE BOABD.POWERAPP.BULLSEYE_REQUEST
+SET STATUS = %s
+WHERE REQ_GUID IN ({placeholders})
+"""
+
+BULLSEYE_REQUEST_COUNT = """
+SELECT COUNT(*)
+FROM BOABD.POWERAPP.BULLSEYE_REQUEST
+WHERE REQ_GUID = %s
+"""
+
+BULLSEYE_REQUEST_EXISTING = """
+SELECT DISTINCT REQ_GUID
+FROM BOABD.POWERAPP.BULLSEYE_REQUEST
+WHERE REQ_GUID IN ({placeholders})
+"""
+
+def chunked(items, size):
+    """Yield successive lists of at most `size` items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def get_queries_target(selection_type, x_amazon_type=None, brand_name=None, company_data=None):
+    """Return (table_name, query_type, query_value) for the Keepa/Echo row of a submission"""
+    if x_amazon_type:
+        # X-Amazon submissions go to the ECHO_QUERIES table
+        query_type = "homedepot_brand" if x_amazon_type == "Home Depot" else "lowes_brand" if x_amazon_type == "Lowes" else f"{x_amazon_type.lower()}_brand"
+        return ECHO_QUERIES_TABLE, query_type, brand_name
+
+    # Amazon submissions go to the KEEPA_QUERIES table
+    if selection_type == "Company":
+        return KEEPA_QUERIES_TABLE, "manufacturer_only", company_data[3]
+    return KEEPA_QUERIES_TABLE, "brand", brand_name
+
+def mark_submitted(conn, req_guids, status="2", chunk_size=SNOWFLAKE_BIND_CHUNK_SIZE):
+    """Flip BULLSEYE_REQUEST.STATUS for the given request GUIDs with set-based updates (no commit)"""
+    cursor = conn.cursor()
+    try:
+        for guids in chunked(list(req_guids), chunk_size):
+            query = BULLSEYE_STATUS_UPDATE.format(placeholders=", ".join(["%s"] * len(guids)))
+            cursor.execute(query, (status, *guids))
+    finally:
+        cursor.close()
+
+def existing_request_guids(conn, req_guids, chunk_size=SNOWFLAKE_BIND_CHUNK_SIZE):
+    """The subset of `req_guids` that already has BULLSEYE_REQUEST rows"""
+    existing = set()
+    cursor = conn.cursor()
+    try:
+        for guids in chunked(list(req_guids), chunk_size):
+            cursor.execute(BULLSEYE_REQUEST_EXISTING.format(placeholders=", ".join(["%s"] * len(guids))), guids)
+            existing.update(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+    return existing
+
+class SubmissionUnitOfWork:
+    """Collects every write of one submission and applies them in a single transaction
+
+    A submission is its BULLSEYE_REQUEST row(s), the matching KEEPA_QUERIES /
+    ECHO_QUERIES row(s) and the STATUS flip to "2". Writing them together on one
+    connection means a request can never be left half-written at STATUS "0".
+    Rows are written with array-bound `executemany` in chunks of `chunk_size`,
+    so the number of statements grows with the number of chunks, not rows.
+    """
+
+    def __init__(self, req_guid=None, run_type=None, chunk_size=SNOWFLAKE_BIND_CHUNK_SIZE):
+        self.req_guid = req_guid or str(uuid.uuid4())
+        self.run_type = run_type
+        self.chunk_size = chunk_size
+        self.requests = []
+        self.queries = []
+        self.req_guids = []
+        self._seen_guids = set()
+
+    def __len__(self):
+        return len(self.requests)
+
+    def _track_guid(self, req_guid):
+        if req_guid not in self._seen_guids:
+            self._seen_guids.add(req_guid)
+            self.req_guids.append(req_guid)
+
+    def add_request(self, brand_name, request_type, requestor, requestor_email, is_multiple,
+                    company_name=NOT_SPECIFIED, concat_lead_list_name=NOT_SPECIFIED, url_value=None,
+                    req_guid=None):
+        """Queue a BULLSEYE_REQUEST row (inserted with STATUS "0")"""
+        req_guid = req_guid or self.req_guid
+        self._track_guid(req_guid)
+        self.requests.append((
+            brand_name,
+            company_name,
+            concat_lead_list_name,
+            request_type,
+            requestor,
+            requestor_email,
+            "0",  # STATUS
+            is_multiple,
+            req_guid,
+            self.run_type,
+            url_value
+        ))
+
+    def add_query(self, table_name, query_type, query_value, req_guid=None):
+        """Queue a KEEPA_QUERIES / ECHO_QUERIES row for this request"""
+        req_guid = req_guid or self.req_guid
+        self.queries.append((table_name, query_type, query_value, req_guid))
+
+    def merge(self, other):
+        """Queue every row of another unit of work, keeping its request GUIDs"""
+        self.requests.extend(other.requests)
+        self.queries.extend(other.queries)
+        for req_guid in other.req_guids:
+            self._track_guid(req_guid)
+
+    def to_record(self):
+        """The queued rows as JSON-serializable data, for from_record"""
+        return {'requests': self.requests, 'queries': self.queries, 'req_guids': self.req_guids}
+
+    @classmethod
+    def from_record(cls, record, chunk_size=SNOWFLAKE_BIND_CHUNK_SIZE):
+        """Rebuild a unit of work saved with to_record"""
+        uow = cls(record['req_guids'][0] if record['req_guids'] else None, chunk_size=chunk_size)
+        uow.requests = [tuple(row) for row in record['requests']]
+        uow.queries = [tuple(row) for row in record['queries']]
+        for req_guid in record['req_guids']:
+            uow._track_guid(req_guid)
+        return uow
+
+    def commit(self, conn, status="2"):
+        """Write all queued rows and flip the status, committing once
+
+        Rolls back and re-raises on any failure, so either everything is
+        written or nothing is. With `status=None` the rows stay at STATUS "0",
+        for requests written in several chunks and flipped at the end.
+        """
+        # Group Keepa/Echo rows per target table so each table gets its own batches
+        queries_by_table = {}
+        for table_name, query_type, query_value, req_guid in self.queries:
+            queries_by_table.setdefault(table_name, []).append((
+                query_type,
+                query_value,
+                req_guid,  # REQUEST_GUID from BULLSEYE_REQUEST
+                "0"  # STATUS
+            ))
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            for rows in chunked(self.requests, self.chunk_size):
+                cursor.executemany(BULLSEYE_REQUEST_INSERT, rows)
+            for table_name, table_rows in queries_by_table.items():
+                query = QUERIES_INSERT.format(table_name=table_name)
+                for rows in chunked(table_rows, self.chunk_size):
+                    cursor.executemany(query, rows)
+            # One set-based status flip per chunk of request GUIDs
+            if status is not None:
+                mark_submitted(conn, self.req_guids, status, self.chunk_size)
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            cursor.close()
+
+def count_request_rows(conn, req_guid):
+    """Number of BULLSEYE_REQUEST rows already written for a request"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(BULLSEYE_REQUEST_COUNT, (req_guid,))
+        return cursor.fetchall()[0][0]
+    finally:
+        cursor.close()
+
+def _commit_chunk(uow, connection, expected_rows, retries, retry_backoff, status=None, writer=None):
+    """Commit one chunk, retrying transient failures without writing it twice"""
+    for attempt in range(retries + 1):
+        try:
+            if writer is not None:
+                writer(uow)
+            else:
+                with connection() as conn:
+                    uow.commit(conn, status=status)
+            return
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(retry_backoff * 2 ** attempt)
+            # The commit may have gone through even though the reply was lost
+            try:
+                with connection() as conn:
+                    if count_request_rows(conn, uow.req_guid) >= expected_rows:
+                        return
+            except Exception:
+                pass
+
+def submit_in_chunks(chunks, add_rows, connection, run_type=None, req_guid=None, checkpoints=None,
+                     key=None, details=None, retries=2, retry_backoff=1.0, on_chunk=None, writer=None):
+    """Write a large submission in checkpointed chunks under one REQ_GUID
+
+    `add_rows(uow, chunk)` queues the rows of one chunk and `connection` is a
+    context manager factory yielding a DB-API connection. Each chunk commits
+    on its own at STATUS "0" and the request flips to "2" after the last one,
+    so a half-written request is never picked up; an input that fits in one
+    chunk is written and flipped in a single transaction, through
+    `writer(uow)` if given (e.g. WriteCoalescer.write, to share it with
+    other submissions).
+
+    Progress is recorded in `checkpoints` (a CheckpointStore) under `key`. A
+    later call with the same key resumes the unfinished REQ_GUID: chunks are
+    rebuilt in the same order and skipped while Snowflake already has their
+    rows (its row count is the source of truth, so a chunk that committed
+    just before a crash is not written twice). Returns a progress dict;
+    raises on failure after recording it in the checkpoint.
+    """
+    resume = checkpoints.find_unfinished(key) if checkpoints is not None and key else None
+    req_guid = resume[0] if resume else (req_guid or str(uuid.uuid4()))
+    committed = 0
+    if resume:
+        with connection() as conn:
+            committed = count_request_rows(conn, req_guid)
+    if checkpoints is not None and key:
+        checkpoints.start(key, req_guid, details)
+
+    progress = {'req_guid': req_guid, 'resumed': bool(resume), 'chunks': 0, 'rows': 0, 'skipped_chunks': 0}
+    released = False
+    try:
+        chunks = iter(chunks)
+        chunk = next(chunks, None)
+        while chunk is not None:
+            following = next(chunks, None)
+            uow = SubmissionUnitOfWork(req_guid, run_type=run_type)
+            add_rows(uow, chunk)
+            size = len(uow)
+            if size and progress['rows'] + size <= committed:
+                # Written by an earlier attempt
+                progress['skipped_chunks'] += 1
+            elif progress['rows'] < committed:
+                raise RuntimeError(
+                    f"Request {req_guid} has {committed} rows in Snowflake, which doesn't match this input"
+                )
+            elif size:
+                # A submission that fits in one chunk is written and released in one transaction
+                released = following is None and not progress['rows']
+                _commit_chunk(uow, connection, progress['rows'] + size, retries, retry_backoff,
+                              status="2" if released else None, writer=writer if released else None)
+            progress['rows'] += size
+            progress['chunks'] += 1
+            if checkpoints is not None and key:
+                checkpoints.record_chunk(req_guid, progress['chunks'], progress['rows'])
+            if on_chunk:
+                on_chunk(progress)
+            chunk = following
+
+        if progress['rows'] and not released:
+            with connection() as conn:
+                mark_submitted(conn, [req_guid])
+                conn.commit()
+    except Exception as e:
+        if checkpoints is not None and key:
+            checkpoints.fail(req_guid, e)
+        raise
+    if checkpoints is not None and key:
+        checkpoints.finish(req_guid)
+    return progress
@@ -0,0 +1,205 @@
+"""A fake DB-API connection for the tests: SQLite behind the Snowflake SQL the app sends
+
+Statements after BEGIN are held back and applied atomically at commit, like
+a warehouse transaction, so a failed commit leaves nothing behind. Faults
+can be scheduled: a rejected value fails any commit containing it, and
+`fail_next_commit` fails the next commit either before its rows are applied
+or after (a commit whose reply was lost). Brand searches run as async
+queries (held "running" between `hold_queries()` and `release_queries()`)
+that can be cancelled with SYSTEM$CANCEL_QUERY, as core.query_search_items
+expects.
+"""
+import itertools
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE BULLSEYE_REQUEST (
+    BRANDNAME, COMPANYNAME, CONCAT_LEAD_LIST_NAME, REQUEST_SUBMISSION_TIME, REQUEST_TYPE,
+    REQUESTOR, REQUESTOR_EMAIL, STATUS, ISMULTIPLEBRANDSUBMISSION, REQ_GUID, RUN_TYPE, URL
+);
+CREATE TABLE KEEPA_QUERIES (QUERY_TYPE, QUERY_VALUE, WRITE_TIME, REQUEST_GUID, STATUS);
+CREATE TABLE ECHO_QUERIES (QUERY_TYPE, QUERY_VALUE, WRITE_TIME, REQUEST_GUID, STATUS);
+"""
+
+def to_sqlite(query):
+    """Translate the app's Snowflake SQL into something SQLite accepts"""
+    for schema in ("BOABD.POWERAPP.", "BOABD.INPUTDATA."):
+        query = query.replace(schema, "")
+    return query.replace("_DEV", "").replace("%s", "?")
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.sfqid = None
+        self._rows = []
+
+    def execute(self, query, params=()):
+        self.connection._check_open()
+        statement = query.strip()
+        if statement.upper() == "BEGIN":
+            self.connection.pending = []
+        elif statement.upper().startswith("SELECT SYSTEM$CANCEL_QUERY"):
+            self.connection.database._cancel(params[0])
+        elif self.connection.pending is not None and not statement.upper().startswith("SELECT"):
+            self.connection.pending.append((query, [tuple(params)]))
+        else:
+            self._rows = self.connection.database._run(query, [tuple(params)])
+        return self
+
+    def executemany(self, query, seq_of_params):
+        self.connection._check_open()
+        if self.connection.pending is not None:
+            self.connection.pending.append((query, [tuple(params) for params in seq_of_params]))
+        else:
+            self.connection.database._run(query, [tuple(params) for params in seq_of_params])
+        return self
+
+    def execute_async(self, query, params=()):
+        self.sfqid = self.connection.database._start_query(params[0])
+        return self
+
+    def get_results_from_sfqid(self, sfqid):
+        self._rows = self.connection.database._query_results(sfqid)
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+        self.pending = None
+        self.closed = False
+        self.rollbacks = 0
+
+    def _check_open(self):
+        if self.closed:
+            raise RuntimeError("Connection is closed")
+
+    def cursor(self):
+        self._check_open()
+        return FakeCursor(self)
+
+    def commit(self):
+        self._check_open()
+        pending, self.pending = self.pending, None
+        self.database._commit(pending or [])
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.pending = None
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    def get_query_status_throw_if_error(self, sfqid):
+        return self.database._query_status(sfqid)
+
+    def is_still_running(self, status):
+        return status == "RUNNING"
+
+class FakeDatabase:
+    """Shared in-memory database handing out FakeConnections"""
+
+    def __init__(self, brands=()):
+        self.db = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        self.db.executescript(SCHEMA)
+        self.lock = threading.RLock()
+        self.connections = []
+        self.commits = 0
+        self.rejected_values = set()
+        self._commit_failures = []
+        self.brands = list(brands)
+        self.queries = {}  # sfqid -> {'term', 'state'}
+        self._query_ids = itertools.count(1)
+        self._queries_released = threading.Event()
+        self._queries_released.set()
+
+    def connect(self):
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+    def reject(self, value):
+        """Fail every commit that writes `value`"""
+        self.rejected_values.add(value)
+
+    def fail_next_commit(self, error=None, lost_reply=False):
+        """Fail the next commit; with `lost_reply` its rows are applied before the error is raised"""
+        self._commit_failures.append((error or ConnectionError("connection reset"), lost_reply))
+
+    def _run(self, query, seq_of_params):
+        with self.lock:
+            cursor = self.db.executemany(to_sqlite(query), seq_of_params) if len(seq_of_params) > 1 \
+                else self.db.execute(to_sqlite(query), seq_of_params[0])
+            return cursor.fetchall()
+
+    def _commit(self, pending):
+        with self.lock:
+            failure = self._commit_failures.pop(0) if self._commit_failures else None
+            if failure is not None and not failure[1]:
+                raise failure[0]
+            if any(value in self.rejected_values for _, rows in pending for row in rows for value in row):
+                raise ValueError("Row rejected by the warehouse")
+            self.db.execute("BEGIN")
+            try:
+                for query, seq_of_params in pending:
+                    self.db.executemany(to_sqlite(query), seq_of_params)
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+            self.commits += 1
+            if failure is not None:
+                raise failure[0]
+
+    def count(self, table, **where):
+        clause = " AND ".join(f"{column} = ?" for column in where)
+        query = f"SELECT COUNT(*) FROM {table}" + (f" WHERE {clause}" if clause else "")
+        with self.lock:
+            return self.db.execute(query, tuple(where.values())).fetchone()[0]
+
+    def statuses(self, req_guid):
+        with self.lock:
+            return {row[0] for row in self.db.execute(
+                "SELECT DISTINCT STATUS FROM BULLSEYE_REQUEST WHERE REQ_GUID = ?", (req_guid,)
+            )}
+
+    # Async brand searches
+
+    def hold_queries(self):
+        """Keep searches started from now on running until release_queries()"""
+        self._queries_released.clear()
+
+    def release_queries(self):
+        self._queries_released.set()
+
+    def _start_query(self, pattern):
+        with self.lock:
+            sfqid = f"query-{next(self._query_ids)}"
+            self.queries[sfqid] = {'term': pattern.strip("%"), 'state': "RUNNING"}
+            return sfqid
+
+    def _cancel(self, sfqid):
+        with self.lock:
+            self.queries[sfqid]['state'] = "CANCELLED"
+
+    def _query_status(self, sfqid):
+        with self.lock:
+            query = self.queries[sfqid]
+            if query['state'] == "CANCELLED":
+                raise RuntimeError(f"Query {sfqid} was cancelled")
+            if query['state'] == "RUNNING" and self._queries_released.is_set():
+                query['state'] = "SUCCESS"
+            return query['state']
+
+    def _query_results(self, sfqid):
+        term = self.queries[sfqid]['term'].upper()
+        return [(brand,) for brand in self.brands if term in brand.upper()]
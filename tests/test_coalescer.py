@@ -0,0 +1,84 @@
+import threading
+import unittest
+from contextlib import contextmanager
+from coalescer import WriteCoalescer
+from submission import SubmissionUnitOfWork, get_queries_target
+from tests.fakes import FakeDatabase
+
+def make_submission(*brands):
+    uow = SubmissionUnitOfWork(run_type="Test")
+    for brand in brands:
+        uow.add_request(brand, "Amazon Brand Name", "Tester", "tester@example.com", "FALSE")
+        uow.add_query(*get_queries_target("Brand", brand_name=brand))
+    return uow
+
+class WriteCoalescerTest(unittest.TestCase):
+    def setUp(self):
+        self.database = FakeDatabase()
+        # The first write waits here, so the submissions after it queue up into one batch
+        self.first_write = threading.Event()
+        self.release_first = threading.Event()
+        self.on_connection = {}  # call number -> callable run before yielding
+        self.calls = 0
+        self.coalescer = WriteCoalescer(self.connection, writers=1, max_delay=0.01)
+
+    @contextmanager
+    def connection(self):
+        self.calls += 1
+        if self.calls == 1:
+            self.first_write.set()
+            self.release_first.wait(5)
+        if self.calls in self.on_connection:
+            self.on_connection[self.calls]()
+        yield self.database.connect()
+
+    def submit_batch(self, submissions):
+        """Submit a warm-up submission, then `submissions` while it is being written; returns their futures"""
+        warm_up = self.coalescer.submit(make_submission("WARM UP"))
+        self.first_write.wait(5)
+        futures = [self.coalescer.submit(uow) for uow in submissions]
+        self.release_first.set()
+        self.assertEqual(warm_up.result(5), 1)
+        return futures
+
+    def test_queued_submissions_share_one_commit(self):
+        submissions = [make_submission(f"BRAND {i}") for i in range(5)]
+        futures = self.submit_batch(submissions)
+        self.assertEqual([future.result(5) for future in futures], [1] * 5)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST"), 6)
+        self.assertEqual(self.database.commits, 2)
+        self.assertEqual(self.coalescer.stats()['largest_batch'], 5)
+        for uow in submissions:
+            self.assertEqual(self.database.statuses(uow.req_guid), {"2"})
+
+    def test_rejected_submission_only_fails_its_own_future(self):
+        self.database.reject("POISON")
+        submissions = [make_submission("A"), make_submission("POISON"), make_submission("B", "C")]
+        futures = self.submit_batch(submissions)
+        self.assertEqual(futures[0].result(5), 1)
+        with self.assertRaises(ValueError):
+            futures[1].result(5)
+        self.assertEqual(futures[2].result(5), 2)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST"), 4)
+        self.assertEqual(self.coalescer.stats()['fallback_batches'], 1)
+
+    def test_batch_with_lost_reply_is_not_written_twice(self):
+        # The merged batch is the second write; its commit lands but the reply is lost
+        self.on_connection[2] = lambda: self.database.fail_next_commit(lost_reply=True)
+        submissions = [make_submission(f"BRAND {i}") for i in range(3)]
+        futures = self.submit_batch(submissions)
+        self.assertEqual([future.result(5) for future in futures], [1] * 3)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST"), 4)
+        self.assertEqual(self.coalescer.stats()['fallback_batches'], 1)
+
+    def test_failed_batch_is_retried_one_submission_at_a_time(self):
+        self.on_connection[2] = lambda: self.database.fail_next_commit()
+        submissions = [make_submission(f"BRAND {i}") for i in range(3)]
+        futures = self.submit_batch(submissions)
+        self.assertEqual([future.result(5) for future in futures], [1] * 3)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST"), 4)
+        # The failed batch wrote nothing; the warm-up and each submission committed on their own
+        self.assertEqual(self.database.commits, 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import threading
+import unittest
+from db_pool import ConnectionPool, NestedBorrowError, PoolTimeoutError
+from tests.fakes import FakeDatabase
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.database = FakeDatabase()
+        self.pool = ConnectionPool(self.database.connect, max_size=2, acquire_timeout=0.2, validate_after=None)
+
+    def test_connections_are_reused(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(len(self.database.connections), 1)
+        self.assertEqual(self.pool.stats()['hits'], 1)
+
+    def test_nested_borrow_from_one_thread_is_refused(self):
+        with self.pool.connection():
+            with self.assertRaises(NestedBorrowError):
+                self.pool.acquire()
+        # The outer connection went back to the pool and the thread may borrow again
+        with self.pool.connection():
+            pass
+        self.assertEqual(self.pool.stats()['in_use'], 0)
+
+    def test_other_threads_still_borrow_while_one_is_held(self):
+        borrowed = []
+
+        def borrow():
+            with self.pool.connection() as conn:
+                borrowed.append(conn)
+
+        with self.pool.connection() as held:
+            thread = threading.Thread(target=borrow)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(borrowed), 1)
+        self.assertIsNot(borrowed[0], held)
+
+    def test_exhausted_pool_times_out(self):
+        release = threading.Event()
+        holding = threading.Barrier(3)
+
+        def hold():
+            with self.pool.connection():
+                holding.wait()
+                release.wait()
+
+        threads = [threading.Thread(target=hold) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        holding.wait()
+        try:
+            with self.assertRaises(PoolTimeoutError):
+                self.pool.acquire()
+        finally:
+            release.set()
+            for thread in threads:
+                thread.join()
+
+    def test_connection_is_discarded_when_the_block_raises(self):
+        with self.assertRaises(ValueError):
+            with self.pool.connection() as conn:
+                conn.cursor().execute("BEGIN")
+                raise ValueError("boom")
+        self.assertTrue(conn.closed)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertEqual(self.pool.stats()['discarded'], 1)
+        with self.pool.connection() as replacement:
+            self.assertIsNot(replacement, conn)
+
+    def test_closed_idle_connection_is_replaced(self):
+        with self.pool.connection() as conn:
+            pass
+        conn.close()
+        with self.pool.connection() as replacement:
+            self.assertIsNot(replacement, conn)
+        self.assertEqual(self.pool.stats()['discarded'], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import threading
+import time
+import unittest
+import core
+from db_pool import ConnectionPool
+from search_cache import SingleFlight, SingleFlightTimeout, SearchCancelled, normalize_key
+from tests.fakes import FakeDatabase
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time")
+        time.sleep(0.005)
+
+class Caller(threading.Thread):
+    """Runs `fn` on its own thread and keeps its result or exception"""
+
+    def __init__(self, fn):
+        super().__init__(daemon=True)
+        self.fn = fn
+        self.result = None
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            self.result = self.fn()
+        except BaseException as e:
+            self.error = e
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight(timeout=5)
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow(self, result):
+        def fn():
+            self.calls += 1
+            self.release.wait(5)
+            if isinstance(result, BaseException):
+                raise result
+            return result
+        return fn
+
+    def test_concurrent_callers_share_one_call(self):
+        leader = Caller(lambda: self.flight.do("key", self.slow(["ACME"])))
+        wait_until(lambda: self.calls == 1)
+        waiters = [Caller(lambda: self.flight.do("key", self.slow(["OTHER"]))) for _ in range(3)]
+        wait_until(lambda: self.flight.waiter_count("key") == 3)
+        self.release.set()
+        for caller in [leader] + waiters:
+            caller.join(5)
+            self.assertEqual(caller.result, ["ACME"])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.stats()['coalesced'], 3)
+        self.assertEqual(self.flight.stats()['in_flight'], 0)
+
+    def test_error_is_shared_and_the_next_call_runs_again(self):
+        leader = Caller(lambda: self.flight.do("key", self.slow(ConnectionError("warehouse down"))))
+        wait_until(lambda: self.calls == 1)
+        waiter = Caller(lambda: self.flight.do("key", self.slow(["UNUSED"])))
+        wait_until(lambda: self.flight.waiter_count("key") == 1)
+        self.release.set()
+        leader.join(5)
+        waiter.join(5)
+        self.assertIsInstance(leader.error, ConnectionError)
+        self.assertIs(waiter.error, leader.error)
+
+        self.assertEqual(self.flight.do("key", self.slow(["ACME"])), ["ACME"])
+        self.assertEqual(self.calls, 2)
+
+    def test_waiter_times_out_without_stopping_the_leader(self):
+        leader = Caller(lambda: self.flight.do("key", self.slow(["ACME"])))
+        wait_until(lambda: self.calls == 1)
+        with self.assertRaises(SingleFlightTimeout):
+            self.flight.do("key", self.slow(["UNUSED"]), timeout=0.05)
+        self.assertEqual(self.flight.waiter_count("key"), 0)
+        self.release.set()
+        leader.join(5)
+        self.assertEqual(leader.result, ["ACME"])
+
+class SearchCancellationTest(unittest.TestCase):
+    """core.load_items against async queries on the fake database"""
+
+    def setUp(self):
+        self.database = FakeDatabase(brands=["ACME", "ACME TOOLS", "GLOBEX"])
+        self.previous_pool = core.get_connection_pool()
+        core.set_connection_pool(ConnectionPool(self.database.connect, max_size=4, validate_after=None))
+
+    def tearDown(self):
+        self.database.release_queries()
+        core.set_connection_pool(self.previous_pool)
+
+    def running_query(self, owner):
+        wait_until(lambda: owner in core._inflight_searches._queries)
+        return core._inflight_searches._queries[owner]
+
+    def test_newer_term_cancels_the_running_query(self):
+        owner = ("session-1", "brand_search")
+        self.database.hold_queries()
+        search = Caller(lambda: core.load_items("acm", "Brand Name", owner))
+        self.running_query(owner)
+
+        self.assertTrue(core.supersede_search(owner, "acme", "Brand Name"))
+        search.join(5)
+        self.assertIsInstance(search.error, SearchCancelled)
+        self.assertEqual([query['state'] for query in self.database.queries.values()], ["CANCELLED"])
+        # Cancelled searches aren't cached
+        self.assertIsNone(core.get_search_cache().get(normalize_key("acm", "Brand Name")))
+
+        self.database.release_queries()
+        self.assertEqual(core.load_items("acme", "Brand Name", owner), ["ACME", "ACME TOOLS"])
+
+    def test_waiter_on_a_cancelled_query_runs_its_own(self):
+        first, second = ("session-1", "brand_search"), ("session-2", "brand_search")
+        self.database.hold_queries()
+        leader = Caller(lambda: core.load_items("glob", "Brand Name", first))
+        query = self.running_query(first)
+        waiter = Caller(lambda: core.load_items("glob", "Brand Name", second))
+        wait_until(lambda: core._search_flight.waiter_count(normalize_key("glob", "Brand Name")) == 1)
+
+        # Another session waits on the query, so a newer term leaves it running...
+        self.assertFalse(core.supersede_search(first, "globe", "Brand Name"))
+        # ...but if it is cancelled anyway, the waiter retries with its own query
+        query.cancel()
+        self.database.release_queries()
+        leader.join(5)
+        waiter.join(5)
+        self.assertIsInstance(leader.error, SearchCancelled)
+        self.assertIsNone(waiter.error)
+        self.assertEqual(waiter.result, ["GLOBEX"])
+        self.assertEqual(len(self.database.queries), 2)
+
+if __name__ == "__main__":
+    unittest.main()
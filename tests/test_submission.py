@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import unittest
+from checkpoint import CheckpointStore
+from db_pool import ConnectionPool
+from submission import SubmissionUnitOfWork, get_queries_target, submit_in_chunks, _commit_chunk
+from tests.fakes import FakeDatabase
+
+def add_brands(uow, brands):
+    for brand in brands:
+        uow.add_request(brand, "Amazon Brand Name", "Tester", "tester@example.com", "TRUE")
+        uow.add_query(*get_queries_target("Brand", brand_name=brand))
+
+class SubmissionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.database = FakeDatabase()
+        self.pool = ConnectionPool(self.database.connect, max_size=2, validate_after=None)
+
+class UnitOfWorkTest(SubmissionTestCase):
+    def test_commit_writes_every_row_and_flips_the_status(self):
+        uow = SubmissionUnitOfWork(run_type="Test", chunk_size=2)
+        add_brands(uow, ["A", "B", "C"])
+        with self.pool.connection() as conn:
+            uow.commit(conn)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST"), 3)
+        self.assertEqual(self.database.count("KEEPA_QUERIES", REQUEST_GUID=uow.req_guid), 3)
+        self.assertEqual(self.database.statuses(uow.req_guid), {"2"})
+        self.assertEqual(self.database.commits, 1)
+
+    def test_failed_commit_leaves_nothing_behind(self):
+        self.database.reject("B")
+        uow = SubmissionUnitOfWork(run_type="Test")
+        add_brands(uow, ["A", "B"])
+        with self.assertRaises(ValueError):
+            with self.pool.connection() as conn:
+                uow.commit(conn)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST"), 0)
+        self.assertEqual(self.database.count("KEEPA_QUERIES"), 0)
+
+class CommitChunkTest(SubmissionTestCase):
+    def make_chunk(self):
+        uow = SubmissionUnitOfWork(run_type="Test")
+        add_brands(uow, ["A", "B", "C"])
+        return uow
+
+    def test_commit_with_lost_reply_is_not_written_twice(self):
+        self.database.fail_next_commit(lost_reply=True)
+        _commit_chunk(self.make_chunk(), self.pool.connection, 3, retries=2, retry_backoff=0, status="2")
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST"), 3)
+        self.assertEqual(self.database.commits, 1)
+
+    def test_failed_commit_is_retried(self):
+        self.database.fail_next_commit()
+        _commit_chunk(self.make_chunk(), self.pool.connection, 3, retries=2, retry_backoff=0, status="2")
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST"), 3)
+
+    def test_gives_up_after_the_last_retry(self):
+        self.database.reject("B")
+        with self.assertRaises(ValueError):
+            _commit_chunk(self.make_chunk(), self.pool.connection, 3, retries=1, retry_backoff=0)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST"), 0)
+
+class SubmitInChunksTest(SubmissionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.checkpoints = CheckpointStore(os.path.join(self.directory, "checkpoints.sqlite"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def submit(self, chunks, key="upload", retries=0):
+        return submit_in_chunks(chunks, add_brands, self.pool.connection, run_type="Test",
+                                checkpoints=self.checkpoints, key=key, retries=retries, retry_backoff=0)
+
+    def test_rows_are_released_only_after_the_last_chunk(self):
+        progress = self.submit([["A", "B"], ["C", "D"], ["E"]])
+        self.assertEqual(progress['chunks'], 3)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST", REQ_GUID=progress['req_guid']), 5)
+        self.assertEqual(self.database.statuses(progress['req_guid']), {"2"})
+        self.assertIsNone(self.checkpoints.find_unfinished("upload"))
+
+    def test_retry_resumes_after_the_committed_chunks(self):
+        chunks = [["A", "B"], ["C", "D"], ["E"]]
+        self.database.reject("C")
+        with self.assertRaises(ValueError):
+            self.submit(chunks)
+        req_guid, chunks_committed, rows_committed = self.checkpoints.find_unfinished("upload")
+        self.assertEqual((chunks_committed, rows_committed), (1, 2))
+        # Written chunks stay at STATUS "0" until the whole request is in
+        self.assertEqual(self.database.statuses(req_guid), {"0"})
+
+        self.database.rejected_values.clear()
+        progress = self.submit(chunks)
+        self.assertEqual(progress['req_guid'], req_guid)
+        self.assertTrue(progress['resumed'])
+        self.assertEqual(progress['skipped_chunks'], 1)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST", REQ_GUID=req_guid), 5)
+        self.assertEqual(self.database.statuses(req_guid), {"2"})
+        self.assertIsNone(self.checkpoints.find_unfinished("upload"))
+
+    def test_resume_trusts_snowflake_over_the_checkpoint(self):
+        chunks = [["A", "B"], ["C", "D"], ["E"]]
+        # The first chunk commits but its reply is lost, so the checkpoint records nothing
+        self.database.fail_next_commit(lost_reply=True)
+        with self.assertRaises(ConnectionError):
+            self.submit(chunks)
+        req_guid, chunks_committed, _ = self.checkpoints.find_unfinished("upload")
+        self.assertEqual(chunks_committed, 0)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST", REQ_GUID=req_guid), 2)
+
+        progress = self.submit(chunks)
+        self.assertEqual(progress['skipped_chunks'], 1)
+        self.assertEqual(self.database.count("BULLSEYE_REQUEST", REQ_GUID=req_guid), 5)
+
+    def test_resume_with_different_input_is_refused(self):
+        self.database.reject("D")
+        with self.assertRaises(ValueError):
+            self.submit([["A", "B", "C"], ["D"]])
+        self.database.rejected_values.clear()
+        with self.assertRaisesRegex(RuntimeError, "doesn't match this input"):
+            self.submit([["A", "B"], ["C", "D"], ["E"]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,18 +1,34 @@
 import streamlit as st
 from shared_functions import (
-    search_items, 
+    suggest_brands,
     update_multiple_brands, 
     update_selection,
-    get_snowflake_connection,
-    insert_into_keepa_table,
-    update_bullseye_status
+    get_submission_outbox,
+    submit_rows,
+    run_concurrently,
+    split_brand_list,
+    classify_brand_list,
+    show_bulk_upload,
+    timed_run
 )
-from send_email import send_email_notification
-from config import RUN_TYPE
+from submission import SubmissionUnitOfWork, get_queries_target, NOT_SPECIFIED
+from send_email import send_email_notification, NOTIFICATION_FAILED_MESSAGE
+from config import RUN_TYPE, X_AMAZON_MAX_WORKERS
+from functools import partial
 import re
 import uuid
 from datetime import datetime
 
+# Widget values kept while the section isn't shown (see app.SECTIONS); buttons and
+# file uploaders can't be restored
+WIDGET_KEYS = (
+    "walmart_checkbox", "target_checkbox", "homedepot_checkbox", "lowes_checkbox",
+    "walmart_search", "walmart_brand_select", "walmart_not_in_hubspot",
+    "target_search", "target_brand_select", "target_not_in_hubspot",
+    "homedepot_url", "lowes_url",
+    "x_amazon_upload_retailer", "x_amazon_upload_kind",
+)
+
 def validate_url(url):
     """Validate URL and return specific error message if invalid"""
     if not url:
@@ -45,6 +61,50 @@ def validate_email(email):
     
     return True, ""
 
+@st.fragment
+@timed_run("retailer_brand_search")
+def show_retailer_search(retailer):
+    """HubSpot brand search for Walmart or Target; reruns on its own while typing
+
+    The selection is kept in st.session_state["<retailer>_selected_brands"] and
+    brands not in HubSpot in the "<retailer>_not_in_hubspot" widget.
+    """
+    prefix = retailer.lower()
+    selected_key = f"{prefix}_selected_brands"
+    # Search box for the retailer
+    search_term = st.text_input(
+        f"Search Brands from HubSpot for {retailer}:",
+        help="Type to search for available brands",
+        key=f"{prefix}_search"
+    )
+    
+    if search_term:
+        results = suggest_brands(search_term, search_key=f"{prefix}_search")
+        
+        if results:
+            # Ranked suggestions first, then previously selected brands
+            all_options = list(dict.fromkeys(results + st.session_state[selected_key]))
+            selected_values = st.multiselect(
+                f"Select Brand(s) for {retailer}:",
+                options=all_options,
+                default=st.session_state[selected_key],
+                key=f"{prefix}_brand_select"
+            )
+            # Update session state with current selections
+            st.session_state[selected_key] = selected_values
+        else:
+            st.info(f"No brands found in HubSpot for {retailer}.")
+            # Enable Brand Not in HubSpot option when no brands are found
+            st.text_input(
+                f"Add Brands not in HubSpot for {retailer}",
+                help="Enter brand name(s) separated by semicolons for multiple brands",
+                key=f"{prefix}_not_in_hubspot"
+            )
+
+    if st.session_state[selected_key]:
+        st.info(f"Current {retailer} Selection: {', '.join(st.session_state[selected_key])}")
+
+@timed_run("x_amazon_section")
 def show_x_amazon_section():
     st.title("X-Amazon Submission")
 
@@ -73,70 +133,14 @@ def show_x_amazon_section():
             walmart_selected = st.checkbox("Walmart", key="walmart_checkbox")
             
             if walmart_selected:
-                # Search box for Walmart
-                walmart_search = st.text_input(
-                    "Search Brands from HubSpot for Walmart:",
-                    help="Type to search for available brands",
-                    key="walmart_search"
-                )
-                
-                if walmart_search:
-                    walmart_results = search_items(walmart_search, "Brand Name")
-                    
-                    if walmart_results:
-                        # Combine new search results with previously selected brands
-                        all_walmart_options = list(set(walmart_results + st.session_state.walmart_selected_brands))
-                        walmart_selected_values = st.multiselect(
-                            "Select Brand(s) for Walmart:",
-                            options=all_walmart_options,
-                            default=st.session_state.walmart_selected_brands,
-                            key="walmart_brand_select"
-                        )
-                        # Update session state with current selections
-                        st.session_state.walmart_selected_brands = walmart_selected_values
-                    else:
-                        st.info("No brands found in HubSpot for Walmart.")
-                        # Enable Brand Not in HubSpot option when no brands are found
-                        walmart_not_in_hubspot = st.text_input(
-                            "Add Brands not in HubSpot for Walmart",
-                            help="Enter brand name(s) separated by semicolons for multiple brands",
-                            key="walmart_not_in_hubspot"
-                        )
+                show_retailer_search("Walmart")
 
             # Target Section
             st.write("### Target")
             target_selected = st.checkbox("Target", key="target_checkbox")
             
             if target_selected:
-                # Search box for Target
-                target_search = st.text_input(
-                    "Search Brands from HubSpot for Target:",
-                    help="Type to search for available brands",
-                    key="target_search"
-                )
-                
-                if target_search:
-                    target_results = search_items(target_search, "Brand Name")
-                    
-                    if target_results:
-                        # Combine new search results with previously selected brands
-                        all_target_options = list(set(target_results + st.session_state.target_selected_brands))
-                        target_selected_values = st.multiselect(
-                            "Select Brand(s) for Target:",
-                            options=all_target_options,
-                            default=st.session_state.target_selected_brands,
-                            key="target_brand_select"
-                        )
-                        # Update session state with current selections
-                        st.session_state.target_selected_brands = target_selected_values
-                    else:
-                        st.info("No brands found in HubSpot for Target.")
-                        # Enable Brand Not in HubSpot option when no brands are found
-                        target_not_in_hubspot = st.text_input(
-                            "Add Brands not in HubSpot for Target",
-                            help="Enter brand name(s) separated by semicolons for multiple brands",
-                            key="target_not_in_hubspot"
-                        )
+                show_retailer_search("Target")
 
         with col2:
             st.subheader("URL-based Retailers")
@@ -146,7 +150,7 @@ def show_x_amazon_section():
             if homedepot_selected or lowes_selected:
                 if homedepot_selected:
                     st.write("### Home Depot")
-                    homedepot_url = st.text_input(
+                    st.text_input(
                         "Enter Home Depot Brand URL:",
                         help="Enter the URL for the brand page (must start with http:// or https://)",
                         key="homedepot_url"
@@ -154,75 +158,86 @@ def show_x_amazon_section():
                 
                 if lowes_selected:
                     st.write("### Lowes")
-                    lowes_url = st.text_input(
+                    st.text_input(
                         "Enter Lowes Brand URL:",
                         help="Enter the URL for the brand page (must start with http:// or https://)",
                         key="lowes_url"
                     )
 
+        # Values entered so far (the search panels keep theirs in session state)
+        walmart_selected_values = st.session_state.walmart_selected_brands if walmart_selected else []
+        walmart_not_in_hubspot = st.session_state.get("walmart_not_in_hubspot", "") if walmart_selected else ""
+        target_selected_values = st.session_state.target_selected_brands if target_selected else []
+        target_not_in_hubspot = st.session_state.get("target_not_in_hubspot", "") if target_selected else ""
+        homedepot_url = st.session_state.get("homedepot_url", "") if homedepot_selected else ""
+        lowes_url = st.session_state.get("lowes_url", "") if lowes_selected else ""
+
         # Single submit button for all selected retailers
         if (walmart_selected or target_selected or homedepot_selected or lowes_selected) and st.button("Submit All Selected Retailers"):
             with st.spinner('Submitting to selected retailers...'):
                 success_messages = []
                 error_messages = []
+                # Per-retailer submissions to run concurrently: name -> (callable, success message)
+                retailer_tasks = {}
+                # Per-retailer submitted brands/URLs for the email notification
+                retailer_values = {}
 
                 # Handle Walmart submission
                 if walmart_selected:
-                    if 'walmart_selected_values' in locals() and walmart_selected_values:
-                        # Reset submission type for dropdown selection
-                        st.session_state.submission_type = None
-                        # Handle multiple brands
-                        if len(walmart_selected_values) > 1:
-                            update_multiple_brands(walmart_selected_values, "Walmart")
-                            success_messages.append("Successfully submitted brands from HubSpot to Walmart")
-                        else:
-                            update_selection("Brand", walmart_selected_values[0], "Walmart")
-                            success_messages.append("Successfully submitted brand from HubSpot to Walmart")
-                    elif 'walmart_not_in_hubspot' in locals() and walmart_not_in_hubspot:
-                        # Handle Brand Not in HubSpot submissions
-                        st.session_state.submission_type = "Brand Not in HubSpot"
-                        if ";" in walmart_not_in_hubspot:
-                            brands_list = [brand.strip() for brand in walmart_not_in_hubspot.split(";")]
-                            update_multiple_brands(brands_list, "Walmart")
-                            success_messages.append("Successfully submitted new brands to Walmart")
-                        else:
-                            update_selection("Brand", walmart_not_in_hubspot, "Walmart")
-                            success_messages.append("Successfully submitted new brand to Walmart")
+                    if walmart_selected_values:
+                        # Dropdown selection, regular request type
+                        retailer_tasks["Walmart"] = (
+                            partial(submit_retailer_brands, walmart_selected_values, "Walmart", "Brand Name"),
+                            "Successfully submitted brands from HubSpot to Walmart" if len(walmart_selected_values) > 1
+                            else "Successfully submitted brand from HubSpot to Walmart"
+                        )
+                        retailer_values["Walmart"] = walmart_selected_values
+                    elif split_brand_list(walmart_not_in_hubspot):
+                        # Brands not in HubSpot: entries that do match HubSpot are submitted as regular brands
+                        existing_brands, new_brands = classify_brand_list(split_brand_list(walmart_not_in_hubspot))
+                        if existing_brands:
+                            st.info(f"Already in HubSpot, submitting to Walmart as existing brands: {', '.join(existing_brands)}")
+                        retailer_tasks["Walmart"] = (
+                            partial(submit_pasted_brands, existing_brands, new_brands, "Walmart"),
+                            pasted_brands_message(existing_brands, new_brands, "Walmart")
+                        )
+                        retailer_values["Walmart"] = existing_brands + new_brands
                     else:
                         error_messages.append("Please select or enter brands for Walmart")
 
                 # Handle Target submission
                 if target_selected:
-                    if 'target_selected_values' in locals() and target_selected_values:
-                        # Reset submission type for dropdown selection
-                        st.session_state.submission_type = None
-                        # Handle multiple brands
-                        if len(target_selected_values) > 1:
-                            update_multiple_brands(target_selected_values, "Target")
-                            success_messages.append("Successfully submitted brands from HubSpot to Target")
-                        else:
-                            update_selection("Brand", target_selected_values[0], "Target")
-                            success_messages.append("Successfully submitted brand from HubSpot to Target")
-                    elif 'target_not_in_hubspot' in locals() and target_not_in_hubspot:
-                        # Handle Brand Not in HubSpot submissions
-                        st.session_state.submission_type = "Brand Not in HubSpot"
-                        if ";" in target_not_in_hubspot:
-                            brands_list = [brand.strip() for brand in target_not_in_hubspot.split(";")]
-                            update_multiple_brands(brands_list, "Target")
-                            success_messages.append("Successfully submitted new brands to Target")
-                        else:
-                            update_selection("Brand", target_not_in_hubspot, "Target")
-                            success_messages.append("Successfully submitted new brand to Target")
+                    if target_selected_values:
+                        # Dropdown selection, regular request type
+                        retailer_tasks["Target"] = (
+                            partial(submit_retailer_brands, target_selected_values, "Target", "Brand Name"),
+                            "Successfully submitted brands from HubSpot to Target" if len(target_selected_values) > 1
+                            else "Successfully submitted brand from HubSpot to Target"
+                        )
+                        retailer_values["Target"] = target_selected_values
+                    elif split_brand_list(target_not_in_hubspot):
+                        # Brands not in HubSpot: entries that do match HubSpot are submitted as regular brands
+                        existing_brands, new_brands = classify_brand_list(split_brand_list(target_not_in_hubspot))
+                        if existing_brands:
+                            st.info(f"Already in HubSpot, submitting to Target as existing brands: {', '.join(existing_brands)}")
+                        retailer_tasks["Target"] = (
+                            partial(submit_pasted_brands, existing_brands, new_brands, "Target"),
+                            pasted_brands_message(existing_brands, new_brands, "Target")
+                        )
+                        retailer_values["Target"] = existing_brands + new_brands
                     else:
                         error_messages.append("Please select or enter brands for Target")
 
                 # Handle Home Depot submission
                 if homedepot_selected:
-                    if 'homedepot_url' in locals() and homedepot_url:
+                    if homedepot_url:
                         is_valid, error_message = validate_url(homedepot_url)
                         if is_valid:
-                            update_selection("Brand", homedepot_url, "Home Depot")
-                            success_messages.append("Successfully submitted Home Depot brand URL")
+                            retailer_tasks["Home Depot"] = (
+                                partial(submit_retailer_brands, [homedepot_url], "Home Depot", "Brand Name"),
+                                "Successfully submitted Home Depot brand URL"
+                            )
+                            retailer_values["Home Depot"] = [homedepot_url]
                         else:
                             error_messages.append(f"Home Depot URL error: {error_message}")
                     else:
@@ -230,16 +245,36 @@ def show_x_amazon_section():
 
                 # Handle Lowes submission
                 if lowes_selected:
-                    if 'lowes_url' in locals() and lowes_url:
+                    if lowes_url:
                         is_valid, error_message = validate_url(lowes_url)
                         if is_valid:
-                            update_selection("Brand", lowes_url, "Lowes")
-                            success_messages.append("Successfully submitted Lowes brand URL")
+                            retailer_tasks["Lowes"] = (
+                                partial(submit_retailer_brands, [lowes_url], "Lowes", "Brand Name"),
+                                "Successfully submitted Lowes brand URL"
+                            )
+                            retailer_values["Lowes"] = [lowes_url]
                         else:
                             error_messages.append(f"Lowes URL error: {error_message}")
                     else:
                         error_messages.append("Please enter Lowes URL")
 
+                # Submit all retailers concurrently, so the total time is roughly the slowest retailer
+                results = run_concurrently(
+                    {retailer: task for retailer, (task, _) in retailer_tasks.items()},
+                    max_workers=X_AMAZON_MAX_WORKERS
+                )
+                timings = []
+                for retailer, (submitted, error, elapsed) in results.items():
+                    timings.append(f"{retailer} {elapsed:.2f}s")
+                    if error is not None:
+                        error_messages.append(f"{retailer} submission failed: {str(error)}")
+                    elif submitted:
+                        success_messages.append(retailer_tasks[retailer][1])
+                    else:
+                        error_messages.append(f"{retailer} submission failed")
+                if timings:
+                    st.caption(f"Submission time per retailer: {', '.join(timings)}")
+
                 # Display success and error messages
                 for msg in success_messages:
                     st.success(msg)
@@ -248,290 +283,185 @@ def show_x_amazon_section():
 
                 # Send email notification if there were successful submissions
                 if success_messages:
-                    # Collect all submitted values for email notification
-                    submitted_values = []
-                    
-                    # Helper function to format submissions
-                    def format_retailer_submissions(retailer, values):
-                        if not values:
-                            return None
-                        # Handle both list and string inputs
-                        if isinstance(values, str):
-                            values = [values]
-                        # Remove any empty strings
-                        values = [v.strip() for v in values if v and v.strip()]
-                        if not values:
-                            return None
-                        return f"{retailer}: {', '.join(values)}"
-                    
-                    # Collect submissions for each retailer
-                    walmart_submissions = format_retailer_submissions(
-                        "Walmart", 
-                        walmart_selected_values if 'walmart_selected_values' in locals() and walmart_selected_values 
-                        else [walmart_not_in_hubspot] if 'walmart_not_in_hubspot' in locals() and walmart_not_in_hubspot 
-                        else None
-                    )
-                    
-                    target_submissions = format_retailer_submissions(
-                        "Target", 
-                        target_selected_values if 'target_selected_values' in locals() and target_selected_values 
-                        else [target_not_in_hubspot] if 'target_not_in_hubspot' in locals() and target_not_in_hubspot 
-                        else None
-                    )
-                    
-                    homedepot_submission = format_retailer_submissions(
-                        "Home Depot", 
-                        [homedepot_url] if 'homedepot_url' in locals() and homedepot_url 
-                        else None
-                    )
+                    # Collect the values of every retailer that went through, in structured form
+                    query_value = {
+                        retailer: retailer_values[retailer]
+                        for retailer, (submitted, error, _) in results.items()
+                        if submitted and error is None
+                    }
                     
-                    lowes_submission = format_retailer_submissions(
-                        "Lowes", 
-                        [lowes_url] if 'lowes_url' in locals() and lowes_url 
-                        else None
-                    )
-                    
-                    # Combine all submissions, filtering out None values
-                    all_submissions = [s for s in [walmart_submissions, target_submissions, homedepot_submission, lowes_submission] if s]
-                    query_value = " | ".join(all_submissions) if all_submissions else ""
-                    
-                    # Only send email if we have a non-empty query value
+                    # Only send email if something was actually submitted
                     if query_value:
                         if send_email_notification(query_value, st.session_state.requestor_email):
-                            st.success("Email notification sent successfully")
-
-        # Display current selections
-        if 'walmart_selected_values' in locals() and walmart_selected_values:
-            st.info(f"Current Walmart Selection: {', '.join(walmart_selected_values)}")
-        if 'target_selected_values' in locals() and target_selected_values:
-            st.info(f"Current Target Selection: {', '.join(target_selected_values)}")
-        if 'homedepot_url' in locals() and homedepot_url:
+                            st.success("Email notification queued")
+                        else:
+                            st.error(NOTIFICATION_FAILED_MESSAGE)
+
+        # Display current selections (brand selections are shown in their search panels)
+        if homedepot_url:
             st.info(f"Current Home Depot URL: {homedepot_url}")
-        if 'lowes_url' in locals() and lowes_url:
+        if lowes_url:
             st.info(f"Current Lowes URL: {lowes_url}")
 
-def update_selection(selection_type, selection_value, x_amazon_type=None):
-    """Update the selection in Snowflake"""
-    conn = get_snowflake_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
-            # Generate a unique GUID for the request
-            req_guid = str(uuid.uuid4())
-            
-            # Get requestor from session state
-            requestor = st.session_state.requestor_name
-            
-            # Use RUN_TYPE from config
-            run_type = RUN_TYPE
-            
-            # Brand selection for X-Amazon retailers
-            if x_amazon_type == "Home Depot":
-                brand_name = "NOTSPECIFIEDUNUSED"
-                company_name = "NOTSPECIFIEDUNUSED"
-                concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                request_type = "HomeDepot Brand"
-                status = "0"
-                is_multiple = "False"  # Set to False for single brand submission
-                url_value = selection_value  # Use URL for Home Depot
-                requestor_email = st.session_state.requestor_email
-            elif x_amazon_type == "Lowes":
-                brand_name = "NOTSPECIFIEDUNUSED"
-                company_name = "NOTSPECIFIEDUNUSED"
-                concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                request_type = "Lowes Brand"
-                status = "0"
-                is_multiple = "False"  # Set to False for single brand submission
-                url_value = selection_value  # Use URL for Lowes
-                requestor_email = st.session_state.requestor_email
-            elif x_amazon_type == "Target":
-                brand_name = selection_value
-                company_name = "NOTSPECIFIEDUNUSED"
-                concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                # Set request type based on submission type
-                request_type = "Target Brand New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Target Brand"
-                status = "0"
-                is_multiple = "False"  # Set to False for single brand submission
-                url_value = None
-                requestor_email = st.session_state.requestor_email
-            elif x_amazon_type == "Walmart":
-                brand_name = selection_value
-                company_name = "NOTSPECIFIEDUNUSED"
-                concat_lead_list_name = "NOTSPECIFIEDUNUSED"
-                # Set request type based on submission type
-                request_type = "Walmart Brand New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Walmart Brand"
-                status = "0"
-                is_multiple = "False"  # Set to False for single brand submission
-                url_value = None
-                requestor_email = st.session_state.requestor_email
-            else:
-                st.error("Invalid X-Amazon type")
-                return
-
-            # Check if selection_value contains semicolons (multiple brands)
-            if ";" in selection_value:
-                # Split the brands and handle them as multiple submissions
-                brands_list = [brand.strip() for brand in selection_value.split(";")]
-                update_multiple_brands(brands_list, x_amazon_type)
-                return
-
-            # Insert into the BULLSEYE_REQUEST table
-            query = """
-            INSERT INTO BOABD.POWERAPP.BULLSEYE_REQUEST (
-                BRANDNAME,
-                COMPANYNAME,
-                CONCAT_LEAD_LIST_NAME,
-                REQUEST_SUBMISSION_TIME,
-                REQUEST_TYPE,
-                REQUESTOR,
-                REQUESTOR_EMAIL,
-                STATUS,
-                ISMULTIPLEBRANDSUBMISSION,
-                REQ_GUID,
-                RUN_TYPE,
-                URL
-            ) VALUES (
-                %s,
-                %s,
-                %s,
-                CURRENT_TIMESTAMP,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s,
-                %s
-            )
-            """
-            
-            try:
-                cursor.execute(query, (
-                    brand_name,
-                    company_name,
-                    concat_lead_list_name,
-                    request_type,
-                    requestor,
-                    requestor_email,
-                    status,
-                    is_multiple,
-                    req_guid,
-                    run_type,
-                    url_value
-                ))
-                conn.commit()
-                st.success(f"✅ Record Added to Request Table: {selection_value}")
-            except Exception as e:
-                st.error(f"Failed to insert into BULLSEYE_REQUEST: {str(e)}")
-                return
-
-            # For brand submissions, also insert into Keepa Table and update status
-            if insert_into_keepa_table(None, req_guid, selection_type, selection_value, x_amazon_type):
-                st.success(f"✅ Sent to Keepa/Echo Table: {selection_value}")
-                if update_bullseye_status(req_guid, "2"):
-                    st.success(f"✅ Successfully Submitted: {selection_value}")
+        # Bulk submission of brands or URLs from a CSV/XLSX file
+        with st.expander("Upload a file instead"):
+            summary = show_bulk_upload(["Walmart", "Target", "Home Depot", "Lowes"], key="x_amazon_upload")
+            if summary and summary['submitted']:
+                query_value = {summary['retailer']: [f"{summary['filename']} ({summary['submitted']} rows)"]}
+                if send_email_notification(query_value, st.session_state.requestor_email):
+                    st.success("Email notification queued")
                 else:
-                    st.error(f"❌ Failed to update status for: {selection_value}")
-            else:
-                st.error(f"❌ Failed to process brand '{selection_value}'. The request was not added to the processing queue. Please try again or contact support.")
+                    st.error(NOTIFICATION_FAILED_MESSAGE)
+
+def submit_retailer_brands(brands_list, x_amazon_type, submission_type):
+    """Submit one retailer's brands or URL, returning True on success
+
+    Safe to run on a worker thread: the submission type ("Brand Name", or
+    "Brand Not in HubSpot" for new brands) is passed explicitly instead of
+    being read from the shared session state.
+    """
+    if len(brands_list) > 1:
+        return update_multiple_brands(brands_list, x_amazon_type, submission_type)
+    return update_selection("Brand", brands_list[0], x_amazon_type, submission_type)
+
+def pasted_brands_message(existing_brands, new_brands, x_amazon_type):
+    """Success message for a classified list of pasted brands"""
+    parts = []
+    if existing_brands:
+        parts.append(f"{len(existing_brands)} brand(s) from HubSpot")
+    if new_brands:
+        parts.append(f"{len(new_brands)} new brand(s)")
+    return f"Successfully submitted {' and '.join(parts)} to {x_amazon_type}"
+
+def submit_pasted_brands(existing_brands, new_brands, x_amazon_type):
+    """Submit a retailer's classified pasted brands under one REQ_GUID
+
+    Brands found in HubSpot are requested as "<Retailer> Brand" and the rest as
+    "<Retailer> Brand New". Safe to run on a worker thread; returns True on success.
+    """
+    try:
+        requestor = st.session_state.requestor_name
+        requestor_email = st.session_state.requestor_email
+        
+        # Set ISMULTIPLEBRANDSUBMISSION based on number of brands
+        is_multiple = 'Yes' if len(existing_brands) + len(new_brands) > 1 else 'No'
+        
+        rows = [(f"{x_amazon_type} Brand", brand) for brand in existing_brands]
+        rows += [(f"{x_amazon_type} Brand New", brand) for brand in new_brands]
+        
+        def add_row(uow, row):
+            request_type, brand = row
+            uow.add_request(
+                brand_name=brand,
+                request_type=request_type,
+                requestor=requestor,
+                requestor_email=requestor_email,
+                is_multiple=is_multiple
+            )
+            uow.add_query(*get_queries_target("Brand", x_amazon_type, brand_name=brand))
+        
+        return submit_rows(rows, add_row, (x_amazon_type, is_multiple, requestor_email)) is not None
+    except Exception as e:
+        st.error(f"Error submitting {x_amazon_type} brands: {str(e)}. Nothing was released for processing; submit again to retry.")
+        return False
 
-            cursor.close()
-            conn.close()
+def update_selection(selection_type, selection_value, x_amazon_type=None, submission_type=None):
+    """Update the selection in Snowflake"""
+    try:
+        # Generate a unique GUID for the request
+        req_guid = str(uuid.uuid4())
+        
+        # Get requestor from session state
+        requestor = st.session_state.requestor_name
+        requestor_email = st.session_state.requestor_email
+        
+        # Use RUN_TYPE from config
+        uow = SubmissionUnitOfWork(req_guid, run_type=RUN_TYPE)
+        
+        # Brand selection for X-Amazon retailers
+        if x_amazon_type in ["Home Depot", "Lowes"]:
+            brand_name = NOT_SPECIFIED
+            request_type = "HomeDepot Brand" if x_amazon_type == "Home Depot" else "Lowes Brand"
+            url_value = selection_value  # Use URL for Home Depot / Lowes
+        elif x_amazon_type in ["Target", "Walmart"]:
+            brand_name = selection_value
+            # Set request type based on submission type
+            request_type = f"{x_amazon_type} Brand New" if submission_type == "Brand Not in HubSpot" else f"{x_amazon_type} Brand"
+            url_value = None
+        else:
+            st.error("Invalid X-Amazon type")
+            return False
+
+        # Check if selection_value contains semicolons (multiple brands)
+        if ";" in selection_value:
+            # Split the brands and handle them as multiple submissions
+            brands_list = [brand.strip() for brand in selection_value.split(";")]
+            return update_multiple_brands(brands_list, x_amazon_type, submission_type)
+
+        uow.add_request(
+            brand_name=brand_name,
+            request_type=request_type,
+            requestor=requestor,
+            requestor_email=requestor_email,
+            is_multiple="False",  # Set to False for single brand submission
+            url_value=url_value
+        )
+        uow.add_query(*get_queries_target(selection_type, x_amazon_type, brand_name=selection_value))
 
+        # Saved locally right away; the outbox writes it to Snowflake in one transaction
+        try:
+            get_submission_outbox().append(uow)
         except Exception as e:
-            st.error(f"Error submitting request: {str(e)}")
+            st.error(f"❌ Failed to process brand '{selection_value}': {str(e)}. Nothing was saved; please try again or contact support.")
+            return False
+
+        st.success(f"✅ Successfully Submitted: {selection_value}")
+        return True
 
-def update_multiple_brands(brands_list, x_amazon_type):
+    except Exception as e:
+        st.error(f"Error submitting request: {str(e)}")
+        return False
+
+def update_multiple_brands(brands_list, x_amazon_type, submission_type=None):
     """Handle multiple brand submissions with the same REQ_GUID"""
-    conn = get_snowflake_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            req_guid = str(uuid.uuid4())
-            # Get requestor from session state
-            requestor = st.session_state.requestor_name
-            run_type = RUN_TYPE  # Use RUN_TYPE from config
-            requestor_email = st.session_state.requestor_email  # Add requestor email
-            
-            # Determine request type based on submission type and X-Amazon type
-            if x_amazon_type == "Home Depot":
-                request_type = "HomeDepot Brand"
-            elif x_amazon_type == "Lowes":
-                request_type = "Lowes Brand"
-            elif x_amazon_type == "Target":
-                request_type = "Target Brand New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Target Brand"
-            elif x_amazon_type == "Walmart":
-                request_type = "Walmart Brand New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Walmart Brand"
-            else:
-                request_type = "Amazon Brand Name New" if st.session_state.submission_type == "Brand Not in HubSpot" else "Amazon Brand Name"
-            
-            # Set ISMULTIPLEBRANDSUBMISSION based on number of brands
-            is_multiple = 'Yes' if len(brands_list) > 1 else 'No'
-            
-            for brand in brands_list:
-                query = """
-                INSERT INTO BOABD.POWERAPP.BULLSEYE_REQUEST (
-                    BRANDNAME,
-                    COMPANYNAME,
-                    CONCAT_LEAD_LIST_NAME,
-                    REQUEST_SUBMISSION_TIME,
-                    REQUEST_TYPE,
-                    REQUESTOR,
-                    REQUESTOR_EMAIL,
-                    STATUS,
-                    ISMULTIPLEBRANDSUBMISSION,
-                    REQ_GUID,
-                    RUN_TYPE,
-                    URL
-                ) VALUES (
-                    %s,
-                    'NOTSPECIFIEDUNUSED',
-                    'NOTSPECIFIEDUNUSED',
-                    CURRENT_TIMESTAMP,
-                    %s,
-                    %s,
-                    %s,
-                    '0',
-                    %s,
-                    %s,
-                    %s,
-                    %s
-                )
-                """
-                
+    try:
+        # Get requestor from session state
+        requestor = st.session_state.requestor_name
+        requestor_email = st.session_state.requestor_email  # Add requestor email
+
+        # Determine request type based on submission type and X-Amazon type
+        if x_amazon_type == "Home Depot":
+            request_type = "HomeDepot Brand"
+        elif x_amazon_type == "Lowes":
+            request_type = "Lowes Brand"
+        elif x_amazon_type == "Target":
+            request_type = "Target Brand New" if submission_type == "Brand Not in HubSpot" else "Target Brand"
+        elif x_amazon_type == "Walmart":
+            request_type = "Walmart Brand New" if submission_type == "Brand Not in HubSpot" else "Walmart Brand"
+        else:
+            request_type = "Amazon Brand Name New" if submission_type == "Brand Not in HubSpot" else "Amazon Brand Name"
+        
+        # Set ISMULTIPLEBRANDSUBMISSION based on number of brands
+        is_multiple = 'Yes' if len(brands_list) > 1 else 'No'
+        
+        def add_row(uow, brand):
+            uow.add_request(
+                brand_name=brand,  # brand is already a string
+                request_type=request_type,
+                requestor=requestor,
+                requestor_email=requestor_email,
+                is_multiple=is_multiple,
                 # Set URL value based on x_amazon_type
-                url_value = brand if x_amazon_type in ["Home Depot", "Lowes"] else None
-                
-                cursor.execute(query, (
-                    brand,  # brand is already a string
-                    request_type,
-                    requestor,
-                    requestor_email,
-                    is_multiple,
-                    req_guid,
-                    run_type,
-                    url_value
-                ))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-
-            # Insert all brands into Keepa Table and update status
-            keepa_success = True
-            for brand in brands_list:
-                if not insert_into_keepa_table(None, req_guid, "Brand", brand, x_amazon_type):
-                    keepa_success = False
-                    break
-            
-            if keepa_success:
-                if update_bullseye_status(req_guid, "2"):
-                    st.success(f"Successfully submitted {len(brands_list)} brand requests")
-                else:
-                    st.warning(f"Brand requests submitted but status update failed")
-            else:
-                st.warning(f"Brand requests submitted but Keepa Table insertion failed for some brands")
-        except Exception as e:
-            st.error(f"Error submitting multiple brand requests: {str(e)}") 
+                url_value=brand if x_amazon_type in ["Home Depot", "Lowes"] else None
+            )
+            uow.add_query(*get_queries_target("Brand", x_amazon_type, brand_name=brand))
+        
+        # Rows and the status update commit together (in checkpointed chunks for very long lists)
+        if not submit_rows(brands_list, add_row, (x_amazon_type, request_type, is_multiple, requestor_email)):
+            return False
+        
+        st.success(f"Successfully submitted {len(brands_list)} brand requests")
+        return True
+    except Exception as e:
+        st.error(f"Error submitting multiple brand requests: {str(e)}. Nothing was released for processing; submit again to retry.")
+        return False